@@ -9,9 +9,14 @@ let g:lfx#completion_results = []
 function! lfx#enable() abort
     augroup lfx
         autocmd!
+        autocmd BufFilePost,FileType * silent! call s:refresh_buffer(str2nr(expand('<abuf>')))
         autocmd BufEnter,BufWinEnter,FileType * silent! call LFX_handle_did_open() 
         autocmd BufWipeout,BufDelete,BufUnload * silent! call LFX_handle_did_close()
         autocmd VimLeavePre * silent! call LFX_handle_leave() 
+        autocmd BufWinLeave,WinClosed,TabEnter * silent! call LFX_handle_layout_changed()
+        autocmd WinScrolled * if get(g:, 'lfx#diagnostics#_backlog', 0)
+                    \ | silent! call LFX_handle_scrolled() | endif
+        autocmd User LFXDiagnosticsChanged silent! call s:update_lightbulbs()
     augroup END
 
     command! LFXHover call LFX_hover()
@@ -23,14 +28,26 @@ function! lfx#enable() abort
     command! -nargs=1 -complete=customlist,<sid>complete_symbols
                 \ LFXWorkspaceSymbol call LFX_workspace_symbol({'query': <q-args>})
     command! LFXReferences call LFX_references()
-    command! LFXDocumentHighlight call LFX_document_highlight()
+    command! LFXDocumentHighlight call LFX_document_highlight(
+                \ {'changedtick': b:changedtick})
     command! -nargs=? LFXRename call s:request_rename(<q-args>)
-    command! LFXCodeActions call LFX_code_actions({'visual': v:false})
-    command! LFXCodeActionsVisual call LFX_code_actions({'visual': v:true})
+    command! LFXCodeActions call LFX_code_actions({'visual': v:false,
+                \ 'changedtick': b:changedtick})
+    command! LFXCodeActionsVisual call LFX_code_actions({'visual': v:true,
+                \ 'changedtick': b:changedtick})
     command! LFXFormat call LFX_format()
     command! LFXFormatRange call LFX_format_range()
+    command! LFXUndoWorkspaceEdit call LFX_undo_workspace_edit()
+    command! LFXDiagnostics call lfx#diagnostics#open_list(v:false)
+    command! LFXWorkspaceDiagnostics call lfx#diagnostics#open_list(v:true)
 
     hi default LFXActiveParameter gui=bold,underline
+    hi default link LFXLightbulbVirtual Comment
+endfunction
+
+function! s:refresh_buffer(bufnr) abort
+    call LFX_handle_buffer_refresh(a:bufnr, fnamemodify(bufname(a:bufnr), ':p'),
+                \ getbufvar(a:bufnr, '&filetype'))
 endfunction
 
 function! s:complete_symbols(arglead, line, pos) abort
@@ -86,34 +103,93 @@ function! lfx#attach_buffer(bufnr) abort
                     \ . '> call s:handle_complete_changed(v:event)'
         execute 'autocmd CursorMoved,InsertEnter <buffer=' . a:bufnr
                     \ . '> call s:close_popup()'
-        execute 'autocmd CursorHold <buffer=' . a:bufnr
-                    \ . '> call s:fetch_code_actions(v:false)'
-        execute 'autocmd CursorMoved <buffer=' . a:bufnr
-                    \ . '> call s:fetch_code_actions_visual()'
+        execute 'autocmd CursorHold,WinScrolled <buffer=' . a:bufnr
+                    \ . '> silent! call s:update_lightbulbs()'
+        if get(g:, 'lfx#hover#prefetch', 0)
+            execute 'autocmd CursorHold <buffer=' . a:bufnr
+                        \ . '> silent! call LFX_hover({''prefetch'': v:true})'
+        endif
     augroup END
 endfunction
 
 function! lfx#omni(findstart, base) abort
+    if get(g:, 'lfx#completion#async', 0)
+        return s:omni_async(a:findstart)
+    endif
+
     if a:findstart
         return s:find_start()
     endif
 
-    let col = strchars(s:get_text_to_cursor() . a:base)
+    let prefix = s:get_text_to_cursor()
+    let col = strchars(prefix . a:base)
     call LFX_complete_sync({
                 \ 'target': 'lfx#completion_results',
                 \ 'process_response': v:true,
                 \ 'base': a:base,
-                \ 'col': col
+                \ 'col': col,
+                \ 'bufnr': bufnr(''),
+                \ 'changedtick': b:changedtick,
+                \ 'line': line('.') - 1,
+                \ 'prefix': prefix
                 \ }, v:true)
     let results = get(g:, 'lfx#completion_results', [])
     return results
 endfunction
 
+function! s:omni_async(findstart) abort
+    if !a:findstart
+        return get(g:, 'lfx#completion_results', [])
+    endif
+    let start = s:find_start()
+    call s:request_completion(start, get(g:, 'lfx#completion#sync_budget', 0.05))
+    " Results that miss the budget are shown by lfx#completion_async_callback
+    return exists('g:lfx#completion_results') ? start : -3
+endfunction
+
 function! lfx#complete() abort
-    call LFX_complete({'callback': 'lfx#completion_callback', 'process_response': v:true})
+    let start = s:find_start()
+    call s:request_completion(start, 0)
+    if exists('g:lfx#completion_results')
+        call complete(start + 1, g:lfx#completion_results)
+    endif
     return ''
 endfunction
 
+function! s:request_completion(start, budget) abort
+    unlet! g:lfx#completion_results
+    let line = getline('.')
+    let prefix = strpart(line, 0, a:start)
+    let base = strpart(line, a:start, col('.') - 1 - a:start)
+    let s:completion_context = {
+                \ 'bufnr': bufnr(''),
+                \ 'changedtick': b:changedtick,
+                \ 'cursor': getcurpos()[1:2],
+                \ 'start': a:start,
+                \ }
+    call LFX_complete_sync({
+                \ 'target': 'lfx#completion_results',
+                \ 'async_callback': 'lfx#completion_async_callback',
+                \ 'process_response': v:true,
+                \ 'budget': a:budget,
+                \ 'base': base,
+                \ 'col': strchars(prefix . base),
+                \ 'bufnr': bufnr(''),
+                \ 'changedtick': b:changedtick,
+                \ 'line': line('.') - 1,
+                \ 'prefix': prefix
+                \ }, v:true)
+endfunction
+
+function! lfx#completion_async_callback(items) abort
+    let context = get(s:, 'completion_context', {})
+    if empty(context) || mode() !~# '^i' || bufnr('') != context.bufnr
+                \ || b:changedtick != context.changedtick || getcurpos()[1:2] != context.cursor
+        return
+    endif
+    call complete(context.start + 1, a:items)
+endfunction
+
 function! lfx#complete_sync() abort
     call LFX_complete_sync({'target': 'lfx#completion_results', 'process_response': v:true}, v:true)
     let results = get(g:, 'lfx#completion_results', [])
@@ -130,14 +206,6 @@ endfunction
 
 let s:count = 0
 
-function! lfx#code_action_callback(results) abort
-    call s:dismiss_code_actions()
-    let available = len(filter(a:results, '!empty(v:val)')) > 0
-    if available
-        call lfx#virtualtext#place_lightbulb(0, line('.') - 1)
-    endif
-endfunction
-
 function! lfx#show_popup(content, opts) abort
     call s:close_popup()
     let content = a:content
@@ -154,25 +222,16 @@ function! s:close_popup() abort
     call lfx#popup#close_current_popup()
 endfunction
 
-function! s:fetch_code_actions_visual() abort
-    let mode = mode()
-    if l:mode =~# '\v\c^%(v)$' || l:mode ==# "\<C-V>"
-        " Hack to update visual marks
-        execute "normal! \<esc>gv"
-        call s:fetch_code_actions(v:true)
-    endif
-endfunction
-
-function! s:fetch_code_actions(visual) abort
-    call LFX_code_actions({
-                \ 'callback': 'lfx#code_action_callback',
-                \ 'include_results': v:true,
-                \ 'visual': a:visual
-                \ }, v:false, 0.2)
-endfunction
-
-function! s:dismiss_code_actions() abort
-    call lfx#virtualtext#clear_lightbulbs(0)
+function! s:update_lightbulbs() abort
+    call LFX_update_lightbulbs({
+                \ 'bufnr': bufnr(''),
+                \ 'changedtick': b:changedtick,
+                \ 'top': line('w0') - 1,
+                \ 'bottom': line('w$') - 1,
+                \ 'line': line('.') - 1,
+                \ 'text': getline('.'),
+                \ 'col': col('.') - 1
+                \ })
 endfunction
 
 function! s:handle_complete_done() abort
@@ -194,7 +253,6 @@ function! s:handle_complete_changed(event) abort
 endfunction
 
 function! s:resolve_completion(completed_item) abort
-    unlet! g:lfx#completion#_resolved_item
     let user_data = get(a:completed_item, 'user_data', {})
     if type(user_data) !=# v:t_dict
         silent! let user_data = json_decode(user_data)
@@ -202,11 +260,63 @@ function! s:resolve_completion(completed_item) abort
     if type(user_data) !=# v:t_dict
         return
     endif
-    let lspitem = get(user_data, 'lspitem')
-    if !empty(lspitem)
-        call LFX_resolve_completion({'target': 'lfx#completion#_resolved_item',
-                    \ 'completion_item': lspitem})
+    let item_id = get(user_data, 'lfx_item', -1)
+    if item_id >= 0
+        call LFX_resolve_completion({'completion_item_id': item_id})
+    endif
+endfunction
+
+" bufnr() takes a file-pattern: a path containing pattern characters may match
+" another buffer or none, and a path without a buffer may match the end of
+" another buffer's name. Only the buffer named exactly after the path is returned.
+function! lfx#bufnr(path) abort
+    let bufnr = bufnr(a:path)
+    if bufnr != -1 && fnamemodify(bufname(bufnr), ':p') ==# a:path
+        return bufnr
+    endif
+    if a:path !~# '[*?[\]{},~%#$]'
+        return -1
+    endif
+    for bufnr in range(1, bufnr('$'))
+        if bufexists(bufnr) && fnamemodify(bufname(bufnr), ':p') ==# a:path
+            return bufnr
+        endif
+    endfor
+    return -1
+endfunction
+
+function! lfx#loaded_buffer_paths() abort
+    return map(filter(range(1, bufnr('$')), 'bufloaded(v:val) && bufname(v:val) !=# ""'),
+                \ 'fnamemodify(bufname(v:val), ":p")')
+endfunction
+
+function! lfx#buffer_info(path, ...) abort
+    let bufnr = lfx#bufnr(a:path)
+    if bufnr == -1 || !bufloaded(bufnr)
+        return {}
+    endif
+    let info = {
+                \ 'bufnr': bufnr,
+                \ 'name': fnamemodify(bufname(bufnr), ':p'),
+                \ 'filetype': getbufvar(bufnr, '&filetype'),
+                \ 'changedtick': getbufvar(bufnr, 'changedtick'),
+                \ 'eol': getbufvar(bufnr, '&eol'),
+                \ 'shiftwidth': getbufvar(bufnr, '&shiftwidth'),
+                \ 'expandtab': getbufvar(bufnr, '&expandtab'),
+                \ 'visible': !empty(win_findbuf(bufnr)),
+                \ }
+    if get(a:, 1, v:true)
+        let info.lines = getbufline(bufnr, 1, '$')
+    endif
+    return info
+endfunction
+
+function! lfx#buffer_lines(path, rows) abort
+    let bufnr = lfx#bufnr(a:path)
+    if bufnr == -1 || !bufloaded(bufnr)
+        return v:null
     endif
+    return map(copy(a:rows), {_, row -> get(getbufline(bufnr, row + 1), 0, '')})
 endfunction
 
 function! s:find_start() abort
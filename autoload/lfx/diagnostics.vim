@@ -0,0 +1,48 @@
+"=============================================================================
+" File: autoload/lfx/diagnostics.vim
+" License: MIT
+" Description: diagnostics lists and the extmark diagnostics renderer.
+"=============================================================================
+
+function! lfx#diagnostics#define_highlights() abort
+    highlight default link LFXDiagnosticError SpellBad
+    highlight default link LFXDiagnosticWarning SpellCap
+    highlight default link LFXDiagnosticInformation SpellRare
+    highlight default link LFXDiagnosticHint SpellRare
+    highlight default link LFXDiagnosticSignError ErrorMsg
+    highlight default link LFXDiagnosticSignWarning WarningMsg
+    highlight default link LFXDiagnosticSignInformation Question
+    highlight default link LFXDiagnosticSignHint Question
+    highlight default link LFXDiagnosticVirtualError ErrorMsg
+    highlight default link LFXDiagnosticVirtualWarning WarningMsg
+    highlight default link LFXDiagnosticVirtualInformation Comment
+    highlight default link LFXDiagnosticVirtualHint Comment
+endfunction
+
+" The lines shown of each buffer in the current tab page, 0-based, for the
+" extmark renderer to place the visible marks first.
+function! lfx#diagnostics#viewports() abort
+    let viewports = {}
+    for info in getwininfo()
+        if info.tabnr == tabpagenr()
+            let lines = get(viewports, info.bufnr, [])
+            call add(lines, [info.topline - 1, info.botline - 1])
+            let viewports[info.bufnr] = lines
+        endif
+    endfor
+    return viewports
+endfunction
+
+" Fills the location list with the diagnostics of the current buffer, or the
+" quickfix list with those of the whole workspace, and opens it.
+function! lfx#diagnostics#open_list(workspace) abort
+    if a:workspace
+        call setqflist([], ' ', {'title': 'LFX workspace diagnostics',
+                    \ 'items': LFX_diagnostics_list(-1)})
+        copen
+    else
+        call setloclist(0, [], ' ', {'title': 'LFX diagnostics',
+                    \ 'items': LFX_diagnostics_list(0)})
+        lopen
+    endif
+endfunction
@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+
+import sys
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(__file__))
+sys.path.append(os.path.join(BASE_DIR, 'rplugin', 'python3'))
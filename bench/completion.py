@@ -0,0 +1,69 @@
+"""Compares converting every completion item with top-K ranking.
+
+Run with `python -m bench.completion` from the repository root.
+"""
+import json
+import random
+import time
+
+from lfx.completion import CompletionEntry, CompletionItemStore, completion_word, vim_completion_item
+from lfx.core.completion import parse_completion_response
+
+LIMIT = 200
+WORDS = ['get', 'set', 'value', 'item', 'list', 'map', 'filter', 'index', 'count', 'name', 'path', 'node']
+
+
+def make_response(num_items, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(num_items):
+        label = ''.join(w.capitalize() if n else w for n, w in enumerate(rng.sample(WORDS, 3))) + str(i)
+        items.append({
+            'label': label,
+            'kind': rng.randint(1, 25),
+            'detail': 'def {}(self, arg)'.format(label),
+            'sortText': '{:08}'.format(rng.randint(0, num_items)),
+            'insertText': label,
+        })
+    return {'isIncomplete': False, 'items': items}
+
+
+def legacy_process_response(response, base):
+    items, _ = parse_completion_response(response)
+    matches = []
+    for rec in items:
+        word = completion_word(rec, base)
+        if base and not word.startswith(base):
+            continue
+        item = vim_completion_item(rec, word, 0)
+        item['user_data'] = json.dumps({'lspitem': rec})
+        matches.append(item)
+    return matches
+
+
+def ranked_process_response(response, base):
+    items, incomplete = parse_completion_response(response, sort=False)
+    return CompletionEntry(None, items, incomplete).filter(base, CompletionItemStore(), LIMIT)
+
+
+def run(name, process, response, base, repeat=10):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = process(response, base)
+        best = min(best, time.perf_counter() - start)
+    print('{:>10} {:>10.2f} ms {:>8} items'.format(name, best * 1000, len(result)))
+    return result
+
+
+def main():
+    for num_items in [1000, 10000, 50000]:
+        response = make_response(num_items)
+        for base in ['', 'get']:
+            print('{} items, base {!r}'.format(num_items, base))
+            run('legacy', legacy_process_response, response, base)
+            run('top-k', ranked_process_response, response, base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Benchmarks the completion pipeline stage by stage.
+
+Run with `python -m bench.completion_suite` from the repository root. Every stage is timed and
+its peak allocations are measured with tracemalloc. Runs are compared with the committed
+completion_baseline.json and fail when a stage regresses by more than `--threshold` against it,
+`--save` records a new baseline. The committed one was recorded on a single machine, save your
+own before comparing on different hardware. Besides the synthetic responses, the recorded responses in
+bench/recorded are measured, one JSON file per response. `--recorded DIR` reads them from
+another directory.
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+from lfx.completion import CompletionCache, CompletionItemStore
+from lfx.core.completion import format_completion, parse_completion_response
+from lfx.core.types import Settings
+from lfx.helper.completion import CompletionHelper
+from .mocks import FakeNvim
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'completion_baseline.json')
+DEFAULT_RECORDED = os.path.join(os.path.dirname(__file__), 'recorded')
+SIZES = [100, 1000, 10000]
+WORDS = ['get', 'set', 'value', 'item', 'list', 'map', 'filter', 'index', 'count', 'name', 'path', 'node']
+BASE = 'ge'
+
+
+class MockLFX(object):
+
+    def __init__(self, vim):
+        self.vim = vim
+        self.completion_cache = CompletionCache()
+        self.completion_items = CompletionItemStore()
+        self.completion_max_items = 200
+        self.completion_prefetch_resolve = 0
+
+
+def make_label(rng, i):
+    return ''.join(w.capitalize() if n else w for n, w in enumerate(rng.sample(WORDS, 3))) + str(i)
+
+
+def plain_item(rng, i):
+    label = make_label(rng, i)
+    return {'label': label, 'kind': rng.randint(1, 25), 'sortText': '{:08}'.format(rng.randint(0, 10 ** 6))}
+
+
+def text_edit_item(rng, i):
+    item = plain_item(rng, i)
+    item['textEdit'] = {
+        'range': {'start': {'line': 10, 'character': 4}, 'end': {'line': 10, 'character': 4 + len(BASE)}},
+        'newText': item['label'],
+    }
+    item['additionalTextEdits'] = [{
+        'range': {'start': {'line': 0, 'character': 0}, 'end': {'line': 0, 'character': 0}},
+        'newText': 'import {}\n'.format(item['label']),
+    }]
+    return item
+
+
+def snippet_item(rng, i):
+    item = plain_item(rng, i)
+    item['insertTextFormat'] = 2
+    item['insertText'] = '{}(${{1:arg}}, ${{2:other}})$0'.format(item['label'])
+    return item
+
+
+def documentation_item(rng, i):
+    item = plain_item(rng, i)
+    item['detail'] = 'def {}(self, arg: int, other: str) -> Optional[List[str]]'.format(item['label'])
+    item['documentation'] = {'kind': 'markdown', 'value': '\n\n'.join(
+        ' '.join(rng.choice(WORDS) for _ in range(40)) for _ in range(5))}
+    return item
+
+
+SHAPES = {
+    'plain': plain_item,
+    'textedit': text_edit_item,
+    'snippet': snippet_item,
+    'documentation': documentation_item,
+}
+
+
+def synthetic_cases():
+    for shape, make_item in SHAPES.items():
+        for size in SIZES:
+            rng = random.Random(size)
+            yield '{}/{}'.format(shape, size), {'isIncomplete': False, 'items': [make_item(rng, i) for i in range(size)]}
+
+
+def recorded_cases(directory):
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as file:
+            response = json.load(file)
+        items, _ = parse_completion_response(response, sort=False)
+        yield 'recorded-{}/{}'.format(os.path.splitext(os.path.basename(path))[0], len(items)), response
+
+
+def stages(response):
+    settings = Settings()
+    settings.completion_hint_type = 'auto'
+    vim = FakeNvim([])
+    helper = CompletionHelper(MockLFX(vim), vim)
+    options = {'base': BASE, 'process_response': True, 'target': 'lfx#completion_results'}
+    items, incomplete = parse_completion_response(response, sort=False)
+    entry = helper.lfx.completion_cache.store(None, items, incomplete)
+
+    return [
+        ('parse', lambda: parse_completion_response(response)),
+        ('format', lambda: [format_completion(item, 4, settings) for item in items]),
+        ('process', lambda: helper.process_response(response, options)),
+        ('refilter', lambda: entry.filter(BASE + 't', helper.lfx.completion_items, helper.lfx.completion_max_items)),
+        ('dispatch', lambda: helper.dispatch_response(response, options)),
+    ]
+
+
+def measure(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'ms': round(best * 1000, 3), 'peak_kib': round(peak / 1024, 1)}
+
+
+def compare(name, result, baseline, threshold):
+    previous = baseline.get(name)
+    if not previous:
+        return []
+    regressions = []
+    for metric in ('ms', 'peak_kib'):
+        if previous[metric] and result[metric] > previous[metric] * (1 + threshold):
+            regressions.append('{} {}: {} -> {}'.format(name, metric, previous[metric], result[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the completion pipeline')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON file')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed regression against the baseline, as a fraction (default: 0.25)')
+    parser.add_argument('--recorded', default=DEFAULT_RECORDED, help='directory of recorded completion responses')
+    parser.add_argument('--repeat', type=int, default=20, help='timing runs per stage, the best is kept')
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+    cases = list(synthetic_cases())
+    cases.extend(recorded_cases(args.recorded))
+
+    results = {}
+    regressions = []
+    for case, response in cases:
+        for stage, function in stages(response):
+            name = '{}/{}'.format(case, stage)
+            result = results[name] = measure(function, args.repeat)
+            print('{:<40} {:>10.2f} ms {:>10.1f} KiB'.format(name, result['ms'], result['peak_kib']))
+            regressions.extend(compare(name, result, baseline, args.threshold))
+
+    if args.save:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print('baseline saved to {}'.format(args.baseline))
+    elif not baseline:
+        print('no baseline at {}, run with --save to record one'.format(args.baseline))
+
+    if regressions:
+        print('regressions above {:.0%}:'.format(args.threshold))
+        for regression in regressions:
+            print('  ' + regression)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
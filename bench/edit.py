@@ -0,0 +1,69 @@
+"""Compares applying TextEdits one at a time with the batched edit engine.
+
+Run with `python -m bench.edit` from the repository root.
+"""
+import time
+
+from test.test_editor import CONTENT1, MockLFX
+from lfx.editor import VimEditor
+from .mocks import FakeNvim
+
+# Same edit shapes as test/test_editor.py, relative to the first line of a block
+SHAPES = [
+    [[1, 0], [2, 0], ''],
+    [[1, 0], [1, 0], 'foo'],
+    [[1, 0], [2, 0], 'foo\n'],
+    [[1, 15], [1, 20], 'foo'],
+    [[1, 15], [2, 7], 'foo\nbar'],
+]
+
+
+def make_case(num_lines, num_edits):
+    block = CONTENT1.splitlines(False)
+    lines = (block * (num_lines // len(block) + 1))[:num_lines]
+    step = num_lines // num_edits // len(block) * len(block)
+    assert step > 0, 'too many edits for {} lines'.format(num_lines)
+    edits = []
+    for i in range(num_edits):
+        (start_line, start_col), (end_line, end_col), new_text = SHAPES[i % len(SHAPES)]
+        offset = i * step
+        edits.append(((start_line + offset, start_col), (end_line + offset, end_col), new_text))
+    return lines, edits
+
+
+def legacy_apply_document_edits(editor, changes):
+    vim = editor.vim
+    bufnr = vim.funcs.bufnr('file', True)
+    vim.api.buf_is_loaded(bufnr)
+    for change in reversed(changes):
+        buffer_lines = vim.buffers[bufnr][:]
+        start, end, new_lines = editor.apply_edit(buffer_lines, change)
+        vim.api.buf_set_lines(bufnr, start, end + 1, False, new_lines)
+
+
+def batched_apply_document_edits(editor, changes):
+    editor.apply_document_edits('file', changes)
+
+
+def run(name, apply, lines, edits):
+    vim = FakeNvim(lines)
+    editor = VimEditor(MockLFX(vim))
+    start = time.perf_counter()
+    apply(editor, edits)
+    elapsed = time.perf_counter() - start
+    print('{:>10} {:>10.1f} ms {:>8} requests {:>12} lines transferred'.format(
+        name, elapsed * 1000, vim.requests, vim.transferred))
+    return vim.lines
+
+
+def main():
+    for num_lines, num_edits in [(1000, 100), (10000, 500), (12000, 2000)]:
+        lines, edits = make_case(num_lines, num_edits)
+        print('{} lines, {} edits'.format(num_lines, len(edits)))
+        legacy = run('legacy', legacy_apply_document_edits, lines, edits)
+        batched = run('batched', batched_apply_document_edits, lines, edits)
+        assert legacy == batched, 'results differ'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+class FakeApi(object):
+    """Minimal stand-in for the Nvim API that keeps buffer contents in memory and counts
+    round-trips and the number of lines transferred"""
+
+    def __init__(self, nvim):
+        self._nvim = nvim
+
+    def buf_is_loaded(self, bufnr):
+        self._nvim.requests += 1
+        return True
+
+    def buf_get_lines(self, bufnr, start, end, strict):
+        self._nvim.requests += 1
+        lines = self._nvim.lines[start:None if end == -1 else end]
+        self._nvim.transferred += len(lines)
+        return list(lines)
+
+    def buf_set_lines(self, bufnr, start, end, strict, lines, count=True):
+        if count:
+            self._nvim.requests += 1
+        self._nvim.transferred += len(lines)
+        self._nvim.lines[start:end] = lines
+
+    def call_atomic(self, calls):
+        self._nvim.requests += 1
+        results = []
+        for name, args in calls:
+            if name != 'nvim_buf_set_lines':
+                raise NotImplementedError(name)
+            results.append(self.buf_set_lines(*args, count=False))
+        return [results, None]
+
+
+class FakeFuncs(object):
+
+    def __init__(self, nvim):
+        self._nvim = nvim
+
+    def bufnr(self, *args):
+        self._nvim.requests += 1
+        return 1
+
+    def bufadd(self, *args):
+        self._nvim.requests += 1
+        return 1
+
+
+class FakeBuffer(object):
+
+    def __init__(self, nvim):
+        self._nvim = nvim
+
+    def __getitem__(self, index):
+        self._nvim.requests += 1
+        lines = self._nvim.lines[index]
+        self._nvim.transferred += len(lines)
+        return list(lines)
+
+
+class FakeNvim(object):
+
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.requests = 0
+        self.transferred = 0
+        self.api = FakeApi(self)
+        self.funcs = FakeFuncs(self)
+        self.buffers = {1: FakeBuffer(self)}
+        self.vars = {}
+
+    def call(self, name, *args):
+        self.requests += 1
+        if name == 'lfx#bufnr':
+            return 1
+        raise NotImplementedError(name)
@@ -0,0 +1,133 @@
+"""Compares the memory and parsing time of diagnostics with the former dict-backed protocol types.
+
+Run with `python -m bench.protocol` from the repository root.
+"""
+import gc
+import random
+import time
+import tracemalloc
+
+from lfx.core.protocol import Diagnostic
+from lfx.core.url import filename_to_uri, uri_to_filename
+
+
+class LegacyPoint(object):
+    def __init__(self, row, col):
+        self.row = int(row)
+        self.col = int(col)
+
+    @classmethod
+    def from_lsp(cls, point):
+        return LegacyPoint(point['line'], point['character'])
+
+
+class LegacyRange(object):
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_lsp(cls, range):
+        return LegacyRange(LegacyPoint.from_lsp(range['start']), LegacyPoint.from_lsp(range['end']))
+
+
+class LegacyLocation(object):
+    def __init__(self, file_path, range):
+        self.file_path = file_path
+        self.range = range
+
+    @classmethod
+    def from_lsp(cls, lsp_location):
+        return LegacyLocation(uri_to_filename(lsp_location['uri']), LegacyRange.from_lsp(lsp_location['range']))
+
+
+class LegacyRelatedInformation(object):
+    def __init__(self, location, message):
+        self.location = location
+        self.message = message
+
+    @classmethod
+    def from_lsp(cls, info):
+        return LegacyRelatedInformation(LegacyLocation.from_lsp(info['location']), info['message'])
+
+
+class LegacyDiagnostic(object):
+    def __init__(self, message, range, severity, source, lsp_diagnostic, related_info):
+        self.message = message
+        self.range = range
+        self.severity = severity
+        self.source = source
+        self._lsp_diagnostic = lsp_diagnostic
+        self.related_info = related_info
+
+    @classmethod
+    def from_lsp(cls, lsp_diagnostic):
+        return LegacyDiagnostic(
+            lsp_diagnostic['message'],
+            LegacyRange.from_lsp(lsp_diagnostic['range']),
+            lsp_diagnostic.get('severity', 1),
+            lsp_diagnostic.get('source'),
+            lsp_diagnostic,
+            [LegacyRelatedInformation.from_lsp(info) for info in lsp_diagnostic.get('relatedInformation', [])])
+
+
+def make_diagnostics(count, related=0.1, seed=0):
+    rng = random.Random(seed)
+    uri = filename_to_uri('/project/src/other.py')
+    diagnostics = []
+    for i in range(count):
+        line = rng.randint(0, 20000)
+        diagnostic = {
+            'message': 'unused variable `value{}`'.format(i),
+            'severity': rng.randint(1, 4),
+            'source': 'lint',
+            'code': 'W0612',
+            'range': {'start': {'line': line, 'character': 4}, 'end': {'line': line, 'character': 14}},
+        }
+        if rng.random() < related:
+            diagnostic['relatedInformation'] = [{
+                'message': 'defined here',
+                'location': {'uri': uri, 'range': diagnostic['range']}
+            }]
+        diagnostics.append(diagnostic)
+    return diagnostics
+
+
+def measure_time(parse, payloads, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        [parse(payload) for payload in payloads]
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure_memory(parse, count):
+    """Returns the memory retained by the parsed diagnostics once their payloads are gone, as they
+    are after a notification was handled"""
+    gc.collect()
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    payloads = make_diagnostics(count)
+    parsed = [parse(payload) for payload in payloads]
+    del payloads
+    gc.collect()
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del parsed
+    return retained - baseline
+
+
+def main():
+    for count in [10000, 200000]:
+        payloads = make_diagnostics(count)
+        print('{} diagnostics'.format(count))
+        for name, parse in [('legacy', LegacyDiagnostic.from_lsp), ('slotted', Diagnostic.from_lsp)]:
+            elapsed = measure_time(parse, payloads)
+            retained = measure_memory(parse, count)
+            print('{:>10} {:>10.1f} ms {:>10.1f} MiB {:>8.0f} bytes/diagnostic'.format(
+                name, elapsed * 1000, retained / 2 ** 20, retained / count))
+
+
+if __name__ == '__main__':
+    main()
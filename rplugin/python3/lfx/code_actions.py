@@ -0,0 +1,203 @@
+from .core.typing import Any, Callable, Dict, List, Optional, Tuple, Union, TypedDict
+from .core.protocol import Diagnostic, Request, Point, Range
+from .core.sessions import Session
+from .core.url import filename_to_uri
+from .diagnostics import diagnostic_key
+from .editor import VimView
+
+from collections import OrderedDict
+import threading
+
+CodeActionOrCommand = TypedDict('CodeActionOrCommand', {
+    'title': str,
+    'command': Union[dict, str],
+    'edit': dict,
+    'data': Any
+}, total=False)
+CodeActionsResponse = Optional[List[CodeActionOrCommand]]
+CodeActionsByConfigName = Dict[str, List[CodeActionOrCommand]]
+
+# (file_path, changedtick, ranges, diagnostics) where ranges and diagnostics are tuples of keys
+CodeActionsKey = Tuple[str, int, Tuple[Any, ...], Tuple[Any, ...]]
+
+
+class CodeActionsAtLocation(object):
+    """The code actions of every server for one location. Handlers asking for them while requests
+    are still in flight are called once all the servers answered."""
+
+    def __init__(self, on_complete_handler: Optional[Callable[[CodeActionsByConfigName], None]] = None) -> None:
+        self._commands_by_config = {}  # type: CodeActionsByConfigName
+        self._requested_configs = []  # type: List[str]
+        self._handlers = [on_complete_handler] if on_complete_handler else []
+        self._lock = threading.Lock()
+        self._sealed = False
+
+    def collect(self, config_name: str) -> Callable[[CodeActionsResponse], None]:
+        self._requested_configs.append(config_name)
+        return lambda actions: self.store(config_name, actions)
+
+    def seal(self) -> None:
+        """Called once every request was sent, delivers right away if there was none"""
+        with self._lock:
+            self._sealed = True
+            handlers = self._take_handlers()
+        self._notify(handlers)
+
+    def store(self, config_name: str, actions: CodeActionsResponse) -> None:
+        with self._lock:
+            self._commands_by_config[config_name] = actions or []
+            handlers = self._take_handlers()
+        self._notify(handlers)
+
+    def deliver(self, recipient_handler: Callable[[CodeActionsByConfigName], None]) -> None:
+        with self._lock:
+            if not self.is_complete():
+                self._handlers.append(recipient_handler)
+                return
+        recipient_handler(self._commands_by_config)
+
+    def is_complete(self) -> bool:
+        return self._sealed and len(self._requested_configs) == len(self._commands_by_config)
+
+    def _take_handlers(self) -> List[Callable[[CodeActionsByConfigName], None]]:
+        if not self.is_complete():
+            return []
+        handlers, self._handlers = self._handlers, []
+        return handlers
+
+    def _notify(self, handlers: List[Callable[[CodeActionsByConfigName], None]]) -> None:
+        for handler in handlers:
+            handler(self._commands_by_config)
+
+
+class CodeActionsCache(object):
+    """The code actions of the last `max_entries` locations, least recently used first.
+
+    Keys include the changedtick of the buffer, so results never outlive a change. `invalidate`
+    drops the entries of a changed file right away instead of waiting for them to be evicted.
+    """
+
+    def __init__(self, max_entries: int = 32) -> None:
+        self._entries = OrderedDict()  # type: OrderedDict[CodeActionsKey, CodeActionsAtLocation]
+        self._max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: CodeActionsKey) -> Optional[CodeActionsAtLocation]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: CodeActionsKey, entry: CodeActionsAtLocation) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, file_path: str) -> None:
+        for key in [key for key in self._entries if key[0] == file_path]:
+            del self._entries[key]
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# (session, range, diagnostics) of every server to ask for code actions
+CodeActionTarget = Tuple[Session, Range, List[Diagnostic]]
+
+
+def request_code_actions(view: VimView, location: Union[Point, Range],
+                         actions_handler: Callable[[CodeActionsByConfigName], None],
+                         changedtick: Optional[int] = None) -> CodeActionsAtLocation:
+    """Requests the code actions at a location, or reuses those requested for the same ranges and
+    diagnostics at the same changedtick, even while they are still in flight"""
+    cache = view.editor.lfx.code_actions
+    if isinstance(location, Point):
+        targets = code_action_targets_at_point(view, location)
+    else:
+        targets = code_action_targets_for_selection(view, location)
+    key = location_key(view.file_name(), view.change_count() if changedtick is None else changedtick, targets)
+    actions_at_location = cache.get(key)
+    if actions_at_location:
+        actions_at_location.deliver(actions_handler)
+        return actions_at_location
+
+    actions_at_location = CodeActionsAtLocation(actions_handler)
+    cache.put(key, actions_at_location)
+    for session, relevant_range, diagnostics in targets:
+        do_request(session, actions_at_location, view.file_name(), relevant_range, diagnostics)
+    actions_at_location.seal()
+    return actions_at_location
+
+
+def location_key(file_name: str, changedtick: int, targets: List[CodeActionTarget]) -> CodeActionsKey:
+    ranges = tuple((session.config.name, rge.start.row, rge.start.col, rge.end.row, rge.end.col)
+                   for session, rge, _ in targets)
+    diagnostics = tuple(diagnostic_key(diagnostic) for _, _, target in targets for diagnostic in target)
+    return (file_name, changedtick, ranges, diagnostics)
+
+
+def do_request(session: Session, actions_at_location, file_name, relevant_range, point_diagnostics):
+    params = {
+        "textDocument": {
+            "uri": filename_to_uri(file_name)
+        },
+        "range": relevant_range.to_lsp(),
+        "context": {
+            "diagnostics": list(diagnostic.to_lsp() for diagnostic in point_diagnostics)
+        }
+    }
+    if session.client:
+        collect = actions_at_location.collect(session.config.name)
+        session.client.send_request(
+            Request.codeAction(params),
+            collect,
+            lambda error: collect(None))
+
+
+def code_action_targets_for_selection(view: VimView, selection: Range) -> List[CodeActionTarget]:
+    if not view.file_name():
+        return []
+    return [(session, selection, []) for session in view.available_sessions('codeActionProvider')]
+
+
+def code_action_targets_at_point(view: VimView, point: Point) -> List[CodeActionTarget]:
+    if not view.file_name():
+        return []
+    diagnostics_by_config = view.editor.lfx.diagnostics.index(view.file_name()).at_point(point)
+    targets = []  # type: List[CodeActionTarget]
+    for session in view.available_sessions('codeActionProvider'):
+        point_diagnostics = diagnostics_by_config.get(session.config.name, [])
+        if point_diagnostics:
+            relevant_range = point_diagnostics[0].range
+        else:
+            relevant_range = Range(point, point)
+        targets.append((session, relevant_range, point_diagnostics))
+    return targets
+
+
+def resolve_code_action(session: Session, code_action: CodeActionOrCommand,
+                        handler: Callable[[CodeActionOrCommand], None]) -> None:
+    """Calls the handler with the code action once it has its edit.
+
+    Servers supporting `codeAction/resolve` may leave out the edit of the actions they list, so
+    it is only computed for the action that is run. The action is run as it is if resolving fails.
+    """
+    if isinstance(code_action.get('command'), str) or 'edit' in code_action or not session.client:
+        handler(code_action)
+        return
+    provider = session.get_capability('codeActionProvider')
+    if not isinstance(provider, dict) or not provider.get('resolveProvider'):
+        handler(code_action)
+        return
+    session.client.send_request(
+        Request.resolveCodeAction(code_action),
+        lambda resolved: handler(resolved or code_action),
+        lambda error: handler(code_action))
@@ -0,0 +1,366 @@
+from .core.typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from .core.completion import completion_item_kind_names
+from .core.rpc import Client
+
+import heapq
+import json
+import threading
+
+PREFIX_SCORE = 1000
+
+# How long CompleteDone waits for a pending completionItem/resolve, in seconds
+RESOLVE_TIMEOUT = 0.2
+
+
+class CompletionContext(object):
+    """Where a completion was requested, as sent by lfx#omni"""
+
+    __slots__ = ('bufnr', 'changedtick', 'line', 'start', 'prefix', 'base')
+
+    def __init__(self, bufnr: int, changedtick: int, line: int, start: int, prefix: str, base: str) -> None:
+        self.bufnr = bufnr
+        self.changedtick = changedtick
+        self.line = line
+        self.start = start
+        self.prefix = prefix
+        self.base = base
+
+    @classmethod
+    def from_options(cls, options: Dict[str, Any]) -> 'Optional[CompletionContext]':
+        if 'bufnr' not in options or 'changedtick' not in options:
+            return None
+        return cls(int(options['bufnr']), int(options['changedtick']), int(options.get('line', 0)),
+                   int(options.get('col', 0)) - len(options.get('base', '')),
+                   options.get('prefix', ''), options.get('base', ''))
+
+
+class CompletionEntry(object):
+    """Completion items returned by the server for a given context"""
+
+    def __init__(self, context: Optional[CompletionContext], items: List[Dict[str, Any]], incomplete: bool) -> None:
+        self.context = context
+        self.items = items
+        self.incomplete = incomplete
+
+    def matches(self, context: CompletionContext) -> bool:
+        """Whether the items are still valid for the context, i.e. the user only kept typing the same word"""
+        cached = self.context
+        if cached is None or self.incomplete:
+            return False
+        word = (context.bufnr, context.line, context.start, context.prefix)
+        if (cached.bufnr, cached.line, cached.start, cached.prefix) != word:
+            return False
+        return context.changedtick >= cached.changedtick and context.base.startswith(cached.base)
+
+    def filter(self, base: str, store: 'CompletionItemStore', limit: int = 0) -> List[Dict[str, Any]]:
+        """Returns the completion items matching `base`, ranked by how well they match, then by
+        sortText. Only the best `limit` items are converted, the others are kept for filtering
+        later keystrokes. The items only refer to the LSP items by an id in `store`, which is
+        cleared first."""
+        # empty text edits insert at the position of the original request
+        request_base = self.context.base if self.context else base
+        pattern = base.casefold()
+        if pattern:
+            ranked = self._rank(pattern, request_base, limit)
+        else:
+            ranked = [(0, rec.get('sortText') or rec['label'], index, rec, completion_word(rec, request_base))
+                      for index, rec in enumerate(self.items)]
+        # A heap only pays off when few of the matches are kept, sorting is faster otherwise
+        if limit and len(ranked) > 10 * limit:
+            ranked = heapq.nsmallest(limit, ranked)
+        else:
+            ranked.sort()
+            if limit:
+                del ranked[limit:]
+        store.clear()
+        return [vim_completion_item(rec, word, store.add(rec)) for _, _, _, rec, word in ranked]
+
+    def _rank(self, pattern: str, request_base: str, limit: int
+              ) -> List[Tuple[int, str, int, Dict[str, Any], str]]:
+        """The items matching the folded `pattern` with their negated score, sortText and word"""
+        ranked = []  # type: List[Tuple[int, str, int, Dict[str, Any], str]]
+        others = []  # type: List[Tuple[int, Dict[str, Any], str, str, str]]
+        first = pattern[0]
+        upper = first.upper()
+        # Prefix matches are found with a plain startswith. They outrank every other match, so the
+        # others are only scored when there are not enough prefix matches to fill the limit.
+        for index, rec in enumerate(self.items):
+            word = completion_word(rec, request_base)
+            text = rec.get('filterText') or word
+            # ASCII text needs no folding to tell that it cannot match
+            if first not in text and upper not in text and text.isascii():
+                continue
+            lower = text.casefold()
+            position = lower.find(first)
+            if position < 0:
+                continue
+            if position == 0 and lower.startswith(pattern):
+                ranked.append((-PREFIX_SCORE, rec.get('sortText') or rec['label'], index, rec, word))
+            else:
+                others.append((index, rec, word, text, lower))
+        if not limit or len(ranked) < limit:
+            for index, rec, word, text, lower in others:
+                score = subsequence_score(pattern, lower, text)
+                if score is not None:
+                    ranked.append((-score, rec.get('sortText') or rec['label'], index, rec, word))
+        return ranked
+
+
+class CompletionCache(object):
+    """Keeps the last completion response so following keystrokes can be filtered locally"""
+
+    def __init__(self) -> None:
+        self._entry = None  # type: Optional[CompletionEntry]
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, context: Optional[CompletionContext]) -> Optional[CompletionEntry]:
+        if context is None:
+            return None
+        entry = self._entry
+        if entry and entry.matches(context):
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def store(self, context: Optional[CompletionContext], items: List[Dict[str, Any]],
+              incomplete: bool) -> CompletionEntry:
+        entry = CompletionEntry(context, items, incomplete)
+        if context is not None:
+            self._entry = entry
+        return entry
+
+    def clear(self) -> None:
+        self._entry = None
+
+
+class CompletionItemStore(object):
+    """The LSP items behind the completion menu being shown, referred to by `user_data` ids"""
+
+    def __init__(self) -> None:
+        self._items = {}  # type: Dict[int, Dict[str, Any]]
+        self._next_id = 0
+        self._resolved = {}  # type: Dict[int, PendingCompletion]
+        self._speculative = set()  # type: Set[int]
+        self._selected = None  # type: Optional[int]
+
+    def add(self, item: Dict[str, Any]) -> int:
+        item_id = self._next_id
+        self._next_id += 1
+        self._items[item_id] = item
+        return item_id
+
+    def get(self, item_id: Optional[int]) -> Optional[Dict[str, Any]]:
+        if item_id is None:
+            return None
+        return self._items.get(item_id)
+
+    def resolving(self, item_id: Optional[int]) -> 'Optional[PendingCompletion]':
+        """The completionItem/resolve request for an item, if one was sent"""
+        if item_id is None:
+            return None
+        return self._resolved.get(item_id)
+
+    def add_resolve(self, item_id: int, pending: 'PendingCompletion', speculative: bool = False) -> None:
+        self._resolved[item_id] = pending
+        if speculative:
+            self._speculative.add(item_id)
+
+    def select(self, item_id: Optional[int]) -> None:
+        """Marks an item as selected in the menu. A resolve still in flight for the item selected
+        before is cancelled, unless it was prefetched."""
+        previous = self._selected
+        self._selected = item_id
+        if previous is None or previous == item_id or previous in self._speculative:
+            return
+        pending = self._resolved.get(previous)
+        if pending and pending.cancel():
+            del self._resolved[previous]
+
+    def clear(self) -> None:
+        for pending in self._resolved.values():
+            pending.cancel()
+        self._items.clear()
+        self._resolved.clear()
+        self._speculative.clear()
+        self._selected = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class PendingCompletion(object):
+    """A completion request in flight.
+
+    The caller may wait a short time for the response to serve it inline. A response arriving
+    after that is handed to `on_late` instead, from the transport thread.
+    """
+
+    def __init__(self, client: Client, on_late: Optional[Callable[[Any], None]] = None) -> None:
+        self._client = client
+        self._on_late = on_late
+        self._lock = threading.Lock()
+        self._received = threading.Event()
+        self._late = False
+        self._cancelled = False
+        self.request_id = None  # type: Optional[int]
+        self.response = None  # type: Any
+
+    def resolve(self, response: Any) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            self.response = response
+            self._received.set()
+            late = self._late
+        if late and self._on_late:
+            self._on_late(response)
+
+    def wait(self, timeout: float) -> bool:
+        """Waits up to `timeout` seconds for the response. Returns False if it has to be delivered late."""
+        if timeout > 0 and self._received.wait(timeout):
+            return True
+        with self._lock:
+            if self._received.is_set():
+                return True
+            self._late = True
+            return False
+
+    def cancel(self) -> bool:
+        """Cancels the request unless the response already arrived. Returns whether it was cancelled."""
+        with self._lock:
+            if self._received.is_set():
+                return False
+            if self._cancelled:
+                return True
+            self._cancelled = True
+        if self.request_id is not None:
+            self._client.cancel_request(self.request_id)
+        return True
+
+
+def fuzzy_score(pattern: str, text: str) -> Optional[int]:
+    """Scores `text` against `pattern`, or returns None if the pattern characters are not a
+    subsequence of the text. Prefix matches rank first, all equally so the server's order is kept
+    between them, then matches on word boundaries and consecutive characters."""
+    if not pattern:
+        return 0
+    pattern = pattern.casefold()
+    lower = text.casefold()
+    if lower.startswith(pattern):
+        return PREFIX_SCORE
+    return subsequence_score(pattern, lower, text)
+
+
+def subsequence_score(pattern: str, lower: str, text: str) -> Optional[int]:
+    """Scores a non prefix match of the folded `pattern` in `lower`, the folded `text`"""
+    # Folding never shortens a character, so ASCII text and most other text fold character for
+    # character. Positions only shift when some character expanded, as 'İ' or 'ß' do, and the
+    # folded positions are then mapped back to the characters of the text.
+    if len(lower) == len(text):
+        # Fast path for the usual case, the whole pattern follows the first occurrence of its
+        # first character. Lower case letters and digits after it never start a word.
+        index = lower.find(pattern[0])
+        if index > 0 and lower.startswith(pattern, index):
+            matched = text[index + 1:index + len(pattern)]
+            if matched.isalnum() and matched == matched.lower():
+                before = text[index - 1]
+                score = 5 * (len(pattern) - 1) - index
+                if not before.isalnum() or (before.islower() and text[index].isupper()):
+                    score += 10
+                return min(score, PREFIX_SCORE - 1)
+        origins = None
+    else:
+        origins = fold_origins(text)
+    score = 0
+    previous = -1
+    for char in pattern:
+        index = lower.find(char, previous + 1)
+        if index < 0:
+            return None
+        if index == previous + 1:
+            score += 5
+        else:
+            score -= index - previous - 1
+        if index == 0:
+            score += 10
+        else:
+            position = index
+            if origins is not None:
+                position = origins[index]
+                if position == origins[index - 1]:
+                    previous = index
+                    continue
+            before = text[position - 1]
+            if not before.isalnum() or (before.islower() and text[position].isupper()):
+                score += 10
+        previous = index
+    # Very long patterns must not outrank prefix matches
+    return min(score, PREFIX_SCORE - 1)
+
+
+def fold_origins(text: str) -> List[int]:
+    """The position in `text` of every character of `text.casefold()`"""
+    origins = []  # type: List[int]
+    for position, char in enumerate(text):
+        origins.extend([position] * len(char.casefold()))
+    return origins
+
+
+def completion_word(rec: Dict[str, Any], base: str) -> str:
+    if 'textEdit' in rec and rec['textEdit'] is not None:
+        text_edit = rec['textEdit']
+        if text_edit['range']['start'] == text_edit['range']['end']:
+            return f"{base}{text_edit['newText']}"
+        return text_edit['newText']
+    elif rec.get('insertText', ''):
+        if rec.get('insertTextFormat', 1) != 1:
+            return rec.get('entryName', rec['label'])
+        return rec['insertText']
+    return rec.get('entryName', rec['label'])
+
+
+def completion_item_id(completed_item: Optional[Dict[str, Any]]) -> Optional[int]:
+    """Extracts the store id from the `user_data` of a Vim completion item"""
+    if not completed_item:
+        return None
+    user_data = completed_item.get('user_data')
+    if isinstance(user_data, str):
+        try:
+            user_data = json.loads(user_data)
+        except ValueError:
+            return None
+    if isinstance(user_data, dict) and isinstance(user_data.get('lfx_item'), int):
+        return user_data['lfx_item']
+    return None
+
+
+def vim_completion_item(rec: Dict[str, Any], word: str, item_id: int) -> Dict[str, Any]:
+    item = {
+        'word': word,
+        'abbr': rec['label'],
+        'dup': 1,
+        'icase': 1,
+        'empty': 1,
+        'user_data': '{"lfx_item": %d}' % item_id
+    }
+
+    kind = rec.get('kind')
+    if isinstance(kind, int):
+        item['kind'] = completion_item_kind_names.get(kind)
+
+    detail = rec.get('detail')
+    if detail:
+        item['menu'] = detail
+
+    documentation = rec.get('documentation')
+    if isinstance(documentation, str):
+        item['info'] = documentation
+    elif isinstance(documentation, dict) and 'value' in documentation:
+        item['info'] = documentation['value']
+
+    if rec.get('insertTextFormat') == 2:
+        item['kind'] = 'Snippet'
+
+    return item
@@ -11,7 +11,8 @@ from .core.logging import debug
 from .core.message_request_handler import MessageRequestHandler
 from .core.rpc import Client, Response, EditorLogger, Notification
 from .core.edit import parse_workspace_edit
-from .core.protocol import MessageType
+from .core.protocol import MessageType, FileChangeType
+from .core.url import filename_to_uri
 from .editor import VimEditor
 
 import threading
@@ -238,10 +239,24 @@ class ContextManager(object):
                     candidate = folder
         return candidate
 
+    def notify_files_changed(self, file_paths: List[str]) -> None:
+        """Tells the servers about files that were changed on disk without going through a buffer"""
+        for config_sessions in list(self._sessions.values()):
+            for session in config_sessions:
+                changes = [{"uri": filename_to_uri(file_path), "type": FileChangeType.Changed}
+                           for file_path in file_paths if session.handles_path(file_path)]
+                if changes and session.client:
+                    session.client.send_notification(Notification.didChangeWatchedFiles({"changes": changes}))
+
     def _apply_workspace_edit(self, params: Dict[str, Any], client: Client, request_id: int) -> None:
+        def respond(applied: bool, failure_reason: Optional[str] = None) -> None:
+            result = {"applied": applied}  # type: Dict[str, Any]
+            if failure_reason:
+                result["failureReason"] = failure_reason
+            client.send_response(Response(request_id, result))
+
         def apply():
-            self._editor.apply_workspace_edits(changes)
-            client.send_response(Response(request_id, {"applied": True}))
+            self._editor.apply_workspace_edits(changes, respond)
 
         edit = params.get('edit', dict())
         changes = parse_workspace_edit(edit)
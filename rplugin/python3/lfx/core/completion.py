@@ -73,7 +73,7 @@ def text_edit_text(item: dict, word_col: int) -> Optional[str]:
     return None
 
 
-def parse_completion_response(response: Optional[Union[Dict, List]]) -> Tuple[List[Dict], bool]:
+def parse_completion_response(response: Optional[Union[Dict, List]], sort: bool = True) -> Tuple[List[Dict], bool]:
     items = []  # type: List[Dict]
     is_incomplete = False
     if isinstance(response, dict):
@@ -81,5 +81,6 @@ def parse_completion_response(response: Optional[Union[Dict, List]]) -> Tuple[Li
         is_incomplete = response.get("isIncomplete", False)
     elif isinstance(response, list):
         items = response
-    items = sorted(items, key=lambda item: item.get("sortText") or item["label"])
+    if sort:
+        items = sorted(items, key=lambda item: item.get("sortText") or item["label"])
     return items, is_incomplete
@@ -1,8 +1,12 @@
 from .logging import debug
-from .protocol import Diagnostic
-from .typing import Protocol, List, Dict, Optional
+from .protocol import Diagnostic, DiagnosticSeverity, Point, Range
+from .typing import Protocol, List, Dict, Optional, Tuple
 from .url import uri_to_filename
 
+import sys
+
+Position = Tuple[int, int]
+
 
 class DiagnosticsUI(Protocol):
 
@@ -16,10 +20,109 @@ class DiagnosticsUI(Protocol):
         ...
 
 
+class DiagnosticIndex(object):
+    """Interval index over the diagnostics of one file.
+
+    Diagnostics are sorted by start position and laid out as an implicit balanced tree, each node
+    keeping the furthest end position of its subtree, so overlap queries take O(log n + k).
+    """
+
+    def __init__(self, diagnostics: Dict[str, List[Diagnostic]]) -> None:
+        entries = []  # type: List[Tuple[Position, Position, str, Diagnostic]]
+        for config_name, config_diagnostics in diagnostics.items():
+            for diagnostic in config_diagnostics:
+                start, end = diagnostic.range.start, diagnostic.range.end
+                entries.append(((start.row, start.col), (end.row, end.col), config_name, diagnostic))
+        entries.sort(key=lambda entry: entry[0])
+        self._starts = [entry[0] for entry in entries]
+        self._ends = [entry[1] for entry in entries]
+        self._entries = [(entry[2], entry[3]) for entry in entries]
+        self._max_ends = list(self._ends)
+        self._augment(0, len(entries))
+
+    def _augment(self, lo: int, hi: int) -> Position:
+        if lo >= hi:
+            return (-1, -1)
+        mid = (lo + hi) // 2
+        self._max_ends[mid] = max(self._ends[mid], self._augment(lo, mid), self._augment(mid + 1, hi))
+        return self._max_ends[mid]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def overlapping(self, start: Position, end: Position) -> Dict[str, List[Diagnostic]]:
+        """Diagnostics overlapping the positions from `start` to `end` (inclusive), by config name"""
+        found = []  # type: List[int]
+        stack = [(0, len(self._entries))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_ends[mid] < start:
+                continue
+            stack.append((lo, mid))
+            if self._starts[mid] <= end:
+                if self._ends[mid] >= start:
+                    found.append(mid)
+                stack.append((mid + 1, hi))
+        found.sort()
+        by_config = {}  # type: Dict[str, List[Diagnostic]]
+        for index in found:
+            config_name, diagnostic = self._entries[index]
+            by_config.setdefault(config_name, []).append(diagnostic)
+        return by_config
+
+    def at_point(self, point: Point) -> Dict[str, List[Diagnostic]]:
+        return self.overlapping((point.row, point.col), (point.row, point.col))
+
+    def on_lines(self, first: int, last: int) -> Dict[str, List[Diagnostic]]:
+        return self.overlapping((first, 0), (last, sys.maxsize))
+
+    def in_range(self, rge: Range) -> Dict[str, List[Diagnostic]]:
+        return self.overlapping((rge.start.row, rge.start.col), (rge.end.row, rge.end.col))
+
+
+EMPTY_INDEX = DiagnosticIndex({})
+
+SEVERITY_NAMES = ['error', 'warning', 'information', 'hint']
+
+
+class DiagnosticCounts(object):
+    """Number of diagnostics per severity"""
+
+    __slots__ = ('counts',)
+
+    def __init__(self) -> None:
+        self.counts = [0, 0, 0, 0]
+
+    @classmethod
+    def of(cls, diagnostics: List[Diagnostic]) -> 'DiagnosticCounts':
+        counts = cls()
+        for diagnostic in diagnostics:
+            severity = diagnostic.severity or DiagnosticSeverity.Error
+            counts.counts[min(max(severity, 1), 4) - 1] += 1
+        return counts
+
+    def add(self, other: 'DiagnosticCounts', sign: int = 1) -> None:
+        for index, count in enumerate(other.counts):
+            self.counts[index] += sign * count
+
+    def is_empty(self) -> bool:
+        return not any(self.counts)
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(zip(SEVERITY_NAMES, self.counts))
+
+
 class DiagnosticsStorage(object):
 
     def __init__(self, updateable: Optional[DiagnosticsUI]) -> None:
         self._diagnostics = {}  # type: Dict[str, Dict[str, List[Diagnostic]]]
+        self._indexes = {}  # type: Dict[str, DiagnosticIndex]
+        self._config_counts = {}  # type: Dict[Tuple[str, str], DiagnosticCounts]
+        self._file_counts = {}  # type: Dict[str, DiagnosticCounts]
+        self._total_counts = DiagnosticCounts()
         self._updatable = updateable
 
     def get(self) -> Dict[str, Dict[str, List[Diagnostic]]]:
@@ -28,6 +131,30 @@ class DiagnosticsStorage(object):
     def get_by_file(self, file_path: str) -> Dict[str, List[Diagnostic]]:
         return self._diagnostics.get(file_path, {})
 
+    def index(self, file_path: str) -> DiagnosticIndex:
+        return self._indexes.get(file_path, EMPTY_INDEX)
+
+    def counts(self, file_path: str) -> Dict[str, int]:
+        counts = self._file_counts.get(file_path)
+        return counts.to_dict() if counts else DiagnosticCounts().to_dict()
+
+    def total_counts(self) -> Dict[str, int]:
+        return self._total_counts.to_dict()
+
+    def _update_counts(self, file_path: str, client_name: str, diagnostics: List[Diagnostic]) -> None:
+        key = (file_path, client_name)
+        file_counts = self._file_counts.setdefault(file_path, DiagnosticCounts())
+        previous = self._config_counts.pop(key, None)
+        if previous:
+            file_counts.add(previous, -1)
+            self._total_counts.add(previous, -1)
+        if diagnostics:
+            counts = self._config_counts[key] = DiagnosticCounts.of(diagnostics)
+            file_counts.add(counts)
+            self._total_counts.add(counts)
+        if file_counts.is_empty():
+            del self._file_counts[file_path]
+
     def _update(self, file_path: str, client_name: str, diagnostics: List[Diagnostic]) -> bool:
         updated = False
         if diagnostics:
@@ -41,6 +168,12 @@ class DiagnosticsStorage(object):
                     del self._diagnostics[file_path][client_name]
                 if not self._diagnostics[file_path]:
                     del self._diagnostics[file_path]
+        if updated:
+            self._update_counts(file_path, client_name, diagnostics)
+            if file_path in self._diagnostics:
+                self._indexes[file_path] = DiagnosticIndex(self._diagnostics[file_path])
+            else:
+                self._indexes.pop(file_path, None)
         return updated
 
     def clear(self) -> None:
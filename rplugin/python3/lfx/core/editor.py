@@ -96,6 +96,10 @@ class View(metaclass=abc.ABCMeta):
     def is_valid(self):
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def is_visible(self) -> bool:
+        raise NotImplementedError()
+
 
 class Window(metaclass=abc.ABCMeta):
     @abc.abstractmethod
@@ -118,6 +122,14 @@ class Window(metaclass=abc.ABCMeta):
     def active_view(self) -> Optional[View]:
         raise NotImplementedError()
 
+    @abc.abstractmethod
+    def snapshot_open_files(self, paths: List[str]) -> List[View]:
+        raise NotImplementedError()
+
+    @abc.abstractmethod
+    def visible_files(self, paths: List[str]) -> Dict[str, bool]:
+        raise NotImplementedError()
+
     @abc.abstractmethod
     def status_message(self, msg: str) -> None:
         raise NotImplementedError()
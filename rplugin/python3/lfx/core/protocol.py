@@ -1,4 +1,4 @@
-from .typing import Any, List, Dict, Optional, Union, Mapping, Iterable
+from .typing import Any, List, Dict, Optional, Union, Mapping, Iterable, Tuple
 from .url import filename_to_uri
 from .url import uri_to_filename
 import os
@@ -87,6 +87,12 @@ class CompletionItemKind(enum.IntEnum):
 completion_item_kinds = list(range(CompletionItemKind.Text, CompletionItemKind.TypeParameter + 1))
 
 
+class FileChangeType(object):
+    Created = 1
+    Changed = 2
+    Deleted = 3
+
+
 class DocumentHighlightKind(object):
     Unknown = 0
     Text = 1
@@ -107,6 +113,7 @@ class RequestMethod(object):
     RENAME = "textDocument/rename"
     PREPARE_RENAME = "textDocument/prepareRename"
     CODE_ACTION = "textDocument/codeAction"
+    CODE_ACTION_RESOLVE = "codeAction/resolve"
     DOCUMENT_COLOR = "textDocument/documentColor"
     EXECUTE_COMMAND = "workspace/executeCommand"
     WORKSPACE_SYMBOL = "workspace/symbol"
@@ -116,6 +123,8 @@ class RequestMethod(object):
     DOCUMENT_SYMBOL = "textDocument/documentSymbol"
     DOCUMENT_HIGHLIGHT = "textDocument/documentHighlight"
     RESOLVE = "completionItem/resolve"
+    DOCUMENT_DIAGNOSTIC = "textDocument/diagnostic"
+    WORKSPACE_DIAGNOSTIC = "workspace/diagnostic"
     SHUTDOWN = "shutdown"
 
 
@@ -171,6 +180,10 @@ class Request:
     def codeAction(cls, params: dict) -> 'Request':
         return Request(RequestMethod.CODE_ACTION, params)
 
+    @classmethod
+    def resolveCodeAction(cls, params: Mapping[str, Any]) -> 'Request':
+        return Request(RequestMethod.CODE_ACTION_RESOLVE, params)
+
     @classmethod
     def documentColor(cls, params: dict) -> 'Request':
         return Request(RequestMethod.DOCUMENT_COLOR, params)
@@ -207,6 +220,14 @@ class Request:
     def resolveCompletionItem(cls, params: dict) -> 'Request':
         return Request(RequestMethod.RESOLVE, params)
 
+    @classmethod
+    def documentDiagnostic(cls, params: dict) -> 'Request':
+        return Request(RequestMethod.DOCUMENT_DIAGNOSTIC, params)
+
+    @classmethod
+    def workspaceDiagnostic(cls, params: dict) -> 'Request':
+        return Request(RequestMethod.WORKSPACE_DIAGNOSTIC, params)
+
     @classmethod
     def shutdown(cls) -> 'Request':
         return Request(RequestMethod.SHUTDOWN)
@@ -238,6 +259,7 @@ class ErrorCode:
     # Defined by the protocol
     RequestCancelled = -32800
     ContentModified = -32801
+    ServerCancelled = -32802
 
     # Defined by us
     Timeout = -40000
@@ -290,6 +312,8 @@ class NotificationMethod(object):
     DID_CLOSE = "textDocument/didClose"
     DID_CHANGE_CONFIGURATION = "workspace/didChangeConfiguration"
     DID_CHANGE_WORKSPACE_FOLDERS = "workspace/didChangeWorkspaceFolders"
+    DID_CHANGE_WATCHED_FILES = "workspace/didChangeWatchedFiles"
+    CANCEL_REQUEST = "$/cancelRequest"
     EXIT = "exit"
 
 
@@ -333,6 +357,14 @@ class Notification:
     def didChangeWorkspaceFolders(cls, params: dict) -> 'Notification':
         return Notification(NotificationMethod.DID_CHANGE_WORKSPACE_FOLDERS, params)
 
+    @classmethod
+    def didChangeWatchedFiles(cls, params: dict) -> 'Notification':
+        return Notification(NotificationMethod.DID_CHANGE_WATCHED_FILES, params)
+
+    @classmethod
+    def cancelRequest(cls, request_id: int) -> 'Notification':
+        return Notification(NotificationMethod.CANCEL_REQUEST, {"id": request_id})
+
     @classmethod
     def exit(cls) -> 'Notification':
         return Notification("exit")
@@ -349,6 +381,9 @@ class Notification:
 
 
 class Point(object):
+
+    __slots__ = ('row', 'col')
+
     def __init__(self, row: int, col: int) -> None:
         self.row = int(row)
         self.col = int(col)
@@ -373,6 +408,9 @@ class Point(object):
 
 
 class Range(object):
+
+    __slots__ = ('start', 'end')
+
     def __init__(self, start: Point, end: Point) -> None:
         self.start = start
         self.end = end
@@ -388,7 +426,9 @@ class Range(object):
 
     @classmethod
     def from_lsp(cls, range: dict) -> 'Range':
-        return Range(Point.from_lsp(range['start']), Point.from_lsp(range['end']))
+        start = range['start']
+        end = range['end']
+        return Range(Point(start['line'], start['character']), Point(end['line'], end['character']))
 
     def to_lsp(self) -> Dict[str, Any]:
         return {
@@ -405,6 +445,9 @@ class Range(object):
 
 
 class ContentChange(object):
+
+    __slots__ = ('text', 'range', 'range_length')
+
     def __init__(self, text: str, range: Optional[Range] = None, range_length: Optional[int] = None) -> None:
         """
 
@@ -437,6 +480,9 @@ class ContentChange(object):
 
 
 class Location(object):
+
+    __slots__ = ('file_path', 'range')
+
     def __init__(self, file_path: str, range: Range) -> None:
         self.file_path = file_path
         self.range = range
@@ -448,9 +494,17 @@ class Location(object):
             Range.from_lsp(lsp_location["range"])
         )
 
+    def to_lsp(self) -> Dict[str, Any]:
+        return {
+            "uri": filename_to_uri(self.file_path),
+            "range": self.range.to_lsp()
+        }
+
 
 class DiagnosticRelatedInformation(object):
 
+    __slots__ = ('location', 'message')
+
     def __init__(self, location: Location, message: str) -> None:
         self.location = location
         self.message = message
@@ -461,32 +515,77 @@ class DiagnosticRelatedInformation(object):
             Location.from_lsp(lsp_related_information["location"]),
             lsp_related_information["message"])
 
+    def to_lsp(self) -> Dict[str, Any]:
+        return {
+            "location": self.location.to_lsp(),
+            "message": self.message
+        }
+
 
 class Diagnostic(object):
-    def __init__(self, message: str, range: Range, severity: int, source: Optional[str], lsp_diagnostic: dict,
-                 related_info: List[DiagnosticRelatedInformation]) -> None:
+    """A diagnostic as sent by a server.
+
+    Workspaces may hold hundreds of thousands of diagnostics, so only the fields of the protocol are
+    kept, without the original payload. `to_lsp` builds it again when a diagnostic is sent back, e.g.
+    as the context of a code action request.
+    """
+
+    __slots__ = ('message', 'range', 'severity', 'source', 'related_info', 'code', 'code_description',
+                 'tags', 'data', '_has_severity')
+
+    def __init__(self, message: str, range: Range, severity: Optional[int] = None, source: Optional[str] = None,
+                 related_info: Tuple[DiagnosticRelatedInformation, ...] = (), code: Union[int, str, None] = None,
+                 code_description: Optional[Dict[str, Any]] = None, tags: Optional[List[int]] = None,
+                 data: Any = None) -> None:
         self.message = message
         self.range = range
-        self.severity = severity
+        self._has_severity = severity is not None
+        self.severity = DiagnosticSeverity.Error if severity is None else severity
         self.source = source
-        self._lsp_diagnostic = lsp_diagnostic
         self.related_info = related_info
+        self.code = code
+        self.code_description = code_description
+        self.tags = tags
+        self.data = data
 
     @classmethod
     def from_lsp(cls, lsp_diagnostic: dict) -> 'Diagnostic':
+        get = lsp_diagnostic.get
+        related = get('relatedInformation')
         return Diagnostic(
             # crucial keys
             lsp_diagnostic['message'],
             Range.from_lsp(lsp_diagnostic['range']),
             # optional keys
-            lsp_diagnostic.get('severity', DiagnosticSeverity.Error),
-            lsp_diagnostic.get('source'),
-            lsp_diagnostic,
-            [DiagnosticRelatedInformation.from_lsp(info) for info in lsp_diagnostic.get('relatedInformation', [])]
+            get('severity'),
+            get('source'),
+            tuple(DiagnosticRelatedInformation.from_lsp(info) for info in related) if related else (),
+            get('code'),
+            get('codeDescription'),
+            get('tags'),
+            get('data')
         )
 
     def to_lsp(self) -> Dict[str, Any]:
-        return self._lsp_diagnostic
+        diagnostic = {
+            'message': self.message,
+            'range': self.range.to_lsp()
+        }  # type: Dict[str, Any]
+        if self._has_severity:
+            diagnostic['severity'] = self.severity
+        if self.source is not None:
+            diagnostic['source'] = self.source
+        if self.code is not None:
+            diagnostic['code'] = self.code
+        if self.code_description is not None:
+            diagnostic['codeDescription'] = self.code_description
+        if self.tags is not None:
+            diagnostic['tags'] = self.tags
+        if self.related_info:
+            diagnostic['relatedInformation'] = [info.to_lsp() for info in self.related_info]
+        if self.data is not None:
+            diagnostic['data'] = self.data
+        return diagnostic
 
     def __eq__(self, other: object) -> bool:
         if not isinstance(other, Diagnostic):
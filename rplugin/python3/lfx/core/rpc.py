@@ -149,7 +149,7 @@ class Client(object):
             request: Request,
             handler: Callable[[Optional[Any]], None],
             error_handler: Optional[Callable[[Any], None]] = None,
-    ) -> None:
+    ) -> Optional[int]:
         if self.transport is not None:
             with self._sync_request_cvar:
                 self.request_id += 1
@@ -157,12 +157,23 @@ class Client(object):
                 self._response_handlers[request_id] = (handler, error_handler)
             self.logger.outgoing_request(request_id, request.method, request.params, blocking=False)
             self.send_payload(request.to_payload(request_id))
+            return request_id
         else:
             debug('unable to send', request.method)
             if error_handler is not None:
                 error_handler(None)
             return None
 
+    def cancel_request(self, request_id: int) -> None:
+        """
+        Asks the server to cancel a pending request. Its response, if it still arrives, is dropped.
+        """
+        with self._sync_request_cvar:
+            if request_id not in self._response_handlers:
+                return
+            self._response_handlers[request_id] = (None, lambda error: None)
+        self.send_notification(Notification.cancelRequest(request_id))
+
     def execute_request(
             self,
             request: Request,
@@ -56,12 +56,20 @@ def get_initialize_params(workspace_folders: List[WorkspaceFolder], config: Clie
                     "codeActionKind": {
                         "valueSet": []
                     }
+                },
+                "dataSupport": True,
+                "resolveSupport": {
+                    "properties": ["edit"]
                 }
             },
             "rename": {},
             "colorProvider": {},
             "publishDiagnostics": {
                 "relatedInformation": True
+            },
+            "diagnostic": {
+                "dynamicRegistration": False,
+                "relatedDocumentSupport": True
             }
         },
         "workspace": {
@@ -74,7 +82,13 @@ def get_initialize_params(workspace_folders: List[WorkspaceFolder], config: Clie
                     "valueSet": symbol_kinds
                 }
             },
-            "configuration": True
+            "configuration": True,
+            "didChangeWatchedFiles": {
+                "dynamicRegistration": False
+            },
+            "diagnostics": {
+                "refreshSupport": True
+            }
         }
     }
 
@@ -11,6 +11,8 @@ class Settings(object):
         self.log_server = True
         self.log_stderr = False
         self.log_payloads = False
+        self.document_max_resident = 0
+        self.document_idle_timeout = 0.0
 
 
 class ClientStates(object):
@@ -1,7 +1,10 @@
 from .logging import debug
 from .protocol import WorkspaceFolder
 from .types import WindowLike
-from .typing import List, Optional, Any, Callable
+from .typing import List, Optional, Any, Callable, Dict, Tuple
+from collections import OrderedDict
+import os
+import time
 
 
 def is_subpath_of(file_path: str, potential_subpath: str) -> bool:
@@ -55,6 +58,78 @@ class ProjectFolders(object):
         return False
 
 
+class DirectoryMarkers(object):
+
+    __slots__ = ('checked_at', 'mtime', 'markers')
+
+    def __init__(self, checked_at: float, mtime: Optional[int]) -> None:
+        self.checked_at = checked_at
+        self.mtime = mtime
+        self.markers = {}  # type: Dict[str, bool]
+
+
+class RootFinder(object):
+    """Finds project roots by looking for root patterns from a file's directory upwards.
+
+    The outermost directory containing any of the patterns is the root. Lookups are cached per
+    directory, including negative ones, and shared between all pattern sets. A directory's mtime
+    is checked again at most every `ttl` seconds, and its cached lookups are dropped when it changed.
+    Both caches keep the `max_entries` most recently used directories.
+    """
+
+    def __init__(self, ttl: float = 2.0, max_entries: int = 1024) -> None:
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._directories = OrderedDict()  # type: OrderedDict[str, DirectoryMarkers]
+        self._roots = OrderedDict()  # type: OrderedDict[Tuple[str, Tuple[str, ...]], Tuple[float, Optional[str]]]
+
+    def find_root(self, file_path: str, patterns: List[str]) -> str:
+        directory = os.path.dirname(file_path)
+        return self._resolve(directory, tuple(patterns), time.monotonic()) or directory
+
+    def clear(self) -> None:
+        self._directories.clear()
+        self._roots.clear()
+
+    def _resolve(self, directory: str, patterns: Tuple[str, ...], now: float) -> Optional[str]:
+        key = (directory, patterns)
+        cached = self._roots.get(key)
+        if cached and now - cached[0] < self._ttl:
+            self._roots.move_to_end(key)
+            return cached[1]
+        # Sibling directories share the resolution of their parent, so each directory is walked once.
+        parent = os.path.dirname(directory)
+        root = self._resolve(parent, patterns, now) if parent != directory else None
+        if root is None and self._has_marker(directory, patterns, now):
+            root = directory
+        self._roots[key] = (now, root)
+        self._roots.move_to_end(key)
+        while len(self._roots) > self._max_entries:
+            self._roots.popitem(last=False)
+        return root
+
+    def _has_marker(self, directory: str, patterns: Tuple[str, ...], now: float) -> bool:
+        entry = self._directories.get(directory)
+        if entry is None or now - entry.checked_at >= self._ttl:
+            try:
+                mtime = os.stat(directory).st_mtime_ns  # type: Optional[int]
+            except OSError:
+                mtime = None
+            if entry is None or entry.mtime != mtime:
+                entry = self._directories[directory] = DirectoryMarkers(now, mtime)
+                while len(self._directories) > self._max_entries:
+                    self._directories.popitem(last=False)
+            entry.checked_at = now
+        self._directories.move_to_end(directory)
+        for pattern in patterns:
+            exists = entry.markers.get(pattern)
+            if exists is None:
+                exists = entry.markers[pattern] = os.path.exists(os.path.join(directory, pattern))
+            if exists:
+                return True
+        return False
+
+
 def get_workspace_folders(folders: List[str]) -> List[WorkspaceFolder]:
     return [WorkspaceFolder.from_path(f) for f in folders]
 
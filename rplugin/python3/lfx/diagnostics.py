@@ -1,9 +1,13 @@
-from .editor import VimWindow, VimView
-from .core.typing import Dict, List, Any
-from .core.protocol import DiagnosticSeverity, Point
+from .editor import VimWindow
+from .core.typing import Dict, List, Any, Optional, Set, Tuple
+from .core.protocol import DiagnosticSeverity
 from .core.diagnostics import Diagnostic, DocumentsState
 from .core.logging import debug
 
+import heapq
+import threading
+import time
+
 
 diagnostic_severity_names = {
     DiagnosticSeverity.Error: "E",
@@ -12,15 +16,273 @@ diagnostic_severity_names = {
     DiagnosticSeverity.Hint: "I"
 }
 
+diagnostic_highlight_names = {
+    DiagnosticSeverity.Error: "Error",
+    DiagnosticSeverity.Warning: "Warning",
+    DiagnosticSeverity.Information: "Information",
+    DiagnosticSeverity.Hint: "Hint"
+}
+
+CHANGED_EVENT_COMMAND = ('if exists("#User#LFXDiagnosticsChanged") | '
+                         'doautocmd <nomodeline> User LFXDiagnosticsChanged | endif')
+
+BACKLOG_COMMAND = 'let g:lfx#diagnostics#_backlog = %d'
+
+# (file_path, bufnr, diagnostics, force) for every file rendered in a batch
+RenderItem = Tuple[str, int, List[Diagnostic], bool]
+
+# (file_path, bufnr, diagnostic, mark_id) for every mark to place
+PlacedMark = Tuple[str, int, Diagnostic, int]
+
+# The (top, bottom) line ranges shown of each buffer, 0-based
+Viewports = Dict[int, List[Tuple[int, int]]]
+
+
+def call_buffer(call: List[Any]) -> Optional[int]:
+    """The buffer a batched rendering call applies to, if any"""
+    name, args = call
+    if name.startswith('nvim_buf_'):
+        return args[0]
+    if name == 'nvim_call_function' and args[0] == 'ale#other_source#ShowResults':
+        return args[1][0]
+    return None
+
+
+class RenderStats(object):
+
+    def __init__(self) -> None:
+        self.updates = 0
+        self.renders = 0
+        self.batches = 0
+        self.skipped_unchanged = 0
+        self.skipped_unloaded = 0
+        self.marks_added = 0
+        self.marks_removed = 0
+        self.chunks = 0
+        self.backlog = 0
+        self.events = 0
+        self.last_ms = 0.0
+        self.max_ms = 0.0
+        self.total_ms = 0.0
+
+    def record(self, renders: int, elapsed: float) -> None:
+        self.renders += renders
+        self.batches += 1
+        self.last_ms = elapsed * 1000
+        self.max_ms = max(self.max_ms, self.last_ms)
+        self.total_ms += self.last_ms
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(vars(self))
+
+
+class AleRenderer(object):
+    """Shows diagnostics through ALE, which replaces all the results of a buffer at once"""
+
+    def render(self, items: List[RenderItem], viewports: Optional[Viewports] = None) -> List[List[Any]]:
+        calls = []  # type: List[List[Any]]
+        for _, bufnr, diagnostics, _ in items:
+            loclist = make_loclist(bufnr, diagnostics)
+            calls.append(['nvim_call_function', ['ale#other_source#ShowResults', [bufnr, 'lfx', loclist]]])
+        return calls
+
+    def needs_viewports(self, items: List[RenderItem]) -> bool:
+        return False
+
+    def has_backlog(self) -> bool:
+        return False
+
+    def render_backlog(self, viewports: Viewports) -> List[List[Any]]:
+        return []
+
+    def forget(self, bufnr: int) -> None:
+        pass
+
+    def invalidate(self, bufnr: int) -> None:
+        pass
+
+
+class ExtmarkRenderer(object):
+    """Shows diagnostics as extmarks: highlights and signs in one namespace, virtual text in another.
+
+    The marks placed in each buffer are remembered by diagnostic, so an update only deletes the marks
+    of diagnostics that are gone and places marks for new ones. Neovim moves the marks along with
+    text edits in between.
+
+    When more than `chunk_size` marks are to be placed and the viewports are known, the marks on the
+    visible lines, plus `margin` lines around them, are placed first. The others are kept in a
+    backlog and placed `chunk_size` at a time by `render_backlog`, nearest to the viewports first.
+    """
+
+    def __init__(self, window: VimWindow, stats: RenderStats, virtual_text: bool = True,
+                 chunk_size: int = 500, margin: int = 100) -> None:
+        self._window = window
+        self._vim = window.vim
+        self._stats = stats
+        self._virtual_text = virtual_text
+        self._chunk_size = chunk_size
+        self._margin = margin
+        self._marks = {}  # type: Dict[int, Dict[Tuple[Any, ...], int]]
+        self._backlog = {}  # type: Dict[int, Dict[Tuple[Any, ...], PlacedMark]]
+        self._invalid = set()  # type: Set[int]
+        self._next_id = 1
+        self._namespace = None  # type: Optional[int]
+        self._virtual_namespace = None  # type: Optional[int]
+
+    def _setup(self) -> None:
+        if self._namespace is None:
+            self._vim.call('lfx#diagnostics#define_highlights')
+            self._namespace = self._vim.api.create_namespace('lfx-diagnostics')
+            self._virtual_namespace = self._vim.api.create_namespace('lfx-diagnostics-virtual')
+
+    def render(self, items: List[RenderItem], viewports: Optional[Viewports] = None) -> List[List[Any]]:
+        self._setup()
+        calls = []  # type: List[List[Any]]
+        added = []  # type: List[PlacedMark]
+        for file_path, bufnr, diagnostics, force in items:
+            if force or bufnr in self._invalid:
+                self._invalid.discard(bufnr)
+                self._marks.pop(bufnr, None)
+                self._backlog.pop(bufnr, None)
+                calls.append(['nvim_buf_clear_namespace', [bufnr, self._namespace, 0, -1]])
+                calls.append(['nvim_buf_clear_namespace', [bufnr, self._virtual_namespace, 0, -1]])
+            marks = self._marks.setdefault(bufnr, {})
+            backlog = self._backlog.get(bufnr, {})
+            keys = {diagnostic_key(diagnostic): diagnostic for diagnostic in diagnostics}
+            for key in [key for key in marks if key not in keys]:
+                mark_id = marks.pop(key)
+                if backlog.pop(key, None) is None:
+                    calls.append(['nvim_buf_del_extmark', [bufnr, self._namespace, mark_id]])
+                    calls.append(['nvim_buf_del_extmark', [bufnr, self._virtual_namespace, mark_id]])
+                    self._stats.marks_removed += 1
+            for key, diagnostic in keys.items():
+                if key not in marks:
+                    marks[key] = self._next_id
+                    added.append((file_path, bufnr, diagnostic, self._next_id))
+                    self._next_id += 1
+            if bufnr in self._backlog and not backlog:
+                del self._backlog[bufnr]
+        if viewports is not None and self._chunk_size and len(added) > self._chunk_size:
+            added = self._defer(added, viewports)
+        calls.extend(self._place_marks(added))
+        self._update_backlog_stats()
+        return calls
+
+    def needs_viewports(self, items: List[RenderItem]) -> bool:
+        if not self._chunk_size:
+            return False
+        return bool(self._backlog) or sum(len(item[2]) for item in items) > self._chunk_size
+
+    def has_backlog(self) -> bool:
+        return bool(self._backlog)
+
+    def render_backlog(self, viewports: Viewports) -> List[List[Any]]:
+        """Places the next chunk of deferred marks, nearest to the current viewports first"""
+        pending = [mark for backlog in self._backlog.values() for mark in backlog.values()]
+        chunk = heapq.nsmallest(self._chunk_size, pending,
+                                key=lambda mark: self._distance(mark[1], mark[2], viewports))
+        for _, bufnr, diagnostic, _ in chunk:
+            backlog = self._backlog[bufnr]
+            del backlog[diagnostic_key(diagnostic)]
+            if not backlog:
+                del self._backlog[bufnr]
+        self._stats.chunks += 1
+        self._update_backlog_stats()
+        return self._place_marks(chunk)
+
+    def forget(self, bufnr: int) -> None:
+        self._marks.pop(bufnr, None)
+        self._backlog.pop(bufnr, None)
+        self._update_backlog_stats()
+
+    def invalidate(self, bufnr: int) -> None:
+        """Forgets the marks of a buffer that may only be partly placed, they are all cleared and
+        placed again on the next render"""
+        self.forget(bufnr)
+        self._invalid.add(bufnr)
+
+    def _defer(self, added: List[PlacedMark], viewports: Viewports) -> List[PlacedMark]:
+        """Keeps the marks away from the viewports for later, returns the ones to place now"""
+        ranked = sorted(added, key=lambda mark: self._distance(mark[1], mark[2], viewports))
+        now = min(self._chunk_size, len(ranked))
+        while now < len(ranked) and self._distance(ranked[now][1], ranked[now][2], viewports) == 0:
+            now += 1
+        for mark in ranked[now:]:
+            self._backlog.setdefault(mark[1], {})[diagnostic_key(mark[2])] = mark
+        return ranked[:now]
+
+    def _distance(self, bufnr: int, diagnostic: Diagnostic, viewports: Viewports) -> int:
+        """How many lines a diagnostic is away from the margin around the closest viewport of its
+        buffer. Diagnostics of hidden buffers come after all the visible ones."""
+        row = diagnostic.range.start.row
+        distance = None  # type: Optional[int]
+        for top, bottom in viewports.get(bufnr, ()):
+            lines = max(0, top - self._margin - row, row - bottom - self._margin)
+            if distance is None or lines < distance:
+                distance = lines
+        return (1 << 30) + row if distance is None else distance
+
+    def _update_backlog_stats(self) -> None:
+        self._stats.backlog = sum(len(backlog) for backlog in self._backlog.values())
+
+    def _place_marks(self, added: List[PlacedMark]) -> List[List[Any]]:
+        positions = []  # type: List[Tuple[str, int, int]]
+        for file_path, _, diagnostic, _ in added:
+            positions.append((file_path, diagnostic.range.start.row, diagnostic.range.start.col))
+            positions.append((file_path, diagnostic.range.end.row, diagnostic.range.end.col))
+        adjusted = self._window.editor.adjust_many_from_lsp(positions) if positions else []
+        self._stats.marks_added += len(added)
+
+        calls = []  # type: List[List[Any]]
+        for index, (_, bufnr, diagnostic, mark_id) in enumerate(added):
+            (start_row, start_col), (end_row, end_col) = adjusted[index * 2], adjusted[index * 2 + 1]
+            name = diagnostic_highlight_names.get(diagnostic.severity, 'Error')
+            calls.append(['nvim_buf_set_extmark', [bufnr, self._namespace, start_row, start_col, {
+                'id': mark_id,
+                'end_row': end_row,
+                'end_col': end_col,
+                'hl_group': 'LFXDiagnostic' + name,
+                'sign_text': diagnostic_severity_names.get(diagnostic.severity, 'E'),
+                'sign_hl_group': 'LFXDiagnosticSign' + name,
+                'strict': False,
+            }]])
+            if self._virtual_text:
+                calls.append(['nvim_buf_set_extmark', [bufnr, self._virtual_namespace, start_row, 0, {
+                    'id': mark_id,
+                    'virt_text': [[' ' + diagnostic.message.split('\n', 1)[0], 'LFXDiagnosticVirtual' + name]],
+                    'strict': False,
+                }]])
+        return calls
+
 
 class DiagnosticsPresenter(object):
+    """Renders diagnostics through ALE, or as extmarks with the 'extmarks' renderer.
+
+    Updates are coalesced per file for `render_delay` seconds. Files without a loaded buffer are
+    skipped until they get opened, and files whose diagnostics did not change are not rendered again.
+    Marks the renderer deferred are placed in chunks on later ticks, every `backlog_delay` seconds.
+    """
 
-    def __init__(self, window: VimWindow, documents_state: DocumentsState) -> None:
+    def __init__(self, window: VimWindow, documents_state: DocumentsState, render_delay: float = 0.05,
+                 renderer: str = 'ale', virtual_text: bool = True, chunk_size: int = 500,
+                 margin: int = 100, backlog_delay: float = 0.01) -> None:
         self._window = window
         self._vim = window.vim
         self._dirty = False
         self._received_diagnostics_after_change = False
         self._diagnostics = {}  # type: Dict[str, Dict[str, List[Diagnostic]]]
+        self._render_delay = render_delay
+        self._pending = set()  # type: Set[str]
+        self._pending_lock = threading.Lock()
+        self._render_timer = None  # type: Optional[threading.Timer]
+        self._rendered = {}  # type: Dict[str, Tuple[int, int]]
+        self._backlog_delay = backlog_delay
+        self._backlog_timer = None  # type: Optional[threading.Timer]
+        self.stats = RenderStats()
+        if renderer == 'extmarks':
+            self._renderer = ExtmarkRenderer(window, self.stats, virtual_text, chunk_size, margin)  # type: Any
+        else:
+            self._renderer = AleRenderer()
         setattr(documents_state, 'changed', self.on_document_changed)
         setattr(documents_state, 'saved', self.on_document_saved)
 
@@ -31,7 +293,7 @@ class DiagnosticsPresenter(object):
         pass
 
     def update(self, file_path: str, config_name: str, diagnostics: Dict[str, Dict[str, List[Diagnostic]]]) -> None:
-        debug("received diagnostics: {}".format(diagnostics))
+        debug("received diagnostics for {}".format(file_path))
         self._diagnostics = diagnostics
         self._received_diagnostics_after_change = True
 
@@ -39,46 +301,130 @@ class DiagnosticsPresenter(object):
             debug('ignoring update to closed window')
             return
 
-        # diagnostics = diagnostics.get(file_path, {}).get(config_name, [])
+        with self._pending_lock:
+            self.stats.updates += 1
+            self._pending.add(file_path)
+            if self._render_timer is None:
+                self._render_timer = threading.Timer(
+                    self._render_delay, lambda: self._vim.async_call(self.render_pending))
+                self._render_timer.daemon = True
+                self._render_timer.start()
 
-        # self._vim.async_call(self._show_results, file_path, diagnostics)
-        self._vim.async_call(self.show_all, file_path)
+    def render_pending(self) -> None:
+        with self._pending_lock:
+            file_paths = list(self._pending)
+            self._pending.clear()
+            self._render_timer = None
+        self.render(file_paths, notify=True)
 
-    def show_all(self, file_path):
-        diagnostics = self._diagnostics.get(file_path, {})  # type: Dict[str, List[Diagnostic]]
-        if not diagnostics:
-            self._show_results(file_path, [])
+    def render(self, file_paths: List[str], force: bool = False, notify: bool = False) -> None:
+        """Renders the diagnostics of the given files that have a loaded buffer, in one batch.
+
+        With `notify`, the LFXDiagnosticsChanged event is triggered once if anything may have changed.
+        """
+        started = time.perf_counter()
+        items = []  # type: List[RenderItem]
+        changed = False
+        for file_path in file_paths:
+            view = self._window.find_open_file(file_path)
+            if not view:
+                self.stats.skipped_unloaded += 1
+                changed = True
+                continue
+            bufnr = view.buffer_id()
+            diagnostics = self._file_diagnostics(file_path)
+            digest = hash((bufnr, tuple(diagnostic_key(diagnostic) for diagnostic in diagnostics)))
+            if not force and self._rendered.get(file_path, (bufnr, hash((bufnr, ()))))[1] == digest:
+                self.stats.skipped_unchanged += 1
+                continue
+            self._rendered[file_path] = (bufnr, digest)
+            items.append((file_path, bufnr, diagnostics, force))
+        calls = []  # type: List[List[Any]]
+        if items:
+            viewports = self._viewports() if self._renderer.needs_viewports(items) else None
+            calls = self._renderer.render(items, viewports)
+        # b:lfx_diagnostics holds the location list of the buffer, whichever the renderer
+        for _, bufnr, diagnostics, _ in items:
+            calls.append(['nvim_buf_set_var', [bufnr, 'lfx_diagnostics', make_loclist(bufnr, diagnostics)]])
+        if notify and (items or changed):
+            calls.append(['nvim_command', [CHANGED_EVENT_COMMAND]])
+            self.stats.events += 1
+        if items and self._renderer.has_backlog():
+            calls.append(['nvim_command', [BACKLOG_COMMAND % 1]])
+            self._schedule_backlog()
+        if calls:
+            self._call_atomic(calls)
+        if items:
+            self.stats.record(len(items), time.perf_counter() - started)
+
+    def render_backlog(self) -> None:
+        """Places the next chunk of deferred marks, then schedules the following one"""
+        self._backlog_timer = None
+        if not self._renderer.has_backlog() or not self._window.is_valid():
+            return
+        started = time.perf_counter()
+        calls = self._renderer.render_backlog(self._viewports())
+        if self._renderer.has_backlog():
+            self._schedule_backlog()
         else:
-            file_diagnostics = []
-            for config_diagnostics in diagnostics.values():
-                file_diagnostics.extend(config_diagnostics)
-            self._show_results(file_path, file_diagnostics)
+            calls.append(['nvim_command', [BACKLOG_COMMAND % 0]])
+        self._call_atomic(calls)
+        self.stats.record(0, time.perf_counter() - started)
 
-    def _show_results(self, file_path, diagnostics: List[Diagnostic]):
-        view = self._window.find_open_file(file_path)
+    def on_scrolled(self) -> None:
+        """Places the chunk nearest to the new viewports right away instead of on the next tick"""
+        if self._backlog_timer:
+            self._backlog_timer.cancel()
+        self.render_backlog()
 
-        if not view:
+    def _call_atomic(self, calls: List[List[Any]]) -> None:
+        """Sends a batch of calls. Neovim stops a batch at the first call that fails, so the buffers
+        of that call and of the ones after it are rendered from scratch on their next update."""
+        _, error = self._vim.api.call_atomic(calls)
+        if not error:
             return
+        debug('error rendering diagnostics: {}'.format(error))
+        failed = set(bufnr for bufnr in map(call_buffer, calls[error[0]:]) if bufnr is not None)
+        for bufnr in failed:
+            self._renderer.invalidate(bufnr)
+        for file_path in [path for path, (bufnr, _) in self._rendered.items() if bufnr in failed]:
+            del self._rendered[file_path]
+
+    def _schedule_backlog(self) -> None:
+        if self._backlog_timer is None:
+            self._backlog_timer = threading.Timer(self._backlog_delay,
+                                                  lambda: self._vim.async_call(self.render_backlog))
+            self._backlog_timer.daemon = True
+            self._backlog_timer.start()
 
-        bufnr = view.buffer_id()
+    def _viewports(self) -> Viewports:
+        viewports = self._vim.call('lfx#diagnostics#viewports')
+        return {int(bufnr): [(top, bottom) for top, bottom in lines] for bufnr, lines in viewports.items()}
 
-        loclist = []  # type: List[Dict[str, Any]]
+    def forget(self, file_path: str, bufnr: int) -> None:
+        """Drops what was rendered for a closed buffer, so it is rendered from scratch when loaded again"""
+        self._rendered.pop(file_path, None)
+        self._renderer.forget(bufnr)
 
-        for diagnostic in diagnostics:
-            start = diagnostic.range.start
-            end = diagnostic.range.end
-            loclist.append({
-                'type': diagnostic_severity_names.get(diagnostic.severity, 'E'),
-                'text': diagnostic.message,
-                'lnum': start.row + 1,
-                'col': start.col + 1,
-                'end_lnum': end.row + 1,
-                'end_col': end.col + 1,
-                'bufnr': bufnr
-            })
+    def show_all(self, file_path):
+        self.render([file_path], force=True)
+
+    def quickfix_list(self, file_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """The diagnostics of a file, or of every file, as a quickfix list. Only built when a list
+        is opened, as it may hold every diagnostic of the workspace."""
+        file_paths = [file_path] if file_path else sorted(self._diagnostics)
+        items = []  # type: List[Dict[str, Any]]
+        for path in file_paths:
+            diagnostics = sorted(self._file_diagnostics(path),
+                                 key=lambda d: (d.range.start.row, d.range.start.col))
+            items.extend(make_loclist(0, diagnostics, path))
+        return items
 
-        self._vim.api.buf_set_var(bufnr, 'lfx_diagnostics', loclist)
-        self._vim.call('ale#other_source#ShowResults', bufnr, 'lfx', loclist)
+    def _file_diagnostics(self, file_path: str) -> List[Diagnostic]:
+        file_diagnostics = []  # type: List[Diagnostic]
+        for config_diagnostics in self._diagnostics.get(file_path, {}).values():
+            file_diagnostics.extend(config_diagnostics)
+        return file_diagnostics
 
     def select(self, direction: int) -> None:
         pass
@@ -87,16 +433,29 @@ class DiagnosticsPresenter(object):
         pass
 
 
-def view_diagnostics(view: VimView) -> Dict[str, List[Diagnostic]]:
-    return view.diagnostics()
+def diagnostic_key(diagnostic: Diagnostic) -> Tuple[Any, ...]:
+    start = diagnostic.range.start
+    end = diagnostic.range.end
+    return (diagnostic.severity, diagnostic.message, start.row, start.col, end.row, end.col)
 
 
-def filter_by_point(file_diagnostics: Dict[str, List[Diagnostic]], point: Point) -> Dict[str, List[Diagnostic]]:
-    diagnostics_by_config = {}
-    for config_name, diagnostics in file_diagnostics.items():
-        point_diagnostics = [
-            diagnostic for diagnostic in diagnostics if diagnostic.range.contains(point)
-        ]
-        if point_diagnostics:
-            diagnostics_by_config[config_name] = point_diagnostics
-    return diagnostics_by_config
+def make_loclist(bufnr: int, diagnostics: List[Diagnostic], filename: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Converts diagnostics to location list items, referring to the file by name if given"""
+    loclist = []  # type: List[Dict[str, Any]]
+    for diagnostic in diagnostics:
+        start = diagnostic.range.start
+        end = diagnostic.range.end
+        item = {
+            'type': diagnostic_severity_names.get(diagnostic.severity, 'E'),
+            'text': diagnostic.message,
+            'lnum': start.row + 1,
+            'col': start.col + 1,
+            'end_lnum': end.row + 1,
+            'end_col': end.col + 1,
+        }  # type: Dict[str, Any]
+        if filename:
+            item['filename'] = filename
+        else:
+            item['bufnr'] = bufnr
+        loclist.append(item)
+    return loclist
@@ -0,0 +1,51 @@
+from .core.typing import Any, List, Optional, Tuple
+from .core.protocol import Point, Range
+
+from pynvim import Nvim
+
+# (start_row, start_col, end_row, end_col) as byte indexes
+ByteRange = Tuple[int, int, int, int]
+
+
+class DocumentHighlights(object):
+    """The document highlights shown in a buffer.
+
+    The ranges of the last response are kept with the changedtick they were requested at, so
+    moving the cursor within them does not ask the server again. They are placed as extmarks in a
+    single `nvim_call_atomic`, in a namespace that is created once.
+    """
+
+    def __init__(self, vim: Nvim) -> None:
+        self._vim = vim
+        self._namespace = None  # type: Optional[int]
+        self._bufnr = None  # type: Optional[int]
+        self._changedtick = None  # type: Optional[int]
+        self._ranges = []  # type: List[Range]
+        self.reused = 0
+
+    def covers(self, bufnr: int, changedtick: int, point: Point) -> bool:
+        """Whether the highlights shown already are those of the symbol at this point"""
+        if bufnr != self._bufnr or changedtick != self._changedtick:
+            return False
+        for rge in self._ranges:
+            if (rge.start.row, rge.start.col) <= (point.row, point.col) <= (rge.end.row, rge.end.col):
+                self.reused += 1
+                return True
+        return False
+
+    def show(self, bufnr: int, changedtick: int, ranges: List[Range], byte_ranges: List[ByteRange],
+             hl_group: str) -> None:
+        self._bufnr = bufnr
+        self._changedtick = changedtick
+        self._ranges = ranges
+        if self._namespace is None:
+            self._namespace = self._vim.api.create_namespace('lfx#document_highlight#ns_id')
+        calls = [['nvim_buf_clear_namespace', [bufnr, self._namespace, 0, -1]]]  # type: List[List[Any]]
+        for start_row, start_col, end_row, end_col in byte_ranges:
+            calls.append(['nvim_buf_set_extmark', [bufnr, self._namespace, start_row, start_col, {
+                'end_row': end_row,
+                'end_col': end_col,
+                'hl_group': hl_group,
+                'strict': False,
+            }]])
+        self._vim.api.call_atomic(calls)
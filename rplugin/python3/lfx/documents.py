@@ -1,4 +1,4 @@
-from .core.typing import Any, Dict, List, Optional, Iterator, Tuple
+from .core.typing import Any, Callable, Dict, List, Optional, Iterator, Tuple, Set
 from .core.settings import Settings
 from .core.workspace import ProjectFolders
 from .core.configurations import create_window_configs
@@ -7,18 +7,76 @@ from .core.sessions import Session
 from .core.types import config_supports_language_id, LanguageConfig, ClientConfig, ConfigRegistry
 from .core.logging import debug
 from .core.editor import View, Window
+from .editor import VimView
 from .core.views import did_open, did_close, did_change, will_save, did_save
 from .core.protocol import TextDocumentSyncKindIncremental
 
+from collections import OrderedDict
+import time
+
 
 def nop(): return None
 
 
+def nop_view(view: VimView) -> None:
+    return None
+
+
 class DocumentState:
     version = None
     content = None
 
 
+class DocumentResidency(object):
+    """Tracks document activity, least recently active first.
+
+    Documents that exceed `max_resident` or have been idle for longer than `idle_timeout` seconds
+    become candidates for being closed on the server side. A value of 0 disables either limit.
+    """
+
+    def __init__(self, max_resident: int = 0, idle_timeout: float = 0) -> None:
+        self.max_resident = max_resident
+        self.idle_timeout = idle_timeout
+        self._active = OrderedDict()  # type: OrderedDict[str, Tuple[float, View]]
+        self._suspended = set()  # type: Set[str]
+
+    def touch(self, view: View) -> None:
+        file_name = view.file_name()
+        if file_name:
+            self._active[file_name] = (time.monotonic(), view)
+            self._active.move_to_end(file_name)
+            self._suspended.discard(file_name)
+
+    def suspend(self, file_name: str) -> None:
+        self._active.pop(file_name, None)
+        self._suspended.add(file_name)
+
+    def forget(self, file_name: str) -> None:
+        self._active.pop(file_name, None)
+        self._suspended.discard(file_name)
+
+    def clear(self) -> None:
+        self._active.clear()
+        self._suspended.clear()
+
+    def is_suspended(self, file_name: str) -> bool:
+        return file_name in self._suspended
+
+    def suspended(self) -> List[str]:
+        return list(self._suspended)
+
+    def over_limit(self) -> bool:
+        return 0 < self.max_resident < len(self._active)
+
+    def is_idle(self, file_name: str, now: float) -> bool:
+        if self.idle_timeout <= 0 or file_name not in self._active:
+            return False
+        return now - self._active[file_name][0] > self.idle_timeout
+
+    def least_recent(self) -> List[Tuple[str, View]]:
+        return [(file_name, view) for file_name, (_, view) in self._active.items()]
+
+
 class VimDocumentHandler(object):
     def __init__(self, editor: Any, settings: Settings, workspace: ProjectFolders,
                  window: Window, configs: ConfigRegistry) -> None:
@@ -31,10 +89,13 @@ class VimDocumentHandler(object):
         self._sessions = dict()  # type: Dict[str, List[Session]]
         self._workspace = workspace
         self._window = window
+        self._residency = DocumentResidency(settings.document_max_resident, settings.document_idle_timeout)
+        self._idle_check_scheduled = False
         self.changed = nop
         self.saved = nop
-        self.on_attach = nop
-        self.on_detach = nop
+        self.on_attach = nop_view  # type: Callable[[VimView], None]
+        self.on_detach = nop_view  # type: Callable[[VimView], None]
+        self.on_did_change = nop_view  # type: Callable[[VimView], None]
 
     def add_session(self, session: Session) -> None:
         self._sessions.setdefault(session.config.name, []).append(session)
@@ -48,6 +109,7 @@ class VimDocumentHandler(object):
         # for view in self._window.views():
         #     self._detach_view(view)
         self._document_states.clear()
+        self._residency.clear()
 
     def has_document_state(self, path: str) -> bool:
         return path in self._document_states
@@ -66,40 +128,95 @@ class VimDocumentHandler(object):
 
     def _notify_open_documents(self, session: Session) -> None:
         # Note: a copy is made of self._document_states because it may be modified in another thread.
-        for file_name in list(self._document_states.keys()):
-            if session.handles_path(file_name):
-                view = self._window.find_open_file(file_name)
-                if view:
-                    language_id = view.language_id()
-                    if config_supports_language_id(session.config, language_id):
-                        sessions = self._get_applicable_sessions(view)
-                        self._attach_view(view, sessions)
-                        for session in sessions:
-                            if session.should_notify_did_open():
-                                self._notify_did_open(view, session)
+        paths = [file_name for file_name in list(self._document_states.keys()) if session.handles_path(file_name)]
+        views = self._window.snapshot_open_files(paths)
+        recency = {file_name: index for index, (file_name, _) in enumerate(self._residency.least_recent())}
+        # Visible documents first, then the most recently active ones.
+        views.sort(key=lambda v: (not v.is_visible(), -recency.get(v.file_name() or '', -1)))
+        for view in views:
+            language_id = view.language_id()
+            if config_supports_language_id(session.config, language_id):
+                self._attach_view(view, self._get_applicable_sessions(view))
+                if session.should_notify_did_open():
+                    self._notify_did_open(view, session)
 
     def _config_languages(self, view: View) -> Dict[str, LanguageConfig]:
         return self._configs.syntax_config_languages(view)
 
     def _attach_view(self, view: View, sessions: List[Session]) -> None:
-        self.on_attach(view)
+        self.on_attach(view)  # type: ignore
 
     def _detach_view(self, view: View) -> None:
-        self.on_detach(view)
+        self.on_detach(view)  # type: ignore
 
     def handle_did_open(self, view: View) -> None:
         file_name = view.file_name()
         if file_name and file_name not in self._document_states:
             config_languages = self._config_languages(view)
             if len(config_languages):
+                resuming = self._residency.is_suspended(file_name)
                 self._document_states[file_name] = DocumentState()
+                self._residency.touch(view)
                 # the sessions may not be available yet,
                 # the document will get synced when a session is added.
                 sessions = self._get_applicable_sessions(view)
-                self._attach_view(view, sessions)
+                if not resuming:
+                    self._attach_view(view, sessions)
                 for session in sessions:
                     if session.should_notify_did_open():
                         self._notify_did_open(view, session)
+        elif file_name:
+            self._residency.touch(view)
+        self._evict_idle_documents()
+
+    def ensure_resident(self, view: View) -> None:
+        """Reopens a document that was closed on the server side because it was idle."""
+        file_name = view.file_name()
+        if file_name and self._residency.is_suspended(file_name):
+            self.handle_did_open(view)
+
+    def _evict_idle_documents(self) -> None:
+        self._schedule_idle_check()
+        now = time.monotonic()
+        documents = self._residency.least_recent()
+        if not documents:
+            return
+        if not self._residency.over_limit() and not self._residency.is_idle(documents[0][0], now):
+            return
+        suspended = self._residency.suspended()
+        visible = self._window.visible_files([file_name for file_name, _ in documents] + suspended)
+        # The buffer of a suspended document may have been wiped since, it would never come back
+        for file_name in suspended:
+            if file_name not in visible:
+                self._residency.forget(file_name)
+        for file_name, view in documents:
+            if not self._residency.over_limit() and not self._residency.is_idle(file_name, now):
+                break
+            if file_name in self._document_states and not visible.get(file_name, False) \
+                    and view.buffer_id() not in self._pending_buffer_changes:
+                self._suspend_document(file_name, view)
+
+    def _schedule_idle_check(self) -> None:
+        """Checks again for idle documents once the least recently active one may have become idle"""
+        if self._residency.idle_timeout <= 0 or self._idle_check_scheduled:
+            return
+        self._idle_check_scheduled = True
+        self._editor.set_timeout_async(self._on_idle_check, int(self._residency.idle_timeout * 1000))
+
+    def _on_idle_check(self) -> None:
+        self._idle_check_scheduled = False
+        if self._residency.least_recent():
+            self._evict_idle_documents()
+
+    def _suspend_document(self, file_name: str, view: View) -> None:
+        debug("Suspending idle document", file_name)
+        del self._document_states[file_name]
+        self._residency.suspend(file_name)
+        # mypy: expected editor.View, got View
+        notification = did_close(view)  # type: ignore
+        for session in self._get_applicable_sessions(view):
+            if session.client and session.should_notify_did_close():
+                session.client.send_notification(notification)
 
     def _notify_did_open(self, view: View, session: Session) -> None:
         language_id = view.language_id()
@@ -110,6 +227,7 @@ class VimDocumentHandler(object):
     def handle_did_close(self, view: View) -> None:
         file_name = view.file_name() or ""
         debug("Handling did_close", file_name)
+        self._residency.forget(file_name)
         try:
             del self._document_states[file_name]
         except KeyError:
@@ -202,6 +320,7 @@ class VimDocumentHandler(object):
                         session.client.send_notification(notification)
                 self._document_states[file_name].version = change_count
                 self._document_states[file_name].content = content
+                self.on_did_change(view)  # type: ignore
 
 
 class VimConfigManager(object):
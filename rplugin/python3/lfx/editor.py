@@ -1,25 +1,37 @@
-from .core.typing import Callable, List, Optional, Any, Dict, Iterator
+from .core.typing import Callable, List, Optional, Any, Dict, Iterator, Iterable, Tuple
 from .core.editor import Editor, Window, View
 from .core.sessions import Session
 from .core.logging import debug
 from .core.diagnostics import Diagnostic
-from .core.edit import parse_range
-from .util import to_byte_index, to_char_index
+from .core.edit import parse_range, sort_by_application_order
+from .core.workspace import RootFinder
+from .file_edits import FileEditJob, undo_file_edits, prune_backups
+from .util import to_byte_index, to_char_index, read_lines
 import os
 import re
+import shutil
+import tempfile
 
 from pynvim import Nvim
 from pynvim.api import Buffer
-from threading import Timer
+from threading import Timer, Thread
 
 TAG = '[LFX]'
 
 
+def normalize_path(path: str) -> str:
+    return os.path.normcase(os.path.normpath(path)) if path else path
+
+
 class VimEditor(Editor):
     def __init__(self, lfx) -> None:
         self.lfx = lfx
         self.vim: Nvim = self.lfx.vim
         self.window = VimWindow(self)
+        self.last_edit_manifest = None  # type: Optional[str]
+        self.last_edit_files = []  # type: List[str]
+        self._backup_root = None  # type: Optional[str]
+        self.root_finder = RootFinder()
         # TODO: transfer these to the helpers once they are single instances
         # self.symbol_hl_id = self.vim.new_highlight_source()
         # self.color_hl_id = self.vim.new_highlight_source()
@@ -88,12 +100,128 @@ class VimEditor(Editor):
         row = row
         return row, col
 
-    def apply_workspace_edits(self, changes):
+    def adjust_many_from_lsp(self, positions: Iterable[Tuple[str, int, int]]) -> List[Tuple[int, int]]:
+        """Adjust a batch of LSP points (file_path, row, col) to byte indexes (0-based)"""
+        positions = list(positions)
+        lines = self._fetch_lines(positions)
+        return [(row, to_byte_index(lines[file_path][row], col)) for file_path, row, col in positions]
+
+    def adjust_many_to_lsp(self, positions: Iterable[Tuple[str, int, int]]) -> List[Tuple[int, int]]:
+        """Adjust a batch of byte indexes (file_path, row, col) to char indexes (0-based)"""
+        positions = list(positions)
+        lines = self._fetch_lines(positions)
+        return [(row, to_char_index(lines[file_path][row], col)) for file_path, row, col in positions]
+
+    def _fetch_lines(self, positions: List[Tuple[str, int, int]]) -> Dict[str, Dict[int, str]]:
+        """Fetches the lines needed by `positions`, for every file in a single RPC round-trip.
+
+        Lines of files without a loaded buffer are read from disk instead of loading a buffer.
+        """
+        rows_by_file = {}  # type: Dict[str, List[int]]
+        for file_path, row, _ in positions:
+            rows_by_file.setdefault(file_path, []).append(row)
+        files = list(rows_by_file)
+        rows = [sorted(set(rows_by_file[file_path])) for file_path in files]
+        if not files:
+            return {}
+        calls = [['nvim_call_function', ['lfx#buffer_lines', [file_path, file_rows]]]
+                 for file_path, file_rows in zip(files, rows)]
+        results, error = self.vim.api.call_atomic(calls)
+        if error:
+            debug('_fetch_lines: error fetching lines: {}'.format(error))
+        lines = {}  # type: Dict[str, Dict[int, str]]
+        for index, (file_path, file_rows) in enumerate(zip(files, rows)):
+            file_lines = results[index] if index < len(results) else None
+            if file_lines is None:
+                file_lines = read_lines(file_path, file_rows)
+            lines[file_path] = dict(zip(file_rows, file_lines))
+        return lines
+
+    def apply_workspace_edits(self, changes, on_done: Optional[Callable[[bool, Optional[str]], None]] = None):
+        """Applies edits to loaded buffers through the API, and optionally edits other files on disk
+        in the background. `on_done` is called on the main thread once everything is applied, with
+        the reason of the failure if some file could not be edited."""
+        on_disk = self._unloaded_files(changes) if self.lfx.workspace_edit_on_disk else {}
+
         for file_path, changelist in changes.items():
-            self.apply_document_edits(file_path, changelist)
+            if file_path not in on_disk:
+                self.apply_document_edits(file_path, changelist)
+
+        if not on_disk:
+            if on_done:
+                on_done(True, None)
+            return
+
+        def report_progress(done: int, total: int) -> None:
+            if done == total or done % max(1, total // 10) == 0:
+                self.status_message('Applying edits to files on disk: {}/{}'.format(done, total))
+
+        if self._backup_root is None:
+            self._backup_root = tempfile.mkdtemp(prefix='lfx-edits-')
+        backup_root = self._backup_root
+        job = FileEditJob(on_disk, self.batch_edits, self.lfx.workspace_edit_max_workers, report_progress,
+                          backup_root)
+
+        def finish(applied: bool) -> None:
+            if job.edited_files:
+                # Only the last job can be undone
+                self.last_edit_manifest = job.manifest_path
+                self.last_edit_files = job.edited_files
+                prune_backups(backup_root, job.backup_dir)
+                self.lfx.manager.notify_files_changed(job.edited_files)
+            else:
+                shutil.rmtree(job.backup_dir, ignore_errors=True)
+            failure_reason = None  # type: Optional[str]
+            if applied:
+                self.status_message('Edited {} files on disk, undo with :LFXUndoWorkspaceEdit'.format(
+                    len(on_disk)))
+            elif job.not_restored:
+                failure_reason = 'Unable to edit {} of {} files: {}. These files stay edited: {}'.format(
+                    len(job.errors), len(on_disk), ', '.join(str(e) for e in job.errors),
+                    ', '.join(job.not_restored))
+            else:
+                failure_reason = 'Unable to edit {} of {} files, no file was changed on disk: {}'.format(
+                    len(job.errors), len(on_disk), ', '.join(str(e) for e in job.errors))
+            if failure_reason:
+                self.error_message(failure_reason)
+            if on_done:
+                on_done(applied, failure_reason)
+
+        Thread(target=lambda: self.vim.async_call(finish, job.run())).start()
+
+    def undo_workspace_edits(self) -> None:
+        if not self.last_edit_manifest:
+            self.error_message('No workspace edit to undo')
+            return
+        failed = undo_file_edits(self.last_edit_manifest)
+        self.lfx.manager.notify_files_changed([path for path in self.last_edit_files if path not in failed])
+        self.last_edit_manifest = None
+        self.last_edit_files = []
+        if self._backup_root:
+            prune_backups(self._backup_root)
+        if failed:
+            self.error_message('Unable to restore: {}'.format(', '.join(failed)))
+        else:
+            self.status_message('Workspace edit undone')
+
+    def remove_backups(self) -> None:
+        if self._backup_root:
+            shutil.rmtree(self._backup_root, ignore_errors=True)
+            self._backup_root = None
+            self.last_edit_manifest = None
+
+    def _unloaded_files(self, changes) -> Dict[str, Any]:
+        if not changes:
+            return {}
+        # bufloaded() takes a file-pattern, so compare the paths of the loaded buffers instead
+        loaded = set(normalize_path(path) for path in self.vim.call('lfx#loaded_buffer_paths'))
+        return {path: edits for path, edits in changes.items()
+                if normalize_path(path) not in loaded and os.path.isfile(path)}
 
     def apply_document_edits(self, file_path, changes):
-        bufnr = self.vim.funcs.bufnr(file_path, True)
+        bufnr = self.vim.call('lfx#bufnr', file_path)
+        if bufnr == -1:
+            bufnr = self.vim.funcs.bufadd(file_path)
 
         if not self.vim.api.buf_is_loaded(bufnr):
             self.vim.funcs.bufload(bufnr)
@@ -101,16 +229,58 @@ class VimEditor(Editor):
 
         debug('applying changes to %s' % file_path)
 
-        for change in reversed(changes):
-            buffer_lines = self.vim.buffers[bufnr][:]
-            start, end, new_lines = self.apply_edit(buffer_lines, change)
-            self.vim.api.buf_set_lines(bufnr, start, end+1, False, new_lines)
-
-        # buffer_lines = self.vim.api.buf_get_lines(bufnr, 0, -1, False)
-        # self.vim.funcs.writefile(buffer_lines, file_path)
-
-        # self.vim.api.buf_set_lines(bufnr, 0, -1, False, buffer_lines)
-        # self.vim.api.buf_set_option(bufnr, 'modified', False)
+        buffer_lines = self.vim.api.buf_get_lines(bufnr, 0, -1, False)
+        hunks = self.batch_edits(buffer_lines, changes)
+
+        # Bottom-up, so the line numbers of the remaining hunks stay valid. A single atomic
+        # call also makes the whole change a single undo step.
+        calls = [['nvim_buf_set_lines', [bufnr, start, end + 1, False, new_lines]]
+                 for start, end, new_lines in reversed(hunks)]
+        if calls:
+            _, error = self.vim.api.call_atomic(calls)
+            if error:
+                debug('error applying changes to {}: {}'.format(file_path, error))
+
+    def batch_edits(self, source_lines: List[str], edits: List[Any]) -> List[Tuple[int, int, List[str]]]:
+        """Applies edits against `source_lines` in a single pass.
+
+        Edits are sorted in application order first, as workspace edits may list them in any order.
+        Edits touching the same lines are grouped together, and each group is reduced to the lines
+        that actually changed. Returns (start, end, new_lines) hunks in ascending order, with `end`
+        inclusive and referring to `source_lines`.
+        """
+        groups = []  # type: List[List[Any]]
+        for edit in sort_by_application_order(edits):
+            (start_line, _), (end_line, _), _ = edit
+            if groups and start_line <= groups[-1][1]:
+                groups[-1][1] = max(groups[-1][1], end_line)
+                groups[-1][2].append(edit)
+            else:
+                groups.append([start_line, end_line, [edit]])
+
+        hunks = []
+        for group_start, group_end, group_edits in groups:
+            old_lines = source_lines[group_start:group_end + 1]
+            new_lines = list(old_lines)
+            for (start_line, start_col), (end_line, end_col), new_text in reversed(group_edits):
+                edit = ((start_line - group_start, start_col), (end_line - group_start, end_col), new_text)
+                start, end, changed = self.apply_edit(new_lines, edit)
+                new_lines[start:end + 1] = changed
+
+            # Leave out the lines the group didn't change
+            limit = min(len(old_lines), len(new_lines))
+            prefix = 0
+            while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+                prefix += 1
+            suffix = 0
+            while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+                suffix += 1
+            if prefix == len(old_lines) == len(new_lines):
+                continue
+            hunks.append((group_start + prefix,
+                          group_start + len(old_lines) - suffix - 1,
+                          new_lines[prefix:len(new_lines) - suffix]))
+        return hunks
 
     def apply_edit(self, source_lines, edit):
         (start_line, start_col), (end_line, end_col), new_text = edit
@@ -156,20 +326,8 @@ class VimEditor(Editor):
     def find_root(self, view: 'VimView') -> str:
         patterns = (self.lfx.root_patterns.get('*') +
                     self.lfx.root_patterns.get(view.language_id(), []))
-        debug("view={}, language_id={}, root_patterns={}".format(
-            view.file_name(),
-            view.language_id(),
-            self.lfx.root_patterns))
-        head, tail = os.path.split(view.file_name())
-        found = head
-        while tail != '':
-            for lookup in patterns:
-                lookup = os.path.join(head, lookup)
-                if os.path.exists(lookup):
-                    found = head
-                    break
-            head, tail = os.path.split(head)
-        debug(f'patterns={patterns}, root found={found}')
+        found = self.root_finder.find_root(view.file_name(), patterns)
+        debug(f'file={view.file_name()}, patterns={patterns}, root found={found}')
         return found
 
 
@@ -180,24 +338,46 @@ class VimWindow(Window):
         self.editor = editor
         self.vim: Nvim = editor.vim
         self.valid = True
-        self._open_views = {}
-
-    def view_for_buffer(self, bufnr: int, create: bool = True) -> 'VimView':
-        if create:
-            try:
-                return self._open_views[bufnr]
-            except KeyError:
-                view = VimView(self, bufnr)
-                self._open_views[bufnr] = view
-                return view
-        else:
-            return self._open_views.get(bufnr)
+        self._open_views = {}  # type: Dict[int, VimView]
+        self._buffers_by_path = {}  # type: Dict[str, int]
+
+    def view_for_buffer(self, bufnr: int) -> 'VimView':
+        try:
+            return self._open_views[bufnr]
+        except KeyError:
+            view = VimView(self, bufnr)
+            self._register_view(view)
+            return view
+
+    def existing_view(self, bufnr: int) -> Optional['VimView']:
+        """The view of a buffer, without creating one if it was never seen"""
+        return self._open_views.get(bufnr)
+
+    def _register_view(self, view: 'VimView') -> None:
+        self._open_views[view.buffer_id()] = view
+        if view.file_name():
+            self._buffers_by_path[normalize_path(view.file_name())] = view.buffer_id()
+
+    def _unindex_view(self, view: 'VimView') -> None:
+        path = normalize_path(view.file_name() or '')
+        if self._buffers_by_path.get(path) == view.buffer_id():
+            del self._buffers_by_path[path]
+
+    def refresh_view(self, bufnr: int, file_name: str, language_id: str) -> Optional['VimView']:
+        """Updates the cached name and filetype of a buffer, e.g. after `BufFilePost` or `FileType`"""
+        view = self._open_views.get(bufnr)
+        if view:
+            self._unindex_view(view)
+            view.refresh(file_name, language_id)
+            self._register_view(view)
+        return view
 
     def close_view(self, bufnr: int) -> None:
         try:
-            del self._open_views[bufnr]
+            view = self._open_views.pop(bufnr)
         except KeyError:
-            pass
+            return
+        self._unindex_view(view)
 
     def id(self) -> int:
         return self.ID
@@ -206,24 +386,48 @@ class VimWindow(Window):
         return self.valid
 
     def folders(self) -> List[str]:
-        return [self.editor.find_root(self.active_view())]
+        return [self.editor.find_root(self.view_for_buffer(self.vim.current.buffer.number))]
 
-    def find_open_file(self, path: str) -> Optional[View]:
+    def find_open_file(self, path: str) -> Optional['VimView']:
+        try:
+            return self._open_views[self._buffers_by_path[normalize_path(path)]]
+        except KeyError:
+            pass
         bufnr = self.vim.funcs.bufnr(path)
         if bufnr == -1:
             return None
-        return VimView(self, bufnr)
+        return self.view_for_buffer(bufnr)
 
     def active_view(self) -> Optional[View]:
         bufnr = self.vim.current.buffer.number
-        return VimView(self, bufnr)
+        return self.view_for_buffer(bufnr)
+
+    def snapshot_open_files(self, paths: List[str]) -> List[View]:
+        """Fetches the state of the loaded buffers for `paths` in a single RPC round-trip"""
+        if not paths:
+            return []
+        calls = [['nvim_call_function', ['lfx#buffer_info', [path]]] for path in paths]
+        results, error = self.vim.api.call_atomic(calls)
+        if error:
+            debug('snapshot_open_files: error fetching buffers: {}'.format(error))
+        return [VimBufferSnapshot(self, info) for info in results if info]
+
+    def visible_files(self, paths: List[str]) -> Dict[str, bool]:
+        """Tells which of `paths` have a loaded buffer, and whether it is shown in any tabpage, in a
+        single RPC round-trip. Paths without a loaded buffer are left out."""
+        if not paths:
+            return {}
+        calls = [['nvim_call_function', ['lfx#buffer_info', [path, False]]] for path in paths]
+        results, error = self.vim.api.call_atomic(calls)
+        if error:
+            debug('visible_files: error fetching buffers: {}'.format(error))
+        return {path: bool(info['visible']) for path, info in zip(paths, results) if info}
 
     def status_message(self, msg: str) -> None:
         self.editor.status_message(msg)
 
     def views(self) -> List[View]:
-        return [View(b.number) for b in self.vim.list_bufs()
-                if self.vim.api.buf_is_loaded(b)]
+        return list(self._open_views.values())
 
     def run_command(self, command_name: str, command_args: Dict[str, Any]) -> None:
         raise NotImplementedError()
@@ -248,6 +452,10 @@ class VimView(View):
     def file_name(self):
         return self._file_name
 
+    def refresh(self, file_name: str, language_id: str) -> None:
+        self._file_name = file_name
+        self._language_id = language_id
+
     def buffer_id(self):
         return self._bufnr
 
@@ -279,9 +487,67 @@ class VimView(View):
     def is_valid(self):
         return self.vim.api.buf_is_valid(self._bufnr)
 
+    def is_visible(self) -> bool:
+        return len(self.vim.funcs.win_findbuf(self._bufnr)) > 0
+
     def available_sessions(self, capability: str = None) -> Iterator[Session]:
         yield from self.editor.lfx.sessions_for_view(self, capability)
 
     def diagnostics(self) -> Dict[str, List[Diagnostic]]:
         diagnostics = self.editor.lfx.diagnostics.get()
         return diagnostics.get(self.file_name(), {})
+
+
+class VimBufferSnapshot(View):
+    """Read-only view over buffer state that was fetched in bulk"""
+
+    def __init__(self, window: VimWindow, info: Dict[str, Any]):
+        self._window = window
+        self._bufnr = info['bufnr']
+        self._file_name = info['name']
+        self._language_id = info['filetype']
+        self._change_count = info['changedtick']
+        self._eol = bool(info['eol'])
+        self._visible = bool(info['visible'])
+        self._tab_size = info['shiftwidth']
+        self._expandtab = bool(info['expandtab'])
+        self._lines = info['lines']
+
+    def id(self) -> int:
+        return self._bufnr
+
+    def file_name(self):
+        return self._file_name
+
+    def buffer_id(self):
+        return self._bufnr
+
+    def change_count(self) -> int:
+        return self._change_count
+
+    def window(self) -> Window:
+        return self._window
+
+    def language_id(self) -> str:
+        return self._language_id
+
+    def set_status(self, key: str, status: str) -> None:
+        pass
+
+    def entire_content(self) -> str:
+        content = '\n'.join(self._lines)
+        if self._eol and content:
+            content += '\n'
+        return content
+
+    def tab_size(self) -> int:
+        return self._tab_size
+
+    def translate_tabs_to_spaces(self) -> bool:
+        return self._expandtab
+
+    def is_valid(self):
+        return True
+
+    def is_visible(self) -> bool:
+        return self._visible
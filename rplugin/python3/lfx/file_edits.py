@@ -0,0 +1,157 @@
+from .core.typing import Callable, Dict, List, Optional, Any, Tuple
+from .core.edit import TextEdit
+from .core.logging import debug, exception_log
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
+import os
+import shutil
+import tempfile
+
+MANIFEST_NAME = 'manifest.json'
+
+Hunk = Tuple[int, int, List[str]]
+
+
+class FileEditError(Exception):
+
+    def __init__(self, file_path: str, reason: str) -> None:
+        super().__init__("{}: {}".format(file_path, reason))
+        self.file_path = file_path
+
+
+def _read_text(file_path: str) -> Tuple[bytes, str, str]:
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    text = data.decode('utf-8', errors='surrogateescape')
+    newline = '\r\n' if '\r\n' in text else '\n'
+    return data, text, newline
+
+
+def apply_edits_to_file(file_path: str, edits: List[TextEdit], backup_path: str,
+                        batch_edits: Callable[[List[str], List[TextEdit]], List[Hunk]]) -> Dict[str, Any]:
+    """Applies edits directly to a file on disk, keeping a backup of the original content.
+
+    The new content is written to a temporary file which then replaces the original one, so the
+    file is never left half-written. Fails if the file changes while the edits are being applied.
+    """
+    try:
+        stat = os.stat(file_path)
+        data, text, newline = _read_text(file_path)
+    except OSError as ex:
+        raise FileEditError(file_path, str(ex))
+
+    lines = text.split(newline)
+    for start, end, new_lines in reversed(batch_edits(lines, edits)):
+        lines[start:end + 1] = new_lines
+    new_data = newline.join(lines).encode('utf-8', errors='surrogateescape')
+
+    with open(backup_path, 'wb') as backup:
+        backup.write(data)
+
+    directory = os.path.dirname(file_path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.lfx-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp:
+            temp.write(new_data)
+        shutil.copymode(file_path, temp_path)
+        current = os.stat(file_path)
+        if (current.st_mtime_ns, current.st_size) != (stat.st_mtime_ns, stat.st_size):
+            raise FileEditError(file_path, 'file changed while applying edits')
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    return {'path': file_path, 'backup': backup_path, 'mtime_ns': os.stat(file_path).st_mtime_ns}
+
+
+class FileEditJob(object):
+    """Applies workspace edits to files without a loaded buffer, using a pool of threads.
+
+    Either every file is edited or none is: when a file fails, the files already edited are
+    restored from their backups. Backups are kept in a directory of `backup_root` so that the
+    last job can be undone.
+    """
+
+    def __init__(self, changes: Dict[str, List[TextEdit]],
+                 batch_edits: Callable[[List[str], List[TextEdit]], List[Hunk]],
+                 max_workers: int = 8,
+                 on_progress: Optional[Callable[[int, int], None]] = None,
+                 backup_root: Optional[str] = None) -> None:
+        self._changes = changes
+        self._batch_edits = batch_edits
+        self._max_workers = max_workers
+        self._on_progress = on_progress
+        self.backup_dir = tempfile.mkdtemp(prefix='job-' if backup_root else 'lfx-edit-', dir=backup_root)
+        self.manifest_path = os.path.join(self.backup_dir, MANIFEST_NAME)
+        self.errors = []  # type: List[FileEditError]
+        self.edited_files = []  # type: List[str]
+        self.not_restored = []  # type: List[str]
+
+    def run(self) -> bool:
+        entries = []  # type: List[Dict[str, Any]]
+        total = len(self._changes)
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            futures = [executor.submit(apply_edits_to_file, file_path, edits,
+                                       os.path.join(self.backup_dir, '{}.orig'.format(index)),
+                                       self._batch_edits)
+                       for index, (file_path, edits) in enumerate(self._changes.items())]
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    entries.append(future.result())
+                except FileEditError as ex:
+                    debug('unable to apply edits: {}'.format(ex))
+                    self.errors.append(ex)
+                except Exception as ex:
+                    exception_log('Error applying edits', ex)
+                    self.errors.append(FileEditError('?', str(ex)))
+                if self._on_progress:
+                    self._on_progress(done, total)
+
+        if self.errors:
+            # Files that cannot be restored stay edited, and can still be undone
+            self.not_restored = restore_files(entries)
+            entries = [entry for entry in entries if entry['path'] in self.not_restored]
+        self.edited_files = [entry['path'] for entry in entries]
+        with open(self.manifest_path, 'w') as manifest:
+            json.dump({'files': entries}, manifest)
+        return not self.errors
+
+
+def restore_files(entries: List[Dict[str, Any]]) -> List[str]:
+    """Restores files from their backups. Returns the files that could not be restored, either
+    because they are gone or because they were changed after the edits were applied."""
+    failed = []
+    for entry in entries:
+        file_path = entry['path']
+        try:
+            if os.stat(file_path).st_mtime_ns != entry['mtime_ns']:
+                failed.append(file_path)
+                continue
+            shutil.copyfile(entry['backup'], file_path)
+        except OSError:
+            failed.append(file_path)
+    return failed
+
+
+def undo_file_edits(manifest_path: str) -> List[str]:
+    """Restores the files listed in a backup manifest. Returns the files that could not be restored."""
+    with open(manifest_path) as manifest:
+        entries = json.load(manifest)['files']
+    return restore_files(entries)
+
+
+def prune_backups(backup_root: str, keep: Optional[str] = None) -> None:
+    """Removes the backups of every job in `backup_root` but the one in `keep`"""
+    try:
+        names = os.listdir(backup_root)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(backup_root, name)
+        if keep is None or os.path.normpath(path) != os.path.normpath(keep):
+            shutil.rmtree(path, ignore_errors=True)
@@ -25,7 +25,10 @@ class DocumentColorHelper(RequestHelper, method=RequestMethod.DOCUMENT_COLOR, ca
     def _add_highlights(self, color_infos) -> None:
         self.vim.current.buffer.clear_highlight(src_id=self.color_hl_id)
         file_path = self.current_view().file_name()
-        for color_info in color_infos:
+        ranges = [Range.from_lsp(color_info['range']) for color_info in color_infos]
+        positions = self.lfx.editor.adjust_many_from_lsp(
+            (file_path, point.row, point.col) for range_ in ranges for point in (range_.start, range_.end))
+        for index, color_info in enumerate(color_infos):
             color = color_info['color']
             red = int(color['red'] * 255)
             green = int(color['green'] * 255)
@@ -45,11 +48,6 @@ class DocumentColorHelper(RequestHelper, method=RequestMethod.DOCUMENT_COLOR, ca
                 _groups.append(hl_group)
                 debug(_groups)
 
-            range_ = Range.from_lsp(color_info['range'])
-
-            start_row, start_col = self.lfx.editor.adjust_from_lsp(file_path, range_.start.row,
-                                                                   range_.start.col)
-            end_row, end_col = self.lfx.editor.adjust_from_lsp(file_path, range_.end.row,
-                                                               range_.end.col)
+            (start_row, start_col), (end_row, end_col) = positions[2 * index:2 * index + 2]
             self.vim.current.buffer.add_highlight(hl_group, start_row, start_col, end_col,
                                                   src_id=self.color_hl_id)
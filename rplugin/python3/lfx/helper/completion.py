@@ -1,11 +1,10 @@
 from ..lfx import RequestHelper
-from ..core.typing import Dict, Any
-from ..core.protocol import RequestMethod
-# from ..core.logging import debug
+from ..core.typing import Dict, Any, List
+from ..core.protocol import RequestMethod, Request
+from ..core.logging import debug
 from ..core.views import text_document_position_params
-from ..core.completion import parse_completion_response, completion_item_kind_names
-
-import json
+from ..core.completion import parse_completion_response
+from ..completion import CompletionContext, CompletionEntry, PendingCompletion, completion_item_id
 
 
 class ResolveCompletionHelper(RequestHelper,
@@ -15,11 +14,44 @@ class ResolveCompletionHelper(RequestHelper,
     def is_enabled(self) -> bool:
         view = self.current_view()
         session = self.lfx.session_for_view(view, self.capability)
+        if session is None:
+            return False
         provider = session.get_capability('completionProvider')
         return provider and provider.get('resolveProvider', False)
 
     def params(self, options):
-        return options.get('completion_item')
+        return self.lfx.completion_items.get(options.get('completion_item_id'))
+
+    def run(self, options: Dict[str, Any] = {}):
+        """Resolves the selected item in the background, cancelling the one selected before"""
+        item_id = options.get('completion_item_id')
+        store = self.lfx.completion_items
+        store.select(item_id)
+        if item_id is not None:
+            self.resolve(item_id)
+
+    def run_sync(self, options):
+        # the completion menu may already be gone
+        if self.params(options) is not None:
+            super().run_sync(options)
+
+    def prefetch(self, item_ids: List[int]) -> None:
+        if self.is_enabled():
+            for item_id in item_ids:
+                self.resolve(item_id, speculative=True)
+
+    def resolve(self, item_id: int, speculative: bool = False) -> None:
+        store = self.lfx.completion_items
+        item = store.get(item_id)
+        if item is None or store.resolving(item_id):
+            return
+        session = self.lfx.session_for_view(self.current_view(), self.capability)
+        if session is None:
+            return
+        pending = PendingCompletion(session.client)
+        store.add_resolve(item_id, pending, speculative)
+        pending.request_id = session.client.send_request(Request.resolveCompletionItem(item), pending.resolve,
+                                                         lambda res: pending.resolve(None))
 
     def handle_response(self, response):
         pass
@@ -40,61 +72,71 @@ class CompletionHelper(RequestHelper, method=RequestMethod.COMPLETION, capabilit
     def handle_response(self, response):
         pass
 
-    def process_response(self, response, options) -> Dict[str, Any]:
-        if not response:
-            return
-
-        items, incomplete = parse_completion_response(response)
-
-        matches = []
-
-        base = options.get('base')
-
-        for rec in items:
-
-            if 'textEdit' in rec and rec['textEdit'] is not None:
-                textEdit = rec['textEdit']
-                if textEdit['range']['start'] == textEdit['range']['end']:
-                    new_text = textEdit['newText']
-                    word = f'{base}{new_text}'
-                else:
-                    word = textEdit['newText']
-            elif rec.get('insertText', ''):
-                if rec.get('insertTextFormat', 1) != 1:
-                    word = rec.get('entryName', rec.get('label'))
-                else:
-                    word = rec['insertText']
-            else:
-                word = rec.get('entryName', rec.get('label'))
-
-            if base and not word.startswith(base):
-                continue
+    def run(self, options: Dict[str, Any] = {}):
+        if not self._dispatch_cached(options):
+            self._request(options, 0)
 
-            item = {
-                'word': word,
-                'abbr': rec['label'],
-                'dup': 1,
-                'icase': 1,
-                'empty': 1,
-                'user_data': json.dumps({
-                    'lspitem': rec
-                })
-            }
-
-            if isinstance(rec.get('kind'), int):
-                item['kind'] = completion_item_kind_names.get(rec['kind'])
-
-            if rec.get('detail'):
-                item['menu'] = rec['detail']
-
-            if isinstance(rec.get('documentation'), str):
-                item['info'] = rec['documentation']
-            elif isinstance(rec.get('documentation'), dict) and 'value' in rec['documentation']:
-                item['info'] = rec['documentation']['value']
-
-            if rec.get('insertTextFormat') == 2:
-                item['kind'] = 'Snippet'
-
-            matches.append(item)
+    def run_sync(self, options: Dict[str, Any]):
+        if self._dispatch_cached(options):
+            return
+        if 'budget' in options:
+            self._request(options, float(options['budget']))
+        else:
+            super().run_sync(options)
+
+    def _request(self, options: Dict[str, Any], budget: float) -> None:
+        """Sends the request without blocking longer than `budget` seconds. A response arriving later
+        goes to the `async_callback` option, and a newer request cancels the previous one."""
+        previous = self.lfx.pending_completion
+        if previous:
+            previous.cancel()
+            self.lfx.pending_completion = None
+
+        params = self.params(options)
+        view = self.current_view()
+        session = self.lfx.session_for_view(view, self.capability)
+        if session is None:
+            self.lfx.editor.error_message('Not available!')
+            return
 
+        self.lfx.documents.ensure_resident(view)
+        self.lfx.documents.purge_changes(view)
+        pending = PendingCompletion(session.client,
+                                    lambda res: self.vim.async_call(self._dispatch_late, pending, res, options))
+        pending.request_id = session.client.send_request(Request(RequestMethod.COMPLETION, params), pending.resolve,
+                                                         lambda res: debug(res))
+        self.lfx.pending_completion = pending
+        if pending.wait(budget):
+            self.lfx.pending_completion = None
+            self.dispatch_response(pending.response, options)
+
+    def _dispatch_late(self, pending: PendingCompletion, response: Any, options: Dict[str, Any]) -> None:
+        if self.lfx.pending_completion is pending:
+            self.lfx.pending_completion = None
+        callback = options.get('async_callback')
+        if callback:
+            late_options = dict(options, callback=callback)
+            late_options.pop('target', None)
+            self.dispatch_response(response, late_options)
+
+    def _dispatch_cached(self, options: Dict[str, Any]) -> bool:
+        entry = self.lfx.completion_cache.lookup(CompletionContext.from_options(options))
+        if entry is None:
+            return False
+        debug('filtering {} cached completion items'.format(len(entry.items)))
+        self.dispatch_response(entry, options)
+        return True
+
+    def process_response(self, response, options) -> List[Dict[str, Any]]:
+        if isinstance(response, CompletionEntry):
+            entry = response
+        else:
+            items, incomplete = parse_completion_response(response, sort=False)
+            entry = self.lfx.completion_cache.store(CompletionContext.from_options(options), items, incomplete)
+        matches = entry.filter(options.get('base') or '', self.lfx.completion_items,
+                               self.lfx.completion_max_items)
+        prefetch = matches[:self.lfx.completion_prefetch_resolve]
+        item_ids = [item_id for item_id in map(completion_item_id, prefetch) if item_id is not None]
+        if item_ids:
+            ResolveCompletionHelper(self.lfx, self.vim).prefetch(item_ids)
         return matches
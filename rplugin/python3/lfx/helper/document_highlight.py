@@ -1,7 +1,8 @@
 from ..lfx import RequestHelper
-from ..core.protocol import RequestMethod, Range
-# from ..core.logging import debug
-from ..core.typing import Dict, Any
+from ..editor import VimView
+from ..core.protocol import Request, RequestMethod, Range
+from ..core.logging import debug
+from ..core.typing import Dict, Any, List
 from ..core.views import text_document_position_params
 
 
@@ -11,28 +12,42 @@ class DocumentHighlightHelper(RequestHelper,
 
     def __init__(self, lfx, vim, *args, **kwargs) -> None:
         super().__init__(lfx, vim)
-        self.symbol_hl_id = self.vim.api.create_namespace('lfx#document_highlight#ns_id')
 
-    def params(self, options) -> Dict[str, Any]:
+    def run(self, options: Dict[str, Any] = {}):
         view = self.current_view()
         point = self.cursor_point()
-        return text_document_position_params(view, point)
+        changedtick = options.get('changedtick') or view.change_count()
+        if self.lfx.document_highlights.covers(view.buffer_id(), changedtick, point):
+            return
+        session = self.lfx.session_for_view(view, self.capability)
+        if session is None:
+            self.lfx.editor.error_message('Not available!')
+            return
+
+        # the response is shown for the view and changedtick of its own request, not of a later one
+        def on_response(response) -> None:
+            if options.get('target') or options.get('callback'):
+                self.dispatch_response(response, options)
+            elif response:
+                self.show(view, changedtick, response)
+
+        self.lfx.documents.ensure_resident(view)
+        self.lfx.documents.purge_changes(view)
+        session.client.send_request(Request.documentHighlight(text_document_position_params(view, point)),
+                                    lambda response: self.vim.async_call(on_response, response),
+                                    lambda error: debug(error))
+
+    def params(self, options) -> Dict[str, Any]:
+        return text_document_position_params(self.current_view(), self.cursor_point())
 
     def handle_response(self, response):
-        highlights = []
-        for item in response:
-            range_ = Range.from_lsp(item['range'])
-            start = range_.start
-            end = range_.end
-            highlights.append([start, end])
-        self.vim.async_call(self._add_highlights, highlights)
-
-    def _add_highlights(self, highlights):
-        self.vim.current.buffer.clear_highlight(src_id=self.symbol_hl_id)
+        view = self.current_view()
+        self.show(view, view.change_count(), response)
+
+    def show(self, view: VimView, changedtick: int, response: List[Dict[str, Any]]) -> None:
+        ranges = [Range.from_lsp(item['range']) for item in response]
+        positions = self.lfx.editor.adjust_many_from_lsp(
+            (view.file_name(), point.row, point.col) for rge in ranges for point in (rge.start, rge.end))
+        byte_ranges = [positions[index] + positions[index + 1] for index in range(0, len(positions), 2)]
         hl_group = self.vim.vars.get('lfx#highlight#document_highlight', 'Search')
-        for (start, end) in highlights:
-            file_path = self.current_view().file_name()
-            start_row, start_col = self.lfx.editor.adjust_from_lsp(file_path, start.row, start.col)
-            end_row, end_col = self.lfx.editor.adjust_from_lsp(file_path, end.row, end.col)
-            self.vim.current.buffer.add_highlight(hl_group, start_row, start_col, end_col,
-                                                  src_id=self.symbol_hl_id)
+        self.lfx.document_highlights.show(view.buffer_id(), changedtick, ranges, byte_ranges, hl_group)
@@ -3,7 +3,7 @@ from ..core.views import text_document_position_params
 from ..core.protocol import RequestMethod
 # from ..core.logging import debug
 from ..core.url import uri_to_filename
-from ..core.typing import Tuple, List, Any, Dict
+from ..core.typing import Tuple, Any, Dict
 from ..core.protocol import Point
 # from pynvim import Nvim
 
@@ -16,17 +16,20 @@ class GotoDefinitionHelper(RequestHelper, method=RequestMethod.DEFINITION, capab
         return text_document_position_params(view, point)
 
     def handle_response(self, response) -> None:
-        def process_response_list(responses: list) -> List[Tuple[str, str, Tuple[int, int]]]:
-            locations = [process_response(x) for x in responses]
+        def process_response_list(responses: list) -> None:
+            starts = [location_start(x) for x in responses]
+            positions = self.lfx.editor.adjust_many_from_lsp(
+                (file_path, start.row, start.col) for file_path, start in starts)
+            locations = [to_location(file_path, row, col)
+                         for (file_path, _), (row, col) in zip(starts, positions)]
 
             if len(locations) == 1:
                 file_path, _, pos = locations[0]
                 self.lfx.editor.goto(file_path, pos[0], pos[1])
             else:
                 self._display_locations(locations)
-                pass
 
-        def process_response(response: dict) -> Tuple[str, str, Tuple[int, int]]:
+        def location_start(response: dict) -> Tuple[str, Point]:
             if "targetUri" in response:
                 # TODO: Do something clever with originSelectionRange and targetRange.
                 file_path = uri_to_filename(response["targetUri"])
@@ -34,7 +37,9 @@ class GotoDefinitionHelper(RequestHelper, method=RequestMethod.DEFINITION, capab
             else:
                 file_path = uri_to_filename(response["uri"])
                 start = Point.from_lsp(response["range"]["start"])
-            row, col = self.lfx.editor.adjust_from_lsp(file_path, start.row, start.col)
+            return file_path, start
+
+        def to_location(file_path: str, row: int, col: int) -> Tuple[str, str, Tuple[int, int]]:
             row += 1
             col += 1
             file_path_and_row_col = "{}:{}:{}".format(file_path, row, col)
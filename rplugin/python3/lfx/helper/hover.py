@@ -1,5 +1,6 @@
 from ..lfx import RequestHelper
-from ..core.protocol import Request, RequestMethod
+from ..hover import HoverContent
+from ..core.protocol import Range, Request, RequestMethod
 from ..core.logging import debug
 from ..core.views import text_document_position_params
 from ..core.typing import Dict, Any
@@ -16,22 +17,57 @@ class HoverHelper(RequestHelper, method=RequestMethod.HOVER, capability='hoverPr
         point = self.cursor_point()
         return text_document_position_params(view, point)
 
+    def run(self, options: Dict[str, Any] = {}):
+        """Shows the hover from the cache when possible. With the `prefetch` option, only fills
+        the cache."""
+        prefetch = options.get('prefetch', False)
+        view = self.current_view()
+        session = self.lfx.session_for_view(view, self.capability) if view else None
+        if session is None:
+            if not prefetch:
+                self.lfx.editor.error_message('Not available!')
+            return
+        cache = self.lfx.hover_cache
+        file_path = view.file_name()
+        version = view.change_count()
+        point = self.cursor_point()
+        content = cache.get(file_path, version, point)
+        if content:
+            if not prefetch:
+                self.show(content, options)
+            return
+        handler = None if prefetch else lambda content: self.vim.async_call(self.show, content, options)
+        if cache.wait(file_path, version, point, handler):
+            return
+
+        def on_response(response) -> None:
+            rge = response.get('range') if isinstance(response, dict) else None
+            cache.put(file_path, version, point, Range.from_lsp(rge) if rge else None,
+                      HoverContent.from_lsp(response))
+
+        def on_error(error) -> None:
+            debug(error)
+            cache.cancel(file_path, version, point)
+
+        self.lfx.documents.ensure_resident(view)
+        self.lfx.documents.purge_changes(view)
+        session.client.send_request(Request.hover(text_document_position_params(view, point)),
+                                    on_response, on_error)
+
+    def show(self, content: HoverContent, options: Dict[str, Any]) -> None:
+        if content.response is None:
+            return
+        if options.get('target') or options.get('callback'):
+            self.dispatch_response(content.response, options)
+        else:
+            self.show_content(content)
+
     def handle_response(self, response):
         if response is not None:
-            contents = response.get('contents')
-            filetype: str = 'text'
-            if not isinstance(contents, list):
-                contents = [contents]
-            result = []
-            for content in contents:
-                if isinstance(content, str):
-                    result.append(content)
-                elif isinstance(content, dict):
-                    if content.get('kind') == 'markdown':
-                        filetype = 'markdown'
-                    result.append(content.get('value'))
-            content = '\n\n'.join(result).split('\n')
-            if self.vim.vars.get('lfx#hover#use_echo'):
-                self.vim.command('echon "{}"'.format('\n\n'.join(result).replace('"', '\\"')))
-            else:
-                self.vim.call('lfx#show_popup', content, {'filetype': filetype})
+            self.show_content(HoverContent.from_lsp(response))
+
+    def show_content(self, content: HoverContent) -> None:
+        if self.vim.vars.get('lfx#hover#use_echo'):
+            self.vim.command('echon "{}"'.format(content.text.replace('"', '\\"')))
+        else:
+            self.vim.call('lfx#show_popup', content.lines, {'filetype': content.filetype})
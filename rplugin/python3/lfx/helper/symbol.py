@@ -2,7 +2,7 @@ from ..lfx import RequestHelper
 from ..core.protocol import RequestMethod, Point
 # from ..core.logging import debug
 from ..core.url import uri_to_filename
-from ..core.typing import Dict, Any
+from ..core.typing import Dict, Any, Tuple
 from ..core.views import text_document_identifier
 
 
@@ -29,16 +29,15 @@ class WorkspaceSymbolHelper(RequestHelper, method=RequestMethod.WORKSPACE_SYMBOL
         self.vim.async_call(self._display_locations, response)
 
     def _display_locations(self, response):
-        def parse_info(location) -> Dict:
+        def parse_start(location) -> Tuple[str, Point]:
             file_name = uri_to_filename(location['location']['uri'])
-            point = Point.from_lsp(location['location']['range']['start'])
-            row, col = self.lfx.editor.adjust_from_lsp(file_name, point.row, point.col)
-            row += 1
-            col += 1
-            return {'filename': file_name,
-                    'lnum': row, 'col': col, 'text': location['name']}
-
-        locations = list(map(parse_info, response))
+            return file_name, Point.from_lsp(location['location']['range']['start'])
+
+        starts = [parse_start(location) for location in response]
+        positions = self.lfx.editor.adjust_many_from_lsp(
+            (file_name, point.row, point.col) for file_name, point in starts)
+        locations = [{'filename': file_name, 'lnum': row + 1, 'col': col + 1, 'text': location['name']}
+                     for location, (file_name, _), (row, col) in zip(response, starts, positions)]
 
         if len(locations) == 1:
             location = locations[0]
@@ -0,0 +1,115 @@
+from .core.typing import Any, Callable, Dict, List, Optional, Tuple
+from .core.protocol import Point, Range
+
+import threading
+
+
+class HoverContent(object):
+    """A hover response along with the lines and filetype of its popup"""
+
+    __slots__ = ('response', 'lines', 'filetype', 'text')
+
+    def __init__(self, response: Optional[Dict[str, Any]], lines: List[str], filetype: str, text: str) -> None:
+        self.response = response
+        self.lines = lines
+        self.filetype = filetype
+        self.text = text
+
+    @classmethod
+    def from_lsp(cls, response: Optional[Dict[str, Any]]) -> 'HoverContent':
+        if response is None:
+            return HoverContent(None, [], 'text', '')
+        contents = response.get('contents')
+        filetype = 'text'
+        if not isinstance(contents, list):
+            contents = [contents]
+        result = []
+        for content in contents:
+            if isinstance(content, str):
+                result.append(content)
+            elif isinstance(content, dict):
+                if content.get('kind') == 'markdown':
+                    filetype = 'markdown'
+                result.append(content.get('value') or '')
+        text = '\n\n'.join(result)
+        return HoverContent(response, text.split('\n'), filetype, text)
+
+
+# (range reported by the server, or None, point that was asked for, content)
+HoverEntry = Tuple[Optional[Range], Point, HoverContent]
+HoverHandler = Callable[[HoverContent], None]
+
+
+def _covers(entry: HoverEntry, point: Point) -> bool:
+    rge, asked, _ = entry
+    if rge is None:
+        return asked.row == point.row and asked.col == point.col
+    return (rge.start.row, rge.start.col) <= (point.row, point.col) <= (rge.end.row, rge.end.col)
+
+
+class HoverCache(object):
+    """The hovers of the current version of each document.
+
+    A hover is reused anywhere within the range the server reported for it, or only at the point
+    that was asked for when there was none. Handlers asking for a point whose hover is still in
+    flight are called once it arrives, so a prefetch and `:LFXHover` share one request.
+    """
+
+    def __init__(self, max_entries: int = 64) -> None:
+        self._files = {}  # type: Dict[str, Tuple[int, List[HoverEntry]]]
+        self._pending = {}  # type: Dict[Tuple[str, int, int, int], List[HoverHandler]]
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, file_path: str, version: int, point: Point) -> Optional[HoverContent]:
+        with self._lock:
+            known = self._files.get(file_path)
+            if known and known[0] == version:
+                for entry in known[1]:
+                    if _covers(entry, point):
+                        self.hits += 1
+                        return entry[2]
+            self.misses += 1
+            return None
+
+    def wait(self, file_path: str, version: int, point: Point, handler: Optional[HoverHandler] = None) -> bool:
+        """Registers the handler of a point being requested. Returns False if it was not requested
+        yet, in which case the caller is expected to request it and call `put`."""
+        key = (file_path, version, point.row, point.col)
+        with self._lock:
+            handlers = self._pending.get(key)
+            if handlers is None:
+                self._pending[key] = [handler] if handler else []
+                return False
+            if handler:
+                handlers.append(handler)
+            return True
+
+    def put(self, file_path: str, version: int, point: Point, rge: Optional[Range], content: HoverContent) -> None:
+        with self._lock:
+            handlers = self._pending.pop((file_path, version, point.row, point.col), [])
+            known = self._files.get(file_path)
+            if known is None or known[0] != version:
+                if known is not None and known[0] > version:
+                    known = None
+                else:
+                    known = (version, [])
+                    self._files[file_path] = known
+            if known is not None:
+                known[1].insert(0, (rge, point, content))
+                del known[1][self._max_entries:]
+        for handler in handlers:
+            handler(content)
+
+    def cancel(self, file_path: str, version: int, point: Point) -> None:
+        with self._lock:
+            self._pending.pop((file_path, version, point.row, point.col), None)
+
+    def invalidate(self, file_path: str) -> None:
+        with self._lock:
+            self._files.pop(file_path, None)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for _, entries in self._files.values())
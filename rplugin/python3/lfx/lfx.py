@@ -12,13 +12,20 @@ from .core.protocol import WorkspaceFolder, Point, Range, RequestMethod, Request
 from .core.logging import set_log_file, set_debug_logging, set_exception_logging, debug
 from .core.workspace import ProjectFolders
 from .core.diagnostics import DiagnosticsStorage
-from .core.rpc import Client
+from .core.rpc import Client, Response
 from .core.clients import get_window_env
 from .core.edit import parse_text_edit, sort_by_application_order
 from .documents import VimDocumentHandler, VimConfigManager
 from .editor import VimEditor, VimWindow, VimView
 from .context import ContextManager
 from .diagnostics import DiagnosticsPresenter
+from .pull_diagnostics import DiagnosticsPuller
+from .code_actions import CodeActionsCache
+from .lightbulb import LightbulbEngine
+from .hover import HoverCache
+from .document_highlight import DocumentHighlights
+from .completion import (CompletionCache, CompletionItemStore, PendingCompletion, completion_item_id,
+                         RESOLVE_TIMEOUT)
 from .util import to_char_index, debounce
 
 
@@ -33,6 +40,8 @@ class LFX:
         self.settings.log_payloads = vars.get('lfx#log#payloads', False)
         self.settings.log_server = vars.get('lfx#log#server', False)
         self.settings.log_stderr = vars.get('lfx#log#stderr', True)
+        self.settings.document_max_resident = vars.get('lfx#documents#max_resident', 0)
+        self.settings.document_idle_timeout = vars.get('lfx#documents#idle_timeout', 0)
         self.log_file = vars.get('lfx#log#file')
         set_log_file(self.log_file)
         set_exception_logging(True)
@@ -40,13 +49,27 @@ class LFX:
         self.client_configs = ClientConfigs()  # type: ClientConfigs
         self._update_configs()
         self.root_patterns = vars.get('lfx#root_patterns', {'*': ['.gitmodules', '.git']})
+        self.workspace_edit_on_disk = vars.get('lfx#workspace_edit#on_disk', False)
+        self.workspace_edit_max_workers = vars.get('lfx#workspace_edit#max_workers', 8)
+        self.completion_max_items = vars.get('lfx#completion#max_items', 200)
+        self.completion_prefetch_resolve = vars.get('lfx#completion#prefetch_resolve', 5)
         self.editor = VimEditor(self)
-        self.window = VimWindow(self.editor)
+        self.window = self.editor.window
         self.config_manager = VimConfigManager(self.window, self.client_configs.all)
         self.documents = VimDocumentHandler(self.editor, self.settings, None, self.window,
                                             self.config_manager)
         self.documents.on_attach = self._on_attach
         self.documents.on_detach = self._on_detach
+        self.documents.on_did_change = self._on_document_changed
+        self.completion_cache = CompletionCache()
+        self.completion_items = CompletionItemStore()
+        self.pending_completion = None  # type: Optional[PendingCompletion]
+        self.code_actions = CodeActionsCache(vars.get('lfx#code_actions#cache_size', 32))
+        self.hover_cache = HoverCache()
+        self.document_highlights = DocumentHighlights(self.vim)
+        self.lightbulbs = None  # type: Optional[LightbulbEngine]
+        if vars.get('lfx#code_actions#lightbulb', True):
+            self.lightbulbs = LightbulbEngine(self.window, vars.get('lfx#code_actions#sign', '\U0001F4A1'))
 
         def start_session(window: VimWindow,
                           workspace_folders: List[WorkspaceFolder],
@@ -69,8 +92,16 @@ class LFX:
         import_helpers(self.vim.funcs.globpath(self.vim.options['runtimepath'],
                                                'rplugin/python3/lfx/helper/*.py'))
 
-        self.diagnostics_presenter = DiagnosticsPresenter(self.window, self.documents)
+        self.diagnostics_presenter = DiagnosticsPresenter(self.window, self.documents,
+                                                          vars.get('lfx#diagnostics#render_delay', 0.05),
+                                                          vars.get('lfx#diagnostics#renderer', 'ale'),
+                                                          vars.get('lfx#diagnostics#virtual_text', True),
+                                                          vars.get('lfx#diagnostics#render_chunk', 500),
+                                                          vars.get('lfx#diagnostics#render_margin', 100))
         self.diagnostics = DiagnosticsStorage(self.diagnostics_presenter)
+        self.diagnostics_puller = DiagnosticsPuller(self.diagnostics,
+                                                    vars.get('lfx#diagnostics#pull_recent', 3),
+                                                    vars.get('lfx#diagnostics#workspace_delay', 2.0))
 
         self.manager = ContextManager(
             self.window,
@@ -96,7 +127,27 @@ class LFX:
         del self.vim.vars['lfx#attached_bufnr']
 
     def _on_detach(self, view: VimView) -> None:
-        pass
+        if self.lightbulbs:
+            self.lightbulbs.forget(view.buffer_id())
+
+    def _on_document_changed(self, view: VimView) -> None:
+        self.code_actions.invalidate(view.file_name())
+        self.hover_cache.invalidate(view.file_name())
+        sessions = list(self.sessions_for_view(view, 'diagnosticProvider'))
+        if sessions:
+            self.diagnostics_puller.changed(view.file_name(), sessions)
+
+    def _update_visible_files(self) -> None:
+        views = (self.window.existing_view(bufnr) for bufnr in self.vim.call('tabpagebuflist'))
+        self.diagnostics_puller.set_visible(view.file_name() for view in views if view)
+
+    def _pull_visible_diagnostics(self, config_name: Optional[str] = None) -> None:
+        self._update_visible_files()
+        self.diagnostics_puller.refresh(config_name, self._pull_sessions)
+
+    def _pull_sessions(self, file_path: str) -> List[Session]:
+        view = self.window.find_open_file(file_path)
+        return list(self.sessions_for_view(view, 'diagnosticProvider')) if view else []
 
     @pynvim.function('LFX_handle_did_open', sync=True, eval='expand("<abuf>")')
     def _on_did_open(self, args, bufnr):
@@ -104,6 +155,25 @@ class LFX:
         view = self.window.view_for_buffer(int(bufnr))
         self.manager.activate_view(view)
         self.documents.handle_did_open(view)
+        self.diagnostics_presenter.render([view.file_name()])
+        sessions = list(self.sessions_for_view(view, 'diagnosticProvider'))
+        if sessions:
+            self._update_visible_files()
+            self.diagnostics_puller.activated(view.file_name(), sessions)
+
+    @pynvim.function('LFX_handle_buffer_refresh', sync=True)
+    def _on_buffer_refresh(self, args):
+        bufnr, file_name, language_id = int(args[0]), args[1], args[2]
+        view = self.window.existing_view(bufnr)
+        if not view:
+            return
+        if view.file_name() != file_name and self.documents.has_document_state(view.file_name()):
+            debug('buffer {} renamed to {}'.format(bufnr, file_name))
+            self.documents.handle_did_close(view)
+            self.window.refresh_view(bufnr, file_name, language_id)
+            self.documents.handle_did_open(view)
+        else:
+            self.window.refresh_view(bufnr, file_name, language_id)
 
     @pynvim.function('LFX_handle_will_save', eval='expand("<abuf>")')
     def _on_will_save(self, args, bufnr):
@@ -122,10 +192,14 @@ class LFX:
 
     @pynvim.function('LFX_handle_did_close', eval='expand("<abuf>")')
     def _on_did_close(self, args, bufnr):
+        view = self.window.existing_view(int(bufnr))
+        if view:
+            self.diagnostics_presenter.forget(view.file_name(), int(bufnr))
+
         if not self.vim.api.buf_is_loaded(int(bufnr)):
+            self.window.close_view(int(bufnr))
             return
 
-        view = self.window.view_for_buffer(int(bufnr), False)
         debug("Event: did_close - %s" % (bufnr))
 
         if view:
@@ -136,15 +210,21 @@ class LFX:
     @pynvim.function('LFX_handle_leave', sync=True)
     def _on_vimleave(self, args):
         self.window.valid = False
+        self.editor.remove_backups()
         self.manager.end_sessions()
 
     @pynvim.function('LFX_handle_complete_done', sync=True)
     def _on_complete_done(self, args):
-        resolved_item = self.vim.vars.get('lfx#completion#_resolved_item')
         completed_item = self.vim.vvars.get('completed_item')
-        if completed_item and resolved_item:
+        item_id = completion_item_id(completed_item)
+        item = self.completion_items.get(item_id)
+        resolving = self.completion_items.resolving(item_id)
+        if resolving and resolving.wait(RESOLVE_TIMEOUT) and resolving.response:
+            item = resolving.response
+        self.completion_items.clear()
+        if completed_item and item:
             view = self.window.active_view()
-            edits = resolved_item.get('additionalTextEdits')
+            edits = item.get('additionalTextEdits')
             if edits:
                 edits = sort_by_application_order(map(parse_text_edit, edits))
                 self.editor.apply_document_edits(view.file_name(), edits)
@@ -222,10 +302,14 @@ class LFX:
         debug(args)
         self._send_request(RequestMethod.COMPLETION, *args)
 
-    @pynvim.function('LFX_resolve_completion', sync=True)
+    @pynvim.function('LFX_resolve_completion')
     def resolve_completion(self, args: List[Dict[str, Any]] = [{}]):
         self._send_request(RequestMethod.RESOLVE, *args)
 
+    @pynvim.function('LFX_undo_workspace_edit')
+    def undo_workspace_edit(self, args):
+        self.editor.undo_workspace_edits()
+
     @pynvim.function('LFX_show_diagnostics')
     def show_diagnostics(self, args):
         bufnr = int(args[0])
@@ -235,6 +319,50 @@ class LFX:
         if view:
             self.diagnostics_presenter.show_all(view.file_name())
 
+    @pynvim.function('LFX_handle_layout_changed')
+    def _on_layout_changed(self, args):
+        self._update_visible_files()
+
+    @pynvim.function('LFX_handle_scrolled')
+    def _on_scrolled(self, args):
+        self.diagnostics_presenter.on_scrolled()
+
+    @pynvim.function('LFX_update_lightbulbs')
+    def update_lightbulbs(self, args):
+        options = args[0]
+        view = self.window.existing_view(int(options['bufnr']))
+        if not self.lightbulbs or not view or not any(self.sessions_for_view(view, 'codeActionProvider')):
+            return
+        cursor = Point(options['line'], to_char_index(options['text'], options['col']))
+        self.lightbulbs.update(view, options['changedtick'], options['top'], options['bottom'], cursor)
+
+    @pynvim.function('LFX_diagnostics_list', sync=True)
+    def diagnostics_list(self, args):
+        bufnr = int(args[0]) if args else 0
+        if bufnr == -1:
+            return self.diagnostics_presenter.quickfix_list()
+        if bufnr == 0:
+            bufnr = self.vim.current.buffer.number
+        view = self.window.existing_view(bufnr)
+        return self.diagnostics_presenter.quickfix_list(view.file_name()) if view else []
+
+    @pynvim.function('LFX_diagnostic_counts', sync=True)
+    def diagnostic_counts(self, args):
+        bufnr = int(args[0]) if args else 0
+        if bufnr == 0:
+            bufnr = self.vim.current.buffer.number
+        view = self.window.existing_view(bufnr)
+        return {
+            'buffer': self.diagnostics.counts(view.file_name() if view else ''),
+            'workspace': self.diagnostics.total_counts(),
+        }
+
+    @pynvim.function('LFX_diagnostics_stats', sync=True)
+    def diagnostics_stats(self, args):
+        stats = self.diagnostics_presenter.stats.to_dict()
+        stats['pull'] = self.diagnostics_puller.stats.to_dict()
+        return stats
+
     @pynvim.function('LFX_send_request', sync=True)
     def send_request(self, args):
         self._send_request(*args)
@@ -267,10 +395,10 @@ class LFX:
                 config['languages'].append({'languageId': filetype})
         self.client_configs.update({'clients': configs})
 
-    def session_for_view(self, view: VimView, capability: str = None) -> Optional[Session]:
+    def session_for_view(self, view: VimView, capability: Optional[str] = None) -> Optional[Session]:
         return next(self.sessions_for_view(view, capability), None)
 
-    def sessions_for_view(self, view: VimView, capability: str = None) -> Iterator[Session]:
+    def sessions_for_view(self, view: VimView, capability: Optional[str] = None) -> Iterator[Session]:
         for config in self.client_configs.all:
             for language in config.languages:
                 if language.id == view.language_id():
@@ -338,6 +466,7 @@ class RequestHelper(metaclass=abc.ABCMeta):
         session = self.lfx.session_for_view(view, self.capability)
         method = self._method
         if session is not None:
+            self.lfx.documents.ensure_resident(view)
             self.lfx.documents.purge_changes(view)
             session.client.send_request(Request(method, params),
                                         lambda res: self.vim.async_call(
@@ -352,6 +481,7 @@ class RequestHelper(metaclass=abc.ABCMeta):
         session = self.lfx.session_for_view(view, self._capability)
         method = self._method
         if session is not None:
+            self.lfx.documents.ensure_resident(view)
             self.lfx.documents.purge_changes(view)
             session.client.execute_request(Request(method, params),
                                            lambda res: self.dispatch_response(res, options),
@@ -488,10 +618,20 @@ class DiagnosticsHelper(ClientHelper):
         client.on_notification(
             "textDocument/publishDiagnostics",
             lambda params: self.lfx.diagnostics.receive(config_name, params))
+        client.on_request(
+            "workspace/diagnostic/refresh",
+            lambda params, request_id: self._on_refresh(config_name, client, request_id))
+        # documents opened before the server was ready are sent to it right after this
+        self.vim.async_call(self.lfx._pull_visible_diagnostics, config_name)
+
+    def _on_refresh(self, config_name: str, client: Client, request_id: Any) -> None:
+        client.send_response(Response(request_id, None))
+        self.vim.async_call(self.lfx._pull_visible_diagnostics, config_name)
 
     def on_exited(self, config_name: str, window: VimWindow) -> None:
         debug('on_exited called: %s' % config_name)
+        self.lfx.diagnostics_puller.stop(config_name)
         for view in window.views():
             file_name = view.file_name()
             if file_name:
-                self.diagnostics.remove(file_name, config_name)
+                self.lfx.diagnostics.remove(file_name, config_name)
@@ -0,0 +1,103 @@
+from .core.typing import Any, Dict, List, Optional, Tuple
+from .core.protocol import Point
+from .code_actions import CodeActionsByConfigName, request_code_actions
+from .diagnostics import diagnostic_key
+from .editor import VimView, VimWindow
+
+import functools
+import threading
+
+# What is known of a line: the diagnostics code actions were requested for, and whether there are any
+LineState = Tuple[Tuple[Any, ...], bool]
+
+
+class LightbulbEngine(object):
+    """Shows a lightbulb on the lines where code actions are available.
+
+    Code actions are only requested for the visible lines that have diagnostics, and for the cursor
+    line when a server advertises refactorings. The requests of an update are sent together and
+    all the lightbulbs are placed in one batch once every answer arrived. What is known of each line
+    is kept until the buffer changes.
+    """
+
+    def __init__(self, window: VimWindow, sign: str = '\U0001F4A1') -> None:
+        self._window = window
+        self._vim = window.vim
+        self._sign = sign
+        self._namespace = None  # type: Optional[int]
+        self._lock = threading.Lock()
+        self._lines = {}  # type: Dict[int, Tuple[int, Dict[int, LineState]]]
+        self._placed = {}  # type: Dict[int, List[int]]
+        self.requests = 0
+
+    def update(self, view: VimView, changedtick: int, top: int, bottom: int, cursor: Optional[Point] = None) -> None:
+        bufnr = view.buffer_id()
+        known = self._lines.get(bufnr)
+        if known is None or known[0] != changedtick:
+            known = (changedtick, {})
+            self._lines[bufnr] = known
+        lines = known[1]
+
+        wanted = {}  # type: Dict[int, Tuple[Point, Tuple[Any, ...]]]
+        index = view.editor.lfx.diagnostics.index(view.file_name())
+        by_line = {}  # type: Dict[int, List[Any]]
+        for diagnostics in index.on_lines(top, bottom).values():
+            for diagnostic in diagnostics:
+                if top <= diagnostic.range.start.row <= bottom:
+                    by_line.setdefault(diagnostic.range.start.row, []).append(diagnostic)
+        for row, diagnostics in by_line.items():
+            fingerprint = tuple(sorted(diagnostic_key(diagnostic) for diagnostic in diagnostics))
+            if row not in lines or lines[row][0] != fingerprint:
+                wanted[row] = (diagnostics[0].range.start, fingerprint)
+        if cursor and cursor.row not in by_line and cursor.row not in lines and offers_refactorings(view):
+            wanted[cursor.row] = (cursor, ())
+
+        if not wanted:
+            self._render(bufnr, changedtick)
+            return
+        remaining = [len(wanted)]
+
+        def on_actions(row: int, fingerprint: Tuple[Any, ...], actions: CodeActionsByConfigName) -> None:
+            with self._lock:
+                lines[row] = (fingerprint, any(actions.values()))
+                remaining[0] -= 1
+                done = remaining[0] == 0
+            if done:
+                self._vim.async_call(self._render, bufnr, changedtick)
+
+        for row, (point, fingerprint) in wanted.items():
+            self.requests += 1
+            request_code_actions(view, point, functools.partial(on_actions, row, fingerprint), changedtick)
+
+    def forget(self, bufnr: int) -> None:
+        self._lines.pop(bufnr, None)
+        self._placed.pop(bufnr, None)
+
+    def _render(self, bufnr: int, changedtick: int) -> None:
+        known = self._lines.get(bufnr)
+        if known is None or known[0] != changedtick:
+            return
+        with self._lock:
+            rows = sorted(row for row, (_, available) in known[1].items() if available)
+        if self._placed.get(bufnr, []) == rows:
+            return
+        self._placed[bufnr] = rows
+        if self._namespace is None:
+            self._namespace = self._vim.api.create_namespace('lfx-lightbulbs')
+        calls = [['nvim_buf_clear_namespace', [bufnr, self._namespace, 0, -1]]]  # type: List[List[Any]]
+        for row in rows:
+            calls.append(['nvim_buf_set_extmark', [bufnr, self._namespace, row, 0, {
+                'virt_text': [[self._sign, 'LFXLightbulbVirtual']],
+                'strict': False,
+            }]])
+        self._vim.api.call_atomic(calls)
+
+
+def offers_refactorings(view: VimView) -> bool:
+    """Whether a server lists refactorings among the kinds of code actions it provides"""
+    for session in view.available_sessions('codeActionProvider'):
+        provider = session.get_capability('codeActionProvider')
+        if isinstance(provider, dict) and any(kind.startswith('refactor')
+                                              for kind in provider.get('codeActionKinds') or []):
+            return True
+    return False
@@ -0,0 +1,264 @@
+from .core.typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from .core.protocol import ErrorCode, Request
+from .core.diagnostics import DiagnosticsStorage
+from .core.sessions import Session
+from .core.rpc import Client
+from .core.url import filename_to_uri, uri_to_filename
+from .core.logging import debug
+
+from collections import OrderedDict
+import threading
+
+
+class PullStats(object):
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.full = 0
+        self.unchanged = 0
+        self.cancelled = 0
+        self.workspace_requests = 0
+        self.workspace_reports = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+class WorkspaceStream(object):
+    """The `workspace/diagnostic` request of a server, reissued in the background after each response"""
+
+    def __init__(self, client: Client, identifier: Optional[str]) -> None:
+        self.client = client
+        self.identifier = identifier
+        self.request_id = None  # type: Optional[int]
+        self.timer = None  # type: Optional[threading.Timer]
+        self.stopped = False
+
+
+class DiagnosticsPuller(object):
+    """Requests diagnostics from servers supporting LSP 3.17 pull diagnostics.
+
+    Documents are only pulled while they are visible or among the `recent` most recently active
+    ones. A document changed while hidden is marked stale and pulled when it is shown again. The
+    last `resultId` of every document is sent back as `previousResultId`, so a server can answer
+    with an `unchanged` report, which costs nothing on our side. Reports are stored in the same
+    `DiagnosticsStorage` as published diagnostics.
+    """
+
+    def __init__(self, storage: DiagnosticsStorage, recent: int = 3, workspace_delay: float = 2.0) -> None:
+        self._storage = storage
+        self._max_recent = recent
+        self._workspace_delay = workspace_delay
+        self._lock = threading.Lock()
+        self._result_ids = {}  # type: Dict[Tuple[str, str], str]
+        self._pending = {}  # type: Dict[Tuple[str, str], List[Any]]
+        self._stale = set()  # type: Set[str]
+        self._pulled = set()  # type: Set[Tuple[str, str]]
+        self._recent = OrderedDict()  # type: OrderedDict[str, None]
+        self._visible = set()  # type: Set[str]
+        self._streams = {}  # type: Dict[str, WorkspaceStream]
+        self.stats = PullStats()
+
+    def set_visible(self, file_paths: Iterable[str]) -> None:
+        self._visible = set(file_paths)
+
+    def is_wanted(self, file_path: str) -> bool:
+        return file_path in self._visible or file_path in self._recent
+
+    def activated(self, file_path: str, sessions: List[Session]) -> None:
+        """A document was entered. Pulls it if it changed while hidden or was never pulled."""
+        self._recent.pop(file_path, None)
+        self._recent[file_path] = None
+        while len(self._recent) > self._max_recent:
+            self._recent.popitem(last=False)
+        stale = file_path in self._stale
+        for session in sessions:
+            if stale or (session.config.name, file_path) not in self._pulled:
+                self.pull(session, file_path)
+        self._stale.discard(file_path)
+
+    def changed(self, file_path: str, sessions: List[Session]) -> None:
+        """A document change was sent to the servers"""
+        if not self.is_wanted(file_path):
+            self._stale.add(file_path)
+            return
+        for session in sessions:
+            self.pull(session, file_path)
+
+    def refresh(self, config_name: Optional[str], sessions_for: Callable[[str], List[Session]]) -> None:
+        """Handles `workspace/diagnostic/refresh`: wanted documents are pulled again, the others
+        when they become visible. `sessions_for` returns the sessions of a file."""
+        for file_path in list(self._recent) + list(self._visible - set(self._recent)):
+            self.pull_all(sessions_for(file_path), file_path, config_name)
+        with self._lock:
+            pulled = list(self._pulled)
+        for _, file_path in pulled:
+            if not self.is_wanted(file_path):
+                self._stale.add(file_path)
+
+    def pull_all(self, sessions: List[Session], file_path: str, config_name: Optional[str] = None) -> None:
+        for session in sessions:
+            if config_name is None or session.config.name == config_name:
+                self.pull(session, file_path)
+
+    def pull(self, session: Session, file_path: str) -> Optional[int]:
+        config_name = session.config.name
+        key = (config_name, file_path)
+        client = session.client
+        provider = session.get_capability('diagnosticProvider')
+        params = {'textDocument': {'uri': filename_to_uri(file_path)}}  # type: Dict[str, Any]
+        if isinstance(provider, dict) and provider.get('identifier'):
+            params['identifier'] = provider['identifier']
+        # the request id is only known once sent, the handlers tell their request apart by identity
+        entry = [client, None]  # type: List[Any]
+        with self._lock:
+            previous = self._pending.pop(key, None)
+            self._pending[key] = entry
+            if key in self._result_ids:
+                params['previousResultId'] = self._result_ids[key]
+            self._pulled.add(key)
+        if previous and previous[1] is not None:
+            # the document changed again, the report for the previous version would be outdated
+            previous[0].cancel_request(previous[1])
+            self.stats.cancelled += 1
+
+        request_id = client.send_request(
+            Request.documentDiagnostic(params),
+            lambda report: self._on_report(key, entry, report),
+            lambda error: self._on_error(session, key, entry, error))
+        entry[1] = request_id
+        if request_id is None:
+            self._take_pending(key, entry)
+            return None
+        self.stats.requests += 1
+        if isinstance(provider, dict) and provider.get('workspaceDiagnostics'):
+            self.start_workspace(session)
+        return request_id
+
+    def _take_pending(self, key: Tuple[str, str], entry: List[Any]) -> bool:
+        with self._lock:
+            if self._pending.get(key) is not entry:
+                return False
+            del self._pending[key]
+            return True
+
+    def _on_report(self, key: Tuple[str, str], entry: List[Any], report: Any) -> None:
+        if not self._take_pending(key, entry) or not isinstance(report, dict):
+            return
+        config_name, file_path = key
+        self._apply(config_name, file_path, report)
+        for uri, related in (report.get('relatedDocuments') or {}).items():
+            self._apply(config_name, uri_to_filename(uri), related)
+
+    def _on_error(self, session: Session, key: Tuple[str, str], entry: List[Any], error: Any) -> None:
+        if not self._take_pending(key, entry):
+            return
+        error = error or {}
+        if error.get('code') == ErrorCode.ServerCancelled and (error.get('data') or {}).get('retriggerRequest'):
+            file_path = key[1]
+            if self.is_wanted(file_path):
+                self.pull(session, file_path)
+            else:
+                self._stale.add(file_path)
+        else:
+            debug('diagnostic pull failed for {}: {}'.format(key[1], error.get('message')))
+
+    def _apply(self, config_name: str, file_path: str, report: Dict[str, Any]) -> None:
+        key = (config_name, file_path)
+        result_id = report.get('resultId')
+        with self._lock:
+            if result_id:
+                self._result_ids[key] = result_id
+            elif report.get('kind') == 'full':
+                self._result_ids.pop(key, None)
+        if report.get('kind') == 'unchanged':
+            self.stats.unchanged += 1
+            return
+        self.stats.full += 1
+        self._storage.receive(config_name, {'uri': filename_to_uri(file_path),
+                                            'diagnostics': report.get('items') or []})
+
+    def start_workspace(self, session: Session) -> None:
+        config_name = session.config.name
+        if self._workspace_delay < 0:
+            return
+        with self._lock:
+            stream = self._streams.get(config_name)
+            if stream and stream.client is session.client and not stream.stopped:
+                return
+            provider = session.get_capability('diagnosticProvider') or {}
+            stream = WorkspaceStream(session.client, provider.get('identifier'))
+            self._streams[config_name] = stream
+        self._schedule_workspace(config_name, stream)
+
+    def stop(self, config_name: str) -> None:
+        with self._lock:
+            stream = self._streams.pop(config_name, None)
+            for key in [key for key in self._pending if key[0] == config_name]:
+                del self._pending[key]
+            for key in [key for key in self._result_ids if key[0] == config_name]:
+                del self._result_ids[key]
+            self._pulled = set(key for key in self._pulled if key[0] != config_name)
+        if stream:
+            stream.stopped = True
+            if stream.timer:
+                stream.timer.cancel()
+            if stream.request_id is not None and not stream.client.exiting:
+                stream.client.cancel_request(stream.request_id)
+
+    def _schedule_workspace(self, config_name: str, stream: WorkspaceStream, delay: Optional[float] = None) -> None:
+        if stream.stopped:
+            return
+        stream.timer = threading.Timer(self._workspace_delay if delay is None else delay,
+                                       lambda: self._request_workspace(config_name, stream))
+        stream.timer.daemon = True
+        stream.timer.start()
+
+    def _request_workspace(self, config_name: str, stream: WorkspaceStream) -> None:
+        if stream.stopped or stream.client.exiting:
+            return
+        with self._lock:
+            previous = [{'uri': filename_to_uri(file_path), 'value': result_id}
+                        for (name, file_path), result_id in self._result_ids.items() if name == config_name]
+        params = {'previousResultIds': previous}  # type: Dict[str, Any]
+        if stream.identifier:
+            params['identifier'] = stream.identifier
+        stream.request_id = stream.client.send_request(
+            Request.workspaceDiagnostic(params),
+            lambda response: self._on_workspace_report(config_name, stream, response),
+            lambda error: self._on_workspace_error(config_name, stream, error))
+        if stream.request_id is None:
+            stream.stopped = True
+        else:
+            self.stats.workspace_requests += 1
+
+    def _on_workspace_report(self, config_name: str, stream: WorkspaceStream, response: Any) -> None:
+        stream.request_id = None
+        items = (response or {}).get('items') or []
+        # applied from a separate thread, the transport thread has more urgent responses to deliver
+        worker = threading.Thread(target=self._apply_workspace, args=(config_name, stream, items))
+        worker.daemon = True
+        worker.start()
+
+    def _apply_workspace(self, config_name: str, stream: WorkspaceStream, items: List[Dict[str, Any]]) -> None:
+        # the lock is only taken per report, document pulls are answered in between
+        for report in items:
+            if stream.stopped:
+                return
+            file_path = uri_to_filename(report['uri'])
+            with self._lock:
+                # the report of a document pull in flight is more recent
+                if (config_name, file_path) in self._pending:
+                    continue
+            self._apply(config_name, file_path, report)
+            self.stats.workspace_reports += 1
+        self._schedule_workspace(config_name, stream)
+
+    def _on_workspace_error(self, config_name: str, stream: WorkspaceStream, error: Any) -> None:
+        stream.request_id = None
+        error = error or {}
+        if error.get('code') == ErrorCode.ServerCancelled and (error.get('data') or {}).get('retriggerRequest'):
+            self._schedule_workspace(config_name, stream)
+        else:
+            debug('workspace diagnostics stopped for {}: {}'.format(config_name, error.get('message')))
+            stream.stopped = True
@@ -1,4 +1,5 @@
 from threading import Timer
+import re
 
 
 def to_byte_index(text, idx):
@@ -9,6 +10,16 @@ def to_char_index(text, idx):
     return len(text.encode()[:idx].decode()) if idx else 0
 
 
+def read_lines(file_path, rows):
+    """Reads the given (0-based) rows of a file from disk"""
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as file:
+            lines = re.split(r'\r?\n', file.read())
+    except OSError:
+        lines = []
+    return [lines[row] if row < len(lines) else '' for row in rows]
+
+
 def debounce(wait, call_id, func):
     callers = {}
 
@@ -0,0 +1,88 @@
+from lfx.code_actions import CodeActionsAtLocation, CodeActionsCache, resolve_code_action
+from .test_mocks import MockSession
+import unittest
+
+
+def key(file_path, changedtick=1, row=0):
+    return (file_path, changedtick, (('test', row, 0, row, 0),), ())
+
+
+class CodeActionsAtLocationTests(unittest.TestCase):
+
+    def test_in_flight_results_are_shared(self):
+        received = []
+        actions = CodeActionsAtLocation(received.append)
+        first = actions.collect('a')
+        second = actions.collect('b')
+        actions.seal()
+        actions.deliver(received.append)
+        first([{'title': 'fix'}])
+        self.assertEqual(received, [])
+        second(None)
+        self.assertEqual(received, [{'a': [{'title': 'fix'}], 'b': []}] * 2)
+
+        actions.deliver(received.append)
+        self.assertEqual(len(received), 3)
+
+    def test_no_server(self):
+        received = []
+        CodeActionsAtLocation(received.append).seal()
+        self.assertEqual(received, [{}])
+
+
+class CodeActionsCacheTests(unittest.TestCase):
+
+    def test_least_recently_used_evicted(self):
+        cache = CodeActionsCache(max_entries=2)
+        entries = [CodeActionsAtLocation() for _ in range(3)]
+        cache.put(key('/a', row=0), entries[0])
+        cache.put(key('/a', row=1), entries[1])
+        self.assertIs(cache.get(key('/a', row=0)), entries[0])
+        cache.put(key('/a', row=2), entries[2])
+        self.assertIsNone(cache.get(key('/a', row=1)))
+        self.assertIs(cache.get(key('/a', row=0)), entries[0])
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+    def test_changedtick_is_part_of_the_key(self):
+        cache = CodeActionsCache()
+        cache.put(key('/a', changedtick=1), CodeActionsAtLocation())
+        self.assertIsNone(cache.get(key('/a', changedtick=2)))
+
+    def test_invalidate(self):
+        cache = CodeActionsCache()
+        cache.put(key('/a'), CodeActionsAtLocation())
+        cache.put(key('/b'), CodeActionsAtLocation())
+        cache.invalidate('/a')
+        self.assertIsNone(cache.get(key('/a')))
+        self.assertEqual(len(cache), 1)
+
+
+class ResolveCodeActionTests(unittest.TestCase):
+
+    def test_resolved_when_the_edit_is_missing(self):
+        session = MockSession('codeActionProvider', {'resolveProvider': True})
+        received = []
+        resolve_code_action(session, {'title': 'fix', 'data': 1}, received.append)
+        self.assertEqual(received, [])
+        request, handler, _ = session.client.requests[0]
+        self.assertEqual(request.method, 'codeAction/resolve')
+        self.assertEqual(request.params, {'title': 'fix', 'data': 1})
+        handler({'title': 'fix', 'edit': {'changes': {}}})
+        self.assertEqual(received, [{'title': 'fix', 'edit': {'changes': {}}}])
+
+    def test_failed_resolve_runs_the_action_as_is(self):
+        session = MockSession('codeActionProvider', {'resolveProvider': True})
+        received = []
+        resolve_code_action(session, {'title': 'fix'}, received.append)
+        session.client.requests[0][2]({'code': -32601})
+        self.assertEqual(received, [{'title': 'fix'}])
+
+    def test_not_resolved(self):
+        received = []
+        for provider, action in [({'resolveProvider': True}, {'title': 'fix', 'edit': {}}),
+                                 ({'resolveProvider': True}, {'title': 'run', 'command': 'run'}),
+                                 (True, {'title': 'fix'})]:
+            session = MockSession('codeActionProvider', provider)
+            resolve_code_action(session, action, received.append)
+            self.assertEqual(session.client.requests, [])
+        self.assertEqual(len(received), 3)
@@ -0,0 +1,199 @@
+from lfx.completion import (CompletionCache, CompletionContext, CompletionItemStore, PendingCompletion,
+                            PREFIX_SCORE, completion_item_id, fuzzy_score)
+import unittest
+
+
+def make_context(base, changedtick=1, start=4, prefix='    '):
+    return CompletionContext(1, changedtick, 10, start, prefix, base)
+
+
+def make_item(label, **kwargs):
+    item = {'label': label}
+    item.update(kwargs)
+    return item
+
+
+class FuzzyScoreTests(unittest.TestCase):
+
+    def test_no_match(self):
+        self.assertIsNone(fuzzy_score('xyz', 'foobar'))
+        self.assertIsNone(fuzzy_score('ba', 'ab'))
+
+    def test_empty_pattern(self):
+        self.assertEqual(fuzzy_score('', 'foobar'), 0)
+
+    def test_ranking(self):
+        prefix = fuzzy_score('get', 'getValue')
+        boundary = fuzzy_score('gv', 'getValue')
+        scattered = fuzzy_score('gv', 'dragover')
+        self.assertGreater(prefix, boundary)
+        self.assertGreater(boundary, scattered)
+
+    def test_case_insensitive(self):
+        self.assertIsNotNone(fuzzy_score('GETV', 'getValue'))
+
+    def test_folding_changes_length(self):
+        # 'İ' lowers to two characters, which used to shift every index into the text
+        self.assertGreater(fuzzy_score('ib', 'İxBar'), fuzzy_score('ib', 'İxbar'))
+        self.assertEqual(fuzzy_score('ssb', 'ßBar'), PREFIX_SCORE)
+
+    def test_whole_pattern_inside_text(self):
+        # 'Get' starts a hump, the 'e' and 't' that follow it are consecutive
+        self.assertEqual(fuzzy_score('get', 'fooGetBar'), 17)
+        self.assertEqual(fuzzy_score('get', 'fo_get'), 17)
+        # the first 'g' does not start the whole pattern, the characters are matched one by one
+        self.assertEqual(fuzzy_score('get', 'xgxget'), 2)
+
+
+class CompletionCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = CompletionCache()
+        self.store = CompletionItemStore()
+        self.items = [make_item('getValue'), make_item('setValue'), make_item('reset')]
+
+    def test_filter(self):
+        entry = self.cache.store(make_context('ge'), self.items, False)
+        words = [item['word'] for item in entry.filter('get', self.store)]
+        self.assertEqual(words, ['getValue'])
+        words = [item['word'] for item in entry.filter('set', self.store)]
+        self.assertEqual(words, ['setValue', 'reset'])
+
+    def test_limit(self):
+        items = [make_item('item{}'.format(i), sortText='{:03}'.format(99 - i)) for i in range(100)]
+        entry = self.cache.store(make_context(''), items, False)
+        words = [item['word'] for item in entry.filter('item', self.store, 3)]
+        self.assertEqual(words, ['item99', 'item98', 'item97'])
+        self.assertEqual(len(self.store), 3)
+        self.assertEqual(len(entry.filter('item', self.store)), 100)
+        words = [item['word'] for item in entry.filter('', self.store, 20)]
+        self.assertEqual(words[:2], ['item99', 'item98'])
+        self.assertEqual(len(words), 20)
+
+    def test_sort_text_between_prefix_matches(self):
+        items = [make_item('getValueOrDefault', sortText='a'), make_item('getValue', sortText='b')]
+        entry = self.cache.store(make_context(''), items, False)
+        words = [item['word'] for item in entry.filter('get', self.store)]
+        self.assertEqual(words, ['getValueOrDefault', 'getValue'])
+
+    def test_items_refer_to_store(self):
+        entry = self.cache.store(make_context('ge'), self.items, False)
+        entry.filter('ge', self.store)
+        items = entry.filter('set', self.store)
+        self.assertEqual(len(self.store), 2)
+        self.assertIs(self.store.get(completion_item_id(items[0])), self.items[1])
+        self.assertIsNone(completion_item_id({'user_data': 'other plugin'}))
+
+    def test_hit_while_typing(self):
+        self.cache.store(make_context('ge'), self.items, False)
+        self.assertIsNotNone(self.cache.lookup(make_context('get', 2)))
+        self.assertEqual(self.cache.hits, 1)
+
+    def test_miss_when_incomplete(self):
+        self.cache.store(make_context('ge'), self.items, True)
+        self.assertIsNone(self.cache.lookup(make_context('get', 2)))
+
+    def test_miss_when_word_start_moves(self):
+        self.cache.store(make_context('ge'), self.items, False)
+        self.assertIsNone(self.cache.lookup(make_context('ge', 2, start=5)))
+        self.assertIsNone(self.cache.lookup(make_context('ge', 2, prefix='    x')))
+
+    def test_miss_when_deleting(self):
+        self.cache.store(make_context('ge'), self.items, False)
+        self.assertIsNone(self.cache.lookup(make_context('g', 2)))
+        self.assertEqual(self.cache.misses, 1)
+
+    def test_not_stored_without_context(self):
+        self.cache.store(None, self.items, False)
+        self.assertIsNone(self.cache.lookup(make_context('ge')))
+
+    def test_text_edit_word(self):
+        items = [make_item('Value', textEdit={
+            'range': {'start': {'line': 0, 'character': 6}, 'end': {'line': 0, 'character': 6}},
+            'newText': 'Value'})]
+        entry = self.cache.store(make_context('get'), items, False)
+        self.assertEqual([item['word'] for item in entry.filter('getV', self.store)], ['getValue'])
+
+
+class MockClient(object):
+
+    def __init__(self):
+        self.cancelled = []
+
+    def cancel_request(self, request_id):
+        self.cancelled.append(request_id)
+
+
+class PendingCompletionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.client = MockClient()
+        self.late = []
+        self.pending = PendingCompletion(self.client, self.late.append)
+        self.pending.request_id = 1
+
+    def test_inline_response(self):
+        self.pending.resolve(['item'])
+        self.assertTrue(self.pending.wait(0.05))
+        self.assertEqual(self.pending.response, ['item'])
+        self.assertEqual(self.late, [])
+
+    def test_late_response(self):
+        self.assertFalse(self.pending.wait(0))
+        self.pending.resolve(['item'])
+        self.assertEqual(self.late, [['item']])
+
+    def test_cancel(self):
+        self.assertFalse(self.pending.wait(0))
+        self.pending.cancel()
+        self.pending.resolve(['item'])
+        self.assertEqual(self.client.cancelled, [1])
+        self.assertEqual(self.late, [])
+
+    def test_cancel_after_response(self):
+        self.pending.resolve(['item'])
+        self.pending.cancel()
+        self.assertEqual(self.client.cancelled, [])
+
+
+class CompletionItemStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.client = MockClient()
+        self.store = CompletionItemStore()
+        self.ids = [self.store.add(make_item(label)) for label in ['a', 'b', 'c']]
+
+    def add_resolve(self, item_id, speculative=False):
+        pending = PendingCompletion(self.client)
+        pending.request_id = item_id
+        self.store.add_resolve(item_id, pending, speculative)
+        return pending
+
+    def test_cancel_on_move(self):
+        self.store.select(self.ids[0])
+        self.add_resolve(self.ids[0])
+        self.store.select(self.ids[1])
+        self.assertEqual(self.client.cancelled, [self.ids[0]])
+        self.assertIsNone(self.store.resolving(self.ids[0]))
+
+    def test_keep_resolved_on_move(self):
+        self.store.select(self.ids[0])
+        self.add_resolve(self.ids[0]).resolve(make_item('a', detail='resolved'))
+        self.store.select(self.ids[1])
+        self.assertEqual(self.client.cancelled, [])
+        self.assertEqual(self.store.resolving(self.ids[0]).response['detail'], 'resolved')
+
+    def test_keep_prefetch_on_move(self):
+        self.add_resolve(self.ids[0], speculative=True)
+        self.store.select(self.ids[0])
+        self.store.select(self.ids[1])
+        self.assertEqual(self.client.cancelled, [])
+        self.assertIsNotNone(self.store.resolving(self.ids[0]))
+
+    def test_clear_cancels(self):
+        self.add_resolve(self.ids[0], speculative=True)
+        self.add_resolve(self.ids[1]).resolve(None)
+        self.store.clear()
+        self.assertEqual(self.client.cancelled, [self.ids[0]])
+        self.assertIsNone(self.store.get(self.ids[0]))
+        self.assertIsNone(self.store.resolving(self.ids[1]))
@@ -0,0 +1,302 @@
+from lfx.core.diagnostics import DiagnosticIndex, DiagnosticsStorage
+from lfx.core.protocol import Diagnostic, Point, Range
+from lfx.diagnostics import DiagnosticsPresenter, ExtmarkRenderer, RenderStats
+import random
+import unittest
+import unittest.mock
+
+
+def make_diagnostic(message, line=0, col=0, end_line=None, end_col=5):
+    return Diagnostic.from_lsp({
+        'message': message,
+        'severity': 1,
+        'range': {'start': {'line': line, 'character': col},
+                  'end': {'line': line if end_line is None else end_line, 'character': end_col}}
+    })
+
+
+class MockDocumentsState(object):
+    pass
+
+
+class MockView(object):
+    def __init__(self, bufnr):
+        self._bufnr = bufnr
+
+    def buffer_id(self):
+        return self._bufnr
+
+
+class MockEditor(object):
+    def adjust_many_from_lsp(self, positions):
+        return [(row, col) for _, row, col in positions]
+
+
+class MockWindow(object):
+    def __init__(self, views):
+        self.vim = unittest.mock.Mock()
+        self.vim.api.create_namespace.side_effect = ['marks', 'virtual']
+        self.vim.api.call_atomic.return_value = [[], None]
+        self.editor = MockEditor()
+        self._views = views
+
+    def is_valid(self):
+        return True
+
+    def find_open_file(self, file_path):
+        return self._views.get(file_path)
+
+
+class DiagnosticsPresenterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.window = MockWindow({'/a': MockView(1), '/b': MockView(2)})
+        self.vim = self.window.vim
+        self.presenter = DiagnosticsPresenter(self.window, MockDocumentsState(), render_delay=60)
+        self.addCleanup(lambda: self.presenter._render_timer and self.presenter._render_timer.cancel())
+
+    def publish(self, diagnostics):
+        for file_path in diagnostics:
+            self.presenter.update(file_path, 'test', diagnostics)
+
+    def rendered_buffers(self):
+        buffers = []
+        for call in self.vim.api.call_atomic.call_args_list:
+            buffers.extend(args[1][0] for name, args in call[0][0]
+                           if name == 'nvim_call_function' and args[0] == 'ale#other_source#ShowResults')
+        return buffers
+
+    def test_coalesced_in_one_batch(self):
+        self.publish({'/a': {'test': [make_diagnostic('x')]}})
+        self.publish({'/a': {'test': [make_diagnostic('y')]}, '/b': {'test': [make_diagnostic('z')]}})
+        self.presenter.render_pending()
+        self.assertEqual(self.vim.api.call_atomic.call_count, 1)
+        self.assertEqual(sorted(self.rendered_buffers()), [1, 2])
+        self.assertEqual(self.presenter.stats.updates, 3)
+        self.assertEqual(self.presenter.stats.renders, 2)
+
+    def test_unchanged_skipped(self):
+        diagnostics = {'/a': {'test': [make_diagnostic('x')]}}
+        self.publish(diagnostics)
+        self.presenter.render_pending()
+        self.publish({'/a': {'test': [make_diagnostic('x')]}})
+        self.presenter.render_pending()
+        self.assertEqual(self.rendered_buffers(), [1])
+        self.assertEqual(self.presenter.stats.skipped_unchanged, 1)
+
+    def test_cleared_rendered(self):
+        self.publish({'/a': {'test': [make_diagnostic('x')]}})
+        self.presenter.render_pending()
+        self.presenter.update('/a', 'test', {})
+        self.presenter.render_pending()
+        self.assertEqual(self.rendered_buffers(), [1, 1])
+
+    def test_changed_event_once_per_tick(self):
+        self.publish({'/a': {'test': [make_diagnostic('x')]}, '/c': {'test': [make_diagnostic('y')]}})
+        self.presenter.render_pending()
+        commands = [args for name, args in self.vim.api.call_atomic.call_args[0][0] if name == 'nvim_command']
+        self.assertEqual(len(commands), 1)
+        self.assertIn('User LFXDiagnosticsChanged', commands[0][0])
+        self.publish({'/a': {'test': [make_diagnostic('x')]}})
+        self.presenter.render_pending()
+        self.assertEqual(self.vim.api.call_atomic.call_count, 1)
+        self.assertEqual(self.presenter.stats.events, 1)
+
+    def test_failed_buffers_rendered_again(self):
+        def fail_last_buffer(calls):
+            index = max(i for i, (name, _) in enumerate(calls) if name == 'nvim_buf_set_var')
+            return [[None] * index, [index, 0, 'Invalid buffer id']]
+
+        self.vim.api.call_atomic.side_effect = fail_last_buffer
+        diagnostics = {'/a': {'test': [make_diagnostic('x')]}, '/b': {'test': [make_diagnostic('y')]}}
+        self.publish(diagnostics)
+        self.presenter.render_pending()
+        self.assertEqual(sorted(self.rendered_buffers()), [1, 2])
+        calls = self.vim.api.call_atomic.call_args[0][0]
+        failed = [args[0] for name, args in calls if name == 'nvim_buf_set_var'][-1]
+        self.vim.api.call_atomic.side_effect = None
+        self.publish(diagnostics)
+        self.presenter.render_pending()
+        self.assertEqual(self.rendered_buffers()[2:], [failed])
+
+    def test_buffer_variable(self):
+        self.publish({'/a': {'test': [make_diagnostic('x', 2)]}})
+        self.presenter.render_pending()
+        calls = self.vim.api.call_atomic.call_args[0][0]
+        self.assertIn(['nvim_buf_set_var', [1, 'lfx_diagnostics', [{
+            'type': 'E', 'text': 'x', 'lnum': 3, 'col': 1, 'end_lnum': 3, 'end_col': 6, 'bufnr': 1}]]], calls)
+
+    def test_failed_backlog_rendered_again(self):
+        presenter = DiagnosticsPresenter(self.window, MockDocumentsState(), render_delay=60, renderer='extmarks',
+                                         virtual_text=False, chunk_size=2, backlog_delay=60)
+        self.addCleanup(lambda: presenter._backlog_timer and presenter._backlog_timer.cancel())
+        self.vim.call.return_value = {}
+        diagnostics = {'/a': {'test': [make_diagnostic(str(row), row) for row in range(5)]}}
+        presenter.update('/a', 'test', diagnostics)
+        presenter.render_pending()
+        self.assertEqual(presenter.stats.backlog, 3)
+
+        self.vim.api.call_atomic.return_value = [[None], [1, 0, 'Invalid buffer id']]
+        presenter.render_backlog()
+        self.assertEqual(presenter.stats.backlog, 0)
+        self.vim.api.call_atomic.return_value = [[], None]
+        presenter.update('/a', 'test', diagnostics)
+        presenter.render_pending()
+        calls = self.vim.api.call_atomic.call_args[0][0]
+        self.assertEqual([name for name, _ in calls[:2]], ['nvim_buf_clear_namespace', 'nvim_buf_clear_namespace'])
+
+    def test_unloaded_skipped(self):
+        self.publish({'/c': {'test': [make_diagnostic('x')]}})
+        self.presenter.render_pending()
+        self.assertEqual(self.rendered_buffers(), [])
+        self.assertEqual(self.presenter.stats.skipped_unloaded, 1)
+
+    def test_show_all_forces_render(self):
+        self.publish({'/a': {'test': [make_diagnostic('x')]}})
+        self.presenter.render_pending()
+        self.presenter.show_all('/a')
+        self.assertEqual(self.rendered_buffers(), [1, 1])
+
+    def test_quickfix_list(self):
+        self.presenter.update('/a', 'test', {'/a': {'test': [make_diagnostic('y', 3), make_diagnostic('x', 1)]}})
+        items = self.presenter.quickfix_list('/a')
+        self.assertEqual([(item['filename'], item['lnum'], item['text']) for item in items],
+                         [('/a', 2, 'x'), ('/a', 4, 'y')])
+
+
+class ExtmarkRendererTests(unittest.TestCase):
+
+    def setUp(self):
+        self.window = MockWindow({})
+        self.stats = RenderStats()
+        self.renderer = ExtmarkRenderer(self.window, self.stats)
+
+    def render(self, diagnostics, force=False):
+        return self.renderer.render([('/a', 1, diagnostics, force)])
+
+    def test_place_marks(self):
+        calls = self.render([make_diagnostic('x', 1)])
+        self.assertEqual(calls[0], ['nvim_buf_set_extmark', [1, 'marks', 1, 0, {
+            'id': 1, 'end_row': 1, 'end_col': 5, 'hl_group': 'LFXDiagnosticError', 'sign_text': 'E',
+            'sign_hl_group': 'LFXDiagnosticSignError', 'strict': False}]])
+        self.assertEqual(calls[1], ['nvim_buf_set_extmark', [1, 'virtual', 1, 0, {
+            'id': 1, 'virt_text': [[' x', 'LFXDiagnosticVirtualError']], 'strict': False}]])
+        self.window.vim.call.assert_called_once_with('lfx#diagnostics#define_highlights')
+
+    def test_only_changes_touched(self):
+        self.render([make_diagnostic('x', 1), make_diagnostic('y', 2)])
+        calls = self.render([make_diagnostic('y', 2), make_diagnostic('z', 3)])
+        self.assertEqual([(name, args[:3]) for name, args in calls], [
+            ('nvim_buf_del_extmark', [1, 'marks', 1]),
+            ('nvim_buf_del_extmark', [1, 'virtual', 1]),
+            ('nvim_buf_set_extmark', [1, 'marks', 3]),
+            ('nvim_buf_set_extmark', [1, 'virtual', 3]),
+        ])
+        self.assertEqual((self.stats.marks_added, self.stats.marks_removed), (3, 1))
+
+    def test_force_clears(self):
+        self.render([make_diagnostic('x', 1)])
+        calls = self.render([make_diagnostic('x', 1)], force=True)
+        self.assertEqual([name for name, _ in calls], ['nvim_buf_clear_namespace', 'nvim_buf_clear_namespace',
+                                                       'nvim_buf_set_extmark', 'nvim_buf_set_extmark'])
+
+    def test_forget(self):
+        self.render([make_diagnostic('x', 1)])
+        self.renderer.forget(1)
+        calls = self.render([make_diagnostic('x', 1)])
+        self.assertEqual([name for name, _ in calls], ['nvim_buf_set_extmark', 'nvim_buf_set_extmark'])
+
+    def test_invalidate_clears(self):
+        self.render([make_diagnostic('x', 1)])
+        self.renderer.invalidate(1)
+        calls = self.render([make_diagnostic('x', 1)])
+        self.assertEqual([name for name, _ in calls], ['nvim_buf_clear_namespace', 'nvim_buf_clear_namespace',
+                                                       'nvim_buf_set_extmark', 'nvim_buf_set_extmark'])
+        self.assertEqual(self.render([make_diagnostic('x', 1)]), [])
+
+    def placed_rows(self, calls):
+        return [args[2] for name, args in calls if name == 'nvim_buf_set_extmark' and args[1] == 'marks']
+
+    def test_viewport_first(self):
+        renderer = ExtmarkRenderer(self.window, self.stats, virtual_text=False, chunk_size=3, margin=1)
+        diagnostics = [make_diagnostic(str(row), row) for row in range(20)]
+        calls = renderer.render([('/a', 1, diagnostics, False)], {1: [(10, 12)]})
+        self.assertEqual(sorted(self.placed_rows(calls)), [9, 10, 11, 12, 13])
+        self.assertEqual(self.stats.backlog, 15)
+
+        # scrolled to the top
+        calls = renderer.render_backlog({1: [(0, 1)]})
+        self.assertEqual(sorted(self.placed_rows(calls)), [0, 1, 2])
+        self.assertEqual(self.stats.backlog, 12)
+
+        # only placed marks are deleted, the others are dropped from the backlog
+        calls = renderer.render([('/a', 1, diagnostics[:10], False)], {1: [(0, 1)]})
+        self.assertEqual([args[2] for name, args in calls if args[1] == 'marks'], [11, 12, 13, 14])
+        self.assertEqual(self.stats.backlog, 6)
+        while renderer.has_backlog():
+            renderer.render_backlog({})
+        self.assertEqual(self.stats.marks_added, 14)
+
+    def test_without_viewports_everything_is_placed(self):
+        renderer = ExtmarkRenderer(self.window, self.stats, virtual_text=False, chunk_size=3)
+        calls = renderer.render([('/a', 1, [make_diagnostic(str(row), row) for row in range(10)], False)])
+        self.assertEqual(len(self.placed_rows(calls)), 10)
+        self.assertFalse(renderer.has_backlog())
+
+
+class DiagnosticIndexTests(unittest.TestCase):
+
+    def test_point(self):
+        a = make_diagnostic('a', 1, 2, 1, 6)
+        b = make_diagnostic('b', 0, 10, 3, 1)
+        c = make_diagnostic('c', 5)
+        index = DiagnosticIndex({'x': [a, c], 'y': [b]})
+        self.assertEqual(index.at_point(Point(1, 4)), {'x': [a], 'y': [b]})
+        self.assertEqual(index.at_point(Point(2, 50)), {'y': [b]})
+        self.assertEqual(index.at_point(Point(0, 2)), {})
+        self.assertEqual(index.at_point(Point(3, 2)), {})
+
+    def test_lines_and_range(self):
+        a = make_diagnostic('a', 1, 2, 1, 6)
+        b = make_diagnostic('b', 4)
+        c = make_diagnostic('c', 8)
+        index = DiagnosticIndex({'x': [c, b, a]})
+        self.assertEqual(index.on_lines(1, 4), {'x': [a, b]})
+        self.assertEqual(index.in_range(Range(Point(1, 7), Point(4, 0))), {'x': [b]})
+
+    def test_matches_linear_scan(self):
+        rng = random.Random(1)
+        diagnostics = []
+        for i in range(500):
+            line = rng.randint(0, 100)
+            end_line = line + rng.choice([0, 0, 0, 1, 5])
+            diagnostics.append(make_diagnostic(str(i), line, rng.randint(0, 40), end_line, rng.randint(0, 40)))
+        index = DiagnosticIndex({'x': diagnostics})
+        for _ in range(200):
+            row, col = rng.randint(0, 105), rng.randint(0, 40)
+            expected = [d for d in diagnostics
+                        if (d.range.start.row, d.range.start.col) <= (row, col) <= (d.range.end.row, d.range.end.col)]
+            found = index.at_point(Point(row, col)).get('x', [])
+            self.assertEqual(sorted(map(id, found)), sorted(map(id, expected)))
+
+    def test_storage_keeps_index(self):
+        storage = DiagnosticsStorage(None)
+        storage.receive('x', {'uri': 'file:///a', 'diagnostics': [make_diagnostic('a', 1).to_lsp()]})
+        self.assertEqual(len(storage.index('/a')), 1)
+        storage.receive('x', {'uri': 'file:///a', 'diagnostics': []})
+        self.assertEqual(len(storage.index('/a')), 0)
+
+    def test_storage_counts(self):
+        storage = DiagnosticsStorage(None)
+        warning = make_diagnostic('w', 2).to_lsp()
+        warning['severity'] = 2
+        storage.receive('x', {'uri': 'file:///a', 'diagnostics': [make_diagnostic('a').to_lsp(), warning]})
+        storage.receive('y', {'uri': 'file:///a', 'diagnostics': [make_diagnostic('b').to_lsp()]})
+        storage.receive('x', {'uri': 'file:///b', 'diagnostics': [warning]})
+        self.assertEqual(storage.counts('/a'), {'error': 2, 'warning': 1, 'information': 0, 'hint': 0})
+        self.assertEqual(storage.total_counts(), {'error': 2, 'warning': 2, 'information': 0, 'hint': 0})
+        storage.receive('x', {'uri': 'file:///a', 'diagnostics': []})
+        self.assertEqual(storage.counts('/a'), {'error': 1, 'warning': 0, 'information': 0, 'hint': 0})
+        storage.clear()
+        self.assertEqual(storage.total_counts(), {'error': 0, 'warning': 0, 'information': 0, 'hint': 0})
+        self.assertEqual(storage.counts('/b'), {'error': 0, 'warning': 0, 'information': 0, 'hint': 0})
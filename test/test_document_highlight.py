@@ -0,0 +1,39 @@
+from lfx.core.protocol import Point, Range
+from lfx.document_highlight import DocumentHighlights
+from .test_mocks import MockVim
+import unittest
+
+
+def word(row, start, end):
+    return Range(Point(row, start), Point(row, end))
+
+
+class DocumentHighlightsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.vim = MockVim()
+        self.highlights = DocumentHighlights(self.vim)
+
+    def test_shown_in_one_batch(self):
+        self.highlights.show(2, 10, [word(0, 4, 7), word(3, 0, 3)], [(0, 4, 0, 9), (3, 0, 3, 3)], 'Search')
+        self.highlights.show(2, 10, [word(1, 0, 3)], [(1, 0, 1, 3)], 'Search')
+        self.assertEqual(self.vim.api.namespaces, 1)
+        self.assertEqual(len(self.vim.api.atomic_calls), 2)
+        calls = self.vim.api.atomic_calls[0]
+        self.assertEqual(calls[0], ['nvim_buf_clear_namespace', [2, 5, 0, -1]])
+        self.assertEqual(calls[1], ['nvim_buf_set_extmark', [2, 5, 0, 4, {
+            'end_row': 0, 'end_col': 9, 'hl_group': 'Search', 'strict': False}]])
+        self.assertEqual(len(calls), 3)
+
+    def test_reused_within_ranges_at_same_changedtick(self):
+        self.highlights.show(2, 10, [word(0, 4, 7), word(3, 0, 3)], [], 'Search')
+        self.assertTrue(self.highlights.covers(2, 10, Point(3, 2)))
+        self.assertTrue(self.highlights.covers(2, 10, Point(0, 7)))
+        self.assertFalse(self.highlights.covers(2, 10, Point(0, 8)))
+        self.assertFalse(self.highlights.covers(2, 11, Point(3, 2)))
+        self.assertFalse(self.highlights.covers(3, 10, Point(3, 2)))
+        self.assertEqual(self.highlights.reused, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+from lfx.documents import DocumentResidency, DocumentState, VimDocumentHandler
+import unittest
+import unittest.mock
+
+
+class MockResidentView(object):
+    def __init__(self, file_name):
+        self._file_name = file_name
+
+    def file_name(self):
+        return self._file_name
+
+
+class DocumentResidencyTests(unittest.TestCase):
+
+    def test_least_recent_order(self):
+        residency = DocumentResidency(max_resident=2)
+        views = [MockResidentView('/a'), MockResidentView('/b'), MockResidentView('/c')]
+        for view in views:
+            residency.touch(view)
+        residency.touch(views[0])
+        self.assertEqual([name for name, _ in residency.least_recent()], ['/b', '/c', '/a'])
+        self.assertTrue(residency.over_limit())
+
+    def test_suspend_and_resume(self):
+        residency = DocumentResidency(max_resident=1)
+        view_a, view_b = MockResidentView('/a'), MockResidentView('/b')
+        residency.touch(view_a)
+        residency.touch(view_b)
+        residency.suspend('/a')
+        self.assertTrue(residency.is_suspended('/a'))
+        self.assertFalse(residency.over_limit())
+        residency.touch(view_a)
+        self.assertFalse(residency.is_suspended('/a'))
+        residency.forget('/b')
+        self.assertEqual([name for name, _ in residency.least_recent()], ['/a'])
+
+    def test_no_limits(self):
+        residency = DocumentResidency()
+        for i in range(100):
+            residency.touch(MockResidentView('/{}'.format(i)))
+        self.assertFalse(residency.over_limit())
+        self.assertFalse(residency.is_idle('/0', float('inf')))
+
+    def test_idle(self):
+        residency = DocumentResidency(idle_timeout=10)
+        with unittest.mock.patch('time.monotonic', return_value=100.0):
+            residency.touch(MockResidentView('/a'))
+        self.assertFalse(residency.is_idle('/a', 105.0))
+        self.assertTrue(residency.is_idle('/a', 111.0))
+
+
+class MockSettings(object):
+    def __init__(self, max_resident=0, idle_timeout=0.0):
+        self.document_max_resident = max_resident
+        self.document_idle_timeout = idle_timeout
+
+
+class MockEditor(object):
+    def __init__(self):
+        self.timeouts = []
+
+    def set_timeout_async(self, f, timeout_ms=0):
+        self.timeouts.append((f, timeout_ms))
+
+
+class MockVisibilityWindow(object):
+    def __init__(self, visible, unloaded=()):
+        self.visible = visible
+        self.unloaded = unloaded
+        self.requests = []
+
+    def visible_files(self, paths):
+        self.requests.append(paths)
+        return {path: path in self.visible for path in paths if path not in self.unloaded}
+
+
+class MockBufferView(MockResidentView):
+    def __init__(self, file_name, bufnr):
+        super().__init__(file_name)
+        self._bufnr = bufnr
+
+    def buffer_id(self):
+        return self._bufnr
+
+    def language_id(self):
+        return 'python'
+
+
+class EvictionTests(unittest.TestCase):
+
+    def handler(self, window, editor=None, **settings):
+        handler = VimDocumentHandler(editor or MockEditor(), MockSettings(**settings), None, window, None)
+        for index, file_name in enumerate(['/a', '/b', '/c']):
+            handler._document_states[file_name] = DocumentState()
+            handler._residency.touch(MockBufferView(file_name, index + 1))
+        return handler
+
+    def test_visible_in_any_tabpage_is_kept(self):
+        window = MockVisibilityWindow({'/a'})
+        handler = self.handler(window, max_resident=2)
+        handler._evict_idle_documents()
+        self.assertEqual(window.requests, [['/a', '/b', '/c']])
+        self.assertTrue(handler.has_document_state('/a'))
+        self.assertFalse(handler.has_document_state('/b'))
+        self.assertTrue(handler.has_document_state('/c'))
+
+    def test_wiped_suspended_documents_are_forgotten(self):
+        window = MockVisibilityWindow(set(), unloaded={'/x'})
+        handler = self.handler(window, max_resident=2)
+        handler._residency.suspend('/x')
+        handler._residency.suspend('/y')
+        handler._evict_idle_documents()
+        self.assertEqual(sorted(window.requests[0][3:]), ['/x', '/y'])
+        self.assertFalse(handler._residency.is_suspended('/x'))
+        self.assertTrue(handler._residency.is_suspended('/y'))
+
+    def test_no_rpc_below_limits(self):
+        window = MockVisibilityWindow(set())
+        self.handler(window, max_resident=5)._evict_idle_documents()
+        self.assertEqual(window.requests, [])
+
+    def test_idle_check_is_scheduled(self):
+        window = MockVisibilityWindow(set())
+        editor = MockEditor()
+        with unittest.mock.patch('time.monotonic', return_value=100.0):
+            handler = self.handler(window, editor, idle_timeout=10)
+            handler._evict_idle_documents()
+            handler._evict_idle_documents()
+        self.assertEqual(len(editor.timeouts), 1)
+        self.assertEqual(editor.timeouts[0][1], 10000)
+        with unittest.mock.patch('time.monotonic', return_value=111.0):
+            editor.timeouts[0][0]()
+        self.assertFalse(any(handler.has_document_state(path) for path in ['/a', '/b', '/c']))
+        self.assertEqual(len(editor.timeouts), 2)
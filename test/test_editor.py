@@ -1,4 +1,7 @@
+import os
+import tempfile
 import unittest
+import unittest.mock
 from lfx.editor import VimEditor
 
 CONTENT1 = """Recusandae vel sit ullam.
@@ -91,3 +94,142 @@ class ApplyEditTests(unittest.TestCase):
         edit = [[1, 15], [2, 7], 'foo\nbar']
         lines1 = apply_edit(self.editor, lines1, edit)
         self.assertEqual(lines1, expected)
+
+
+class ViewRegistryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.vim = unittest.mock.MagicMock()
+        self.vim.funcs.fnamemodify.side_effect = lambda name, mods: name
+        self.vim.funcs.bufnr.return_value = 3
+        self.vim.buffers.__getitem__.side_effect = self._buffer
+        self.editor = VimEditor(MockLFX(self.vim))
+        self.window = self.editor.window
+
+    def _buffer(self, bufnr):
+        buffer = unittest.mock.MagicMock()
+        buffer.name = '/tmp/buffer{}.py'.format(bufnr)
+        buffer.options = {'filetype': 'python'}
+        return buffer
+
+    def test_find_open_file_is_cached(self):
+        view = self.window.view_for_buffer(3)
+        self.assertIs(self.window.find_open_file('/tmp/buffer3.py'), view)
+        self.assertIs(self.window.find_open_file('/tmp/../tmp/buffer3.py'), view)
+        self.vim.funcs.bufnr.assert_not_called()
+
+    def test_find_open_file_fallback(self):
+        view = self.window.find_open_file('/tmp/buffer3.py')
+        self.assertEqual(view.buffer_id(), 3)
+        self.assertIs(self.window.find_open_file('/tmp/buffer3.py'), view)
+        self.vim.funcs.bufnr.assert_called_once()
+
+    def test_refresh_view(self):
+        view = self.window.view_for_buffer(3)
+        self.window.refresh_view(3, '/tmp/renamed.py', 'text')
+        self.assertEqual(view.file_name(), '/tmp/renamed.py')
+        self.assertEqual(view.language_id(), 'text')
+        self.assertIs(self.window.find_open_file('/tmp/renamed.py'), view)
+        self.vim.funcs.bufnr.return_value = -1
+        self.assertIsNone(self.window.find_open_file('/tmp/buffer3.py'))
+
+    def test_close_view(self):
+        self.window.view_for_buffer(3)
+        self.window.close_view(3)
+        self.assertEqual(self.window.views(), [])
+        self.vim.funcs.bufnr.return_value = -1
+        self.assertIsNone(self.window.find_open_file('/tmp/buffer3.py'))
+
+    def test_snapshot_open_files(self):
+        self.vim.api.call_atomic.return_value = [[{
+            'bufnr': 3, 'name': '/tmp/buffer3.py', 'filetype': 'python', 'changedtick': 7, 'eol': 1,
+            'shiftwidth': 2, 'expandtab': 1, 'visible': 0, 'lines': ['a', 'b']}, {}], None]
+        views = self.window.snapshot_open_files(['/tmp/buffer3.py', '/tmp/unloaded.py'])
+        self.assertEqual(len(views), 1)
+        self.assertEqual(views[0].entire_content(), 'a\nb\n')
+        self.assertEqual((views[0].tab_size(), views[0].translate_tabs_to_spaces()), (2, True))
+        self.assertFalse(views[0].is_visible())
+
+
+class PositionConversionTests(unittest.TestCase):
+
+    def setUp(self):
+        self.vim = unittest.mock.MagicMock()
+        self.editor = VimEditor(MockLFX(self.vim))
+
+    def test_adjust_many_from_lsp(self):
+        self.vim.api.call_atomic.return_value = [[['ação = 1', 'x']], None]
+        positions = self.editor.adjust_many_from_lsp([('/a.py', 3, 4), ('/a.py', 0, 3), ('/a.py', 3, 0)])
+        self.assertEqual(positions, [(3, 1), (0, 5), (3, 0)])
+        self.vim.api.call_atomic.assert_called_once_with(
+            [['nvim_call_function', ['lfx#buffer_lines', ['/a.py', [0, 3]]]]])
+
+    def test_adjust_many_to_lsp(self):
+        self.vim.api.call_atomic.return_value = [[['ação = 1']], None]
+        positions = self.editor.adjust_many_to_lsp([('/a.py', 0, 5)])
+        self.assertEqual(positions, [(0, 3)])
+
+    def test_unloaded_file_is_read_from_disk(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.py', delete=False, encoding='utf-8') as file:
+            file.write('foo\nação = 1\n')
+        self.addCleanup(os.remove, file.name)
+        self.vim.api.call_atomic.return_value = [[None], None]
+        positions = self.editor.adjust_many_from_lsp([(file.name, 1, 3)])
+        self.assertEqual(positions, [(1, 5)])
+
+
+class BatchEditTests(unittest.TestCase):
+
+    def setUp(self):
+        self.editor = VimEditor(MockLFX())
+
+    def apply_hunks(self, lines, edits):
+        lines = list(lines)
+        for start, end, new_lines in reversed(self.editor.batch_edits(lines, edits)):
+            lines[start:end + 1] = new_lines
+        return lines
+
+    def test_single_edits(self):
+        lines = CONTENT1.splitlines(False)
+        edits = [
+            [[0, 0], [0, 0], CONTENT1],
+            [[0, 0], [6, 0], ''],
+            [[0, 0], [6, 0], CONTENT1.upper()],
+            [[1, 0], [2, 0], ''],
+            [[1, 0], [1, 0], 'foo'],
+            [[6, 0], [6, 0], 'foo'],
+            [[1, 0], [2, 0], 'foo\n'],
+            [[1, 15], [1, 20], 'foo'],
+            [[1, 15], [2, 7], 'foo\nbar'],
+        ]
+        for edit in edits:
+            expected = apply_edit(self.editor, list(lines), edit)
+            self.assertEqual(self.apply_hunks(lines, [edit]), expected)
+
+    def test_multiple_edits(self):
+        lines = CONTENT1.splitlines(False)
+        edits = [
+            [[0, 0], [0, 10], 'Foo'],
+            [[0, 11], [0, 14], 'bar'],
+            [[1, 15], [2, 7], 'foo\nbar'],
+            [[4, 0], [4, 0], 'baz\n'],
+            [[5, 0], [5, 2], 'Ego'],
+        ]
+        expected = list(lines)
+        for edit in reversed(edits):
+            expected = apply_edit(self.editor, expected, edit)
+        self.assertEqual(self.apply_hunks(lines, edits), expected)
+
+    def test_unsorted_edits(self):
+        lines = ['foo bar', 'baz', 'qux', 'quux', 'corge foo']
+        edits = [((4, 6), (4, 9), 'bar'), ((0, 0), (0, 3), 'bar'), ((2, 0), (2, 3), 'QUX')]
+        self.assertEqual(self.apply_hunks(lines, edits), ['bar bar', 'baz', 'QUX', 'quux', 'corge bar'])
+        self.assertEqual(self.apply_hunks(['a', 'b'], [((1, 0), (1, 1), 'B'), ((0, 0), (0, 1), 'A')]), ['A', 'B'])
+
+    def test_minimal_hunks(self):
+        lines = CONTENT1.splitlines(False)
+        changed = list(lines)
+        changed[3] = 'foo'
+        hunks = self.editor.batch_edits(lines, [[[0, 0], [6, 0], '\n'.join(changed)]])
+        self.assertEqual(hunks, [(3, 3, ['foo'])])
+        self.assertEqual(self.editor.batch_edits(lines, [[[0, 0], [6, 0], CONTENT1]]), [])
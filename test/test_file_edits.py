@@ -0,0 +1,83 @@
+from lfx.editor import VimEditor
+from lfx.file_edits import FileEditJob, prune_backups, undo_file_edits
+from .test_editor import MockLFX
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class FileEditJobTests(unittest.TestCase):
+
+    def setUp(self):
+        self.editor = VimEditor(MockLFX())
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def make_file(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as file:
+            file.write(content)
+        return path
+
+    def make_job(self, *args, **kwargs):
+        job = FileEditJob(*args, **kwargs)
+        self.addCleanup(shutil.rmtree, job.backup_dir, True)
+        return job
+
+    def read_file(self, path):
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def test_apply_and_undo(self):
+        unix = self.make_file('unix.py', b'foo = 1\nprint(foo)\n')
+        dos = self.make_file('dos.py', b'foo = 1\r\nprint(foo)\r\n')
+        rename = [((0, 0), (0, 3), 'bar'), ((1, 6), (1, 9), 'bar')]
+        job = self.make_job({unix: rename, dos: rename}, self.editor.batch_edits)
+        self.assertTrue(job.run())
+        self.assertEqual(self.read_file(unix), b'bar = 1\nprint(bar)\n')
+        self.assertEqual(self.read_file(dos), b'bar = 1\r\nprint(bar)\r\n')
+
+        self.assertEqual(undo_file_edits(job.manifest_path), [])
+        self.assertEqual(self.read_file(unix), b'foo = 1\nprint(foo)\n')
+        self.assertEqual(self.read_file(dos), b'foo = 1\r\nprint(foo)\r\n')
+
+    def test_undo_skips_modified_files(self):
+        path = self.make_file('a.py', b'foo\n')
+        job = self.make_job({path: [((0, 0), (0, 3), 'bar')]}, self.editor.batch_edits)
+        self.assertTrue(job.run())
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertEqual(undo_file_edits(job.manifest_path), [path])
+        self.assertEqual(self.read_file(path), b'bar\n')
+
+    def test_missing_file(self):
+        path = os.path.join(self.directory.name, 'missing.py')
+        progress = []
+        job = self.make_job({path: [((0, 0), (0, 0), 'foo')]}, self.editor.batch_edits,
+                            on_progress=lambda done, total: progress.append((done, total)))
+        self.assertFalse(job.run())
+        self.assertEqual(len(job.errors), 1)
+        self.assertEqual(progress, [(1, 1)])
+
+    def test_failure_restores_edited_files(self):
+        path = self.make_file('a.py', b'foo\n')
+        missing = os.path.join(self.directory.name, 'missing.py')
+        job = self.make_job({path: [((0, 0), (0, 3), 'bar')], missing: [((0, 0), (0, 0), 'foo')]},
+                            self.editor.batch_edits, max_workers=1)
+        self.assertFalse(job.run())
+        self.assertEqual(self.read_file(path), b'foo\n')
+        self.assertEqual(job.edited_files, [])
+        self.assertEqual(job.not_restored, [])
+
+    def test_prune_backups(self):
+        root = os.path.join(self.directory.name, 'backups')
+        os.mkdir(root)
+        path = self.make_file('a.py', b'foo\n')
+        first = self.make_job({path: [((0, 0), (0, 3), 'bar')]}, self.editor.batch_edits, backup_root=root)
+        second = self.make_job({path: [((0, 0), (0, 3), 'baz')]}, self.editor.batch_edits, backup_root=root)
+        self.assertTrue(first.run())
+        self.assertTrue(second.run())
+        prune_backups(root, second.backup_dir)
+        self.assertFalse(os.path.exists(first.backup_dir))
+        self.assertTrue(os.path.exists(second.manifest_path))
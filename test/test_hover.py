@@ -0,0 +1,64 @@
+from lfx.core.protocol import Point, Range
+from lfx.hover import HoverCache, HoverContent
+import unittest
+
+
+def word(row, start, end):
+    return Range(Point(row, start), Point(row, end))
+
+
+class HoverContentTests(unittest.TestCase):
+
+    def test_markup_content(self):
+        content = HoverContent.from_lsp({'contents': [{'kind': 'markdown', 'value': '# foo\nbar'}, 'baz']})
+        self.assertEqual(content.lines, ['# foo', 'bar', '', 'baz'])
+        self.assertEqual(content.filetype, 'markdown')
+
+    def test_no_hover(self):
+        content = HoverContent.from_lsp(None)
+        self.assertIsNone(content.response)
+        self.assertEqual(content.lines, [])
+
+
+class HoverCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = HoverCache()
+        self.content = HoverContent.from_lsp({'contents': 'foo'})
+
+    def test_reused_within_the_reported_range(self):
+        self.cache.put('/a', 1, Point(3, 5), word(3, 4, 9), self.content)
+        self.assertIs(self.cache.get('/a', 1, Point(3, 8)), self.content)
+        self.assertIsNone(self.cache.get('/a', 1, Point(3, 10)))
+        self.assertIsNone(self.cache.get('/a', 2, Point(3, 5)))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+
+    def test_without_range_only_the_same_point(self):
+        self.cache.put('/a', 1, Point(3, 5), None, self.content)
+        self.assertIs(self.cache.get('/a', 1, Point(3, 5)), self.content)
+        self.assertIsNone(self.cache.get('/a', 1, Point(3, 6)))
+
+    def test_waiting_for_in_flight_hover(self):
+        received = []
+        self.assertFalse(self.cache.wait('/a', 1, Point(0, 0)))
+        self.assertTrue(self.cache.wait('/a', 1, Point(0, 0), received.append))
+        self.cache.put('/a', 1, Point(0, 0), None, self.content)
+        self.assertEqual(received, [self.content])
+        self.assertFalse(self.cache.wait('/a', 1, Point(0, 0)))
+
+    def test_invalidate(self):
+        self.cache.put('/a', 1, Point(0, 0), None, self.content)
+        self.cache.put('/b', 1, Point(0, 0), None, self.content)
+        self.cache.invalidate('/a')
+        self.assertIsNone(self.cache.get('/a', 1, Point(0, 0)))
+        self.assertEqual(len(self.cache), 1)
+
+    def test_stale_version_is_not_stored(self):
+        self.cache.put('/a', 2, Point(0, 0), None, self.content)
+        self.cache.put('/a', 1, Point(1, 0), None, self.content)
+        self.assertIsNone(self.cache.get('/a', 1, Point(1, 0)))
+        self.assertIs(self.cache.get('/a', 2, Point(0, 0)), self.content)
+
+
+if __name__ == '__main__':
+    unittest.main()
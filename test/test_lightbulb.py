@@ -0,0 +1,126 @@
+from lfx.core.diagnostics import DiagnosticsStorage
+from lfx.core.protocol import Point
+from lfx.core.url import filename_to_uri
+from lfx.lightbulb import LightbulbEngine
+from .test_mocks import MockSession, MockVim
+from unittest import mock
+import unittest
+
+FILE = '/project/a.py'
+
+
+class MockWindow(object):
+    def __init__(self):
+        self.vim = MockVim()
+
+
+class MockView(object):
+    def __init__(self, storage, sessions):
+        self.editor = mock.Mock()
+        self.editor.lfx.diagnostics = storage
+        self.sessions = sessions
+
+    def buffer_id(self):
+        return 3
+
+    def file_name(self):
+        return FILE
+
+    def available_sessions(self, capability=None):
+        return iter(self.sessions)
+
+
+def code_action_session(kinds=None):
+    return MockSession('codeActionProvider', {'codeActionKinds': kinds} if kinds else True)
+
+
+def diagnostic(line, message='unused'):
+    return {'message': message, 'severity': 2,
+            'range': {'start': {'line': line, 'character': 4}, 'end': {'line': line, 'character': 8}}}
+
+
+class LightbulbEngineTests(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = DiagnosticsStorage(None)
+        self.window = MockWindow()
+        self.engine = LightbulbEngine(self.window, sign='*')
+        self.requested = []
+        patcher = mock.patch('lfx.lightbulb.request_code_actions', side_effect=self.request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def request(self, view, point, handler, changedtick):
+        self.requested.append((point.row, handler))
+
+    def publish(self, *diagnostics):
+        self.storage.receive('test', {'uri': filename_to_uri(FILE), 'diagnostics': list(diagnostics)})
+
+    def answer(self, available):
+        requested, self.requested = self.requested, []
+        for row, handler in requested:
+            handler({'test': [{'title': 'fix'}] if row in available else []})
+
+    def placed_rows(self):
+        return [call[1][2] for call in self.window.vim.api.atomic_calls[-1] if call[0] == 'nvim_buf_set_extmark']
+
+    def test_only_visible_diagnostic_lines_are_requested(self):
+        self.publish(diagnostic(2), diagnostic(5), diagnostic(40))
+        view = MockView(self.storage, [code_action_session()])
+        self.engine.update(view, 1, 0, 20, Point(10, 0))
+        self.assertEqual(sorted(row for row, _ in self.requested), [2, 5])
+
+        self.answer({5})
+        self.assertEqual(len(self.window.vim.api.atomic_calls), 1)
+        self.assertEqual(self.placed_rows(), [5])
+
+    def test_rendered_once_every_answer_arrived(self):
+        self.publish(diagnostic(2), diagnostic(5))
+        self.engine.update(MockView(self.storage, [code_action_session()]), 1, 0, 20)
+        self.requested[0][1]({'test': [{'title': 'fix'}]})
+        self.assertEqual(self.window.vim.api.atomic_calls, [])
+        self.requested[1][1]({'test': []})
+        self.assertEqual(len(self.window.vim.api.atomic_calls), 1)
+
+    def test_known_lines_are_not_requested_again(self):
+        self.publish(diagnostic(2))
+        view = MockView(self.storage, [code_action_session()])
+        self.engine.update(view, 1, 0, 20)
+        self.answer({2})
+        self.engine.update(view, 1, 0, 20)
+        self.assertEqual(self.requested, [])
+        self.assertEqual(len(self.window.vim.api.atomic_calls), 1)
+        self.assertEqual(self.window.vim.api.namespaces, 1)
+
+        self.publish(diagnostic(2, 'undefined'))
+        self.engine.update(view, 1, 0, 20)
+        self.assertEqual([row for row, _ in self.requested], [2])
+
+    def test_changedtick_resets_lines(self):
+        self.publish(diagnostic(2))
+        view = MockView(self.storage, [code_action_session()])
+        self.engine.update(view, 1, 0, 20)
+        self.answer({2})
+        self.engine.update(view, 2, 0, 20)
+        self.assertEqual([row for row, _ in self.requested], [2])
+
+    def test_stale_answers_are_not_rendered(self):
+        self.publish(diagnostic(2))
+        view = MockView(self.storage, [code_action_session()])
+        self.engine.update(view, 1, 0, 20)
+        stale, self.requested = self.requested, []
+        self.engine.update(view, 2, 0, 20)
+        stale[0][1]({'test': [{'title': 'fix'}]})
+        self.assertEqual(self.window.vim.api.atomic_calls, [])
+
+    def test_cursor_line_only_with_refactorings(self):
+        self.engine.update(MockView(self.storage, [code_action_session(['quickfix'])]), 1, 0, 20, Point(4, 2))
+        self.assertEqual(self.requested, [])
+        self.engine.update(MockView(self.storage, [code_action_session(['refactor.extract'])]), 1, 0, 20, Point(4, 2))
+        self.assertEqual([row for row, _ in self.requested], [4])
+        self.answer({4})
+        self.assertEqual(self.placed_rows(), [4])
+
+
+if __name__ == '__main__':
+    unittest.main()
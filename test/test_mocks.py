@@ -330,3 +330,63 @@ class MockClient(object):
 
     def send_response(self, response: Response) -> None:
         pass
+
+
+class MockApi(object):
+    """Records the batches sent with `call_atomic`"""
+
+    def __init__(self) -> None:
+        self.atomic_calls = []  # type: List[List[List[Any]]]
+        self.namespaces = 0
+
+    def create_namespace(self, name: str) -> int:
+        self.namespaces += 1
+        return 5
+
+    def call_atomic(self, calls: List[List[Any]]) -> None:
+        self.atomic_calls.append(calls)
+
+
+class MockVim(object):
+    def __init__(self) -> None:
+        self.api = MockApi()
+
+    def async_call(self, fn: Callable, *args: Any) -> None:
+        fn(*args)
+
+
+class RecordingClient(object):
+    """Keeps the requests sent, to be answered by the test with `respond` or `fail`"""
+
+    def __init__(self) -> None:
+        self.requests = []  # type: List[Tuple[Request, Callable, Optional[Callable]]]
+        self.cancelled = []  # type: List[int]
+        self.exiting = False
+
+    def send_request(self, request: Request, handler: Callable, error_handler: Optional[Callable] = None) -> int:
+        self.requests.append((request, handler, error_handler))
+        return len(self.requests)
+
+    def cancel_request(self, request_id: int) -> None:
+        self.cancelled.append(request_id)
+
+    def respond(self, index: int, result: Any) -> None:
+        self.requests[index][1](result)
+
+    def fail(self, index: int, error: Any) -> None:
+        error_handler = self.requests[index][2]
+        assert error_handler
+        error_handler(error)
+
+
+class MockSession(object):
+    """A session with a single capability, sending its requests to a `RecordingClient`"""
+
+    def __init__(self, capability: str, provider: Any) -> None:
+        self.config = TEST_CONFIG
+        self.client = RecordingClient()
+        self.capability = capability
+        self.provider = provider
+
+    def get_capability(self, capability: str) -> Any:
+        return self.provider if capability == self.capability else None
@@ -1,6 +1,7 @@
 from lfx.core.protocol import (
     Point, Range, Diagnostic, DiagnosticSeverity, Request, Notification
 )
+from lfx.core.url import filename_to_uri
 import unittest
 
 LSP_START_POSITION = {'line': 10, 'character': 4}
@@ -18,6 +19,21 @@ LSP_FULL_DIAGNOSTIC = {
     'source': 'pyls'
 }
 
+LSP_EXTENDED_DIAGNOSTIC = {
+    'message': 'message',
+    'range': LSP_RANGE,
+    'severity': 4,
+    'source': 'pyls',
+    'code': 'W0612',
+    'codeDescription': {'href': 'https://example.com/W0612'},
+    'tags': [1],
+    'relatedInformation': [{
+        'location': {'uri': filename_to_uri('/a.py'), 'range': LSP_RANGE},
+        'message': 'defined here'
+    }],
+    'data': {'fix': 1}
+}
+
 
 class PointTests(unittest.TestCase):
 
@@ -61,6 +77,17 @@ class DiagnosticTests(unittest.TestCase):
         self.assertEqual(diag.source, 'pyls')
         self.assertEqual(diag.to_lsp(), LSP_FULL_DIAGNOSTIC)
 
+    def test_extended_lsp_conversion(self):
+        diag = Diagnostic.from_lsp(LSP_EXTENDED_DIAGNOSTIC)
+        self.assertEqual(diag.code, 'W0612')
+        self.assertEqual(diag.related_info[0].location.file_path, '/a.py')
+        self.assertEqual(diag.to_lsp(), LSP_EXTENDED_DIAGNOSTIC)
+
+    def test_does_not_keep_the_payload(self):
+        diag = Diagnostic.from_lsp(LSP_FULL_DIAGNOSTIC)
+        self.assertFalse(hasattr(diag, '__dict__'))
+        self.assertFalse(hasattr(diag.range.start, '__dict__'))
+
 
 class RequestTests(unittest.TestCase):
 
@@ -0,0 +1,119 @@
+from lfx.core.diagnostics import DiagnosticsStorage
+from lfx.core.protocol import ErrorCode
+from lfx.core.url import filename_to_uri
+from lfx.pull_diagnostics import DiagnosticsPuller
+from .test_mocks import MockSession
+import unittest
+
+
+def full_report(result_id, *messages):
+    return {'kind': 'full', 'resultId': result_id,
+            'items': [{'message': message, 'severity': 1,
+                       'range': {'start': {'line': 0, 'character': 0}, 'end': {'line': 0, 'character': 1}}}
+                      for message in messages]}
+
+
+class DiagnosticsPullerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = DiagnosticsStorage(None)
+        self.puller = DiagnosticsPuller(self.storage, recent=2, workspace_delay=-1)
+        self.session = MockSession('diagnosticProvider', {'interFileDependencies': False, 'workspaceDiagnostics': False})
+        self.client = self.session.client
+
+    def params(self, index):
+        return self.client.requests[index][0].params
+
+    def messages(self, file_path):
+        return [d.message for d in self.storage.get_by_file(file_path).get('test', [])]
+
+    def test_sends_previous_result_id(self):
+        self.puller.activated('/a', [self.session])
+        self.assertNotIn('previousResultId', self.params(0))
+        self.assertEqual(self.params(0)['textDocument']['uri'], filename_to_uri('/a'))
+        self.client.respond(0, full_report('1', 'first'))
+        self.assertEqual(self.messages('/a'), ['first'])
+
+        self.puller.changed('/a', [self.session])
+        self.assertEqual(self.params(1)['previousResultId'], '1')
+
+    def test_unchanged_report_is_a_no_op(self):
+        self.puller.activated('/a', [self.session])
+        self.client.respond(0, full_report('1', 'first'))
+        self.puller.changed('/a', [self.session])
+        self.client.respond(1, {'kind': 'unchanged', 'resultId': '1'})
+        self.assertEqual(self.messages('/a'), ['first'])
+        self.assertEqual(self.puller.stats.unchanged, 1)
+        self.assertEqual(self.puller.stats.full, 1)
+
+    def test_activation_only_pulls_stale_documents(self):
+        self.puller.activated('/a', [self.session])
+        self.puller.activated('/a', [self.session])
+        self.assertEqual(len(self.client.requests), 1)
+
+    def test_hidden_documents_are_pulled_when_shown(self):
+        self.puller.activated('/a', [self.session])
+        self.puller.activated('/b', [self.session])
+        self.puller.activated('/c', [self.session])
+        self.assertEqual(len(self.client.requests), 3)
+
+        # /a is neither visible nor among the two most recent documents anymore
+        self.puller.changed('/a', [self.session])
+        self.assertEqual(len(self.client.requests), 3)
+        self.puller.set_visible(['/a'])
+        self.puller.activated('/a', [self.session])
+        self.assertEqual(len(self.client.requests), 4)
+
+    def test_newer_pull_cancels_the_previous_one(self):
+        self.puller.activated('/a', [self.session])
+        self.puller.changed('/a', [self.session])
+        self.assertEqual(self.client.cancelled, [1])
+        # a late report for the first request is ignored
+        self.client.respond(0, full_report('1', 'outdated'))
+        self.client.respond(1, full_report('2', 'current'))
+        self.assertEqual(self.messages('/a'), ['current'])
+
+    def test_related_documents(self):
+        self.puller.activated('/a', [self.session])
+        report = full_report('1', 'first')
+        report['relatedDocuments'] = {filename_to_uri('/b'): full_report('7', 'related')}
+        self.client.respond(0, report)
+        self.assertEqual(self.messages('/b'), ['related'])
+
+    def test_server_cancelled_retriggers(self):
+        self.puller.activated('/a', [self.session])
+        self.client.fail(0, {'code': ErrorCode.ServerCancelled, 'message': 'busy',
+                             'data': {'retriggerRequest': True}})
+        self.assertEqual(len(self.client.requests), 2)
+
+
+class WorkspaceDiagnosticsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = DiagnosticsStorage(None)
+        self.puller = DiagnosticsPuller(self.storage, workspace_delay=60)
+        self.session = MockSession('diagnosticProvider', {'interFileDependencies': True, 'workspaceDiagnostics': True})
+        self.client = self.session.client
+        self.addCleanup(lambda: self.puller.stop('test'))
+
+    def test_stream_sends_known_result_ids(self):
+        self.puller.activated('/a', [self.session])
+        self.client.respond(0, full_report('1'))
+        stream = self.puller._streams['test']
+        self.puller._request_workspace('test', stream)
+        request = self.client.requests[1][0]
+        self.assertEqual(request.method, 'workspace/diagnostic')
+        self.assertEqual(request.params['previousResultIds'], [{'uri': filename_to_uri('/a'), 'value': '1'}])
+
+        report = full_report('3', 'workspace')
+        report['uri'] = filename_to_uri('/b')
+        self.puller._apply_workspace('test', stream, [report])
+        self.assertEqual([d.message for d in self.storage.get_by_file('/b')['test']], ['workspace'])
+
+    def test_stop_cancels_the_stream(self):
+        self.puller.activated('/a', [self.session])
+        stream = self.puller._streams['test']
+        self.puller._request_workspace('test', stream)
+        self.puller.stop('test')
+        self.assertTrue(stream.stopped)
+        self.assertEqual(self.client.cancelled, [2])
@@ -393,3 +393,15 @@ class ClientTest(unittest.TestCase):
         client.send_request(req, lambda resp: raise_error('handler failed'))
         # exception would fail test if not handled in client
         self.assertEqual(len(client._response_handlers), 0)
+
+    def test_cancel_request(self):
+        transport = MockTransport()
+        client = Client(transport, MockSettings())
+        responses = []
+        request_id = client.send_request(Request.initialize(dict()), lambda resp: responses.append(resp))
+        client.cancel_request(request_id)
+        self.assertEqual(json.loads(transport.messages[-1].split('\r\n\r\n')[-1]),
+                         {"jsonrpc": "2.0", "method": "$/cancelRequest", "params": {"id": request_id}})
+        transport.receive('{"id": %d, "error": {"code": -32800, "message": "cancelled"}}' % request_id)
+        self.assertEqual(responses, [])
+        self.assertEqual(len(client._response_handlers), 0)
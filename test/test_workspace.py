@@ -0,0 +1,54 @@
+from lfx.core.workspace import RootFinder
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+
+class RootFinderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.base = os.path.realpath(self.directory.name)
+        self.project = os.path.join(self.base, 'project')
+        self.package = os.path.join(self.project, 'packages', 'foo')
+        os.makedirs(os.path.join(self.project, '.git'))
+        os.makedirs(self.package)
+        open(os.path.join(self.package, 'package.json'), 'w').close()
+        self.file = os.path.join(self.package, 'index.js')
+
+    def test_outermost_root(self):
+        finder = RootFinder()
+        self.assertEqual(finder.find_root(self.file, ['.git']), self.project)
+        self.assertEqual(finder.find_root(self.file, ['package.json']), self.package)
+        self.assertEqual(finder.find_root(self.file, ['.git', 'package.json']), self.project)
+
+    def test_no_root(self):
+        finder = RootFinder()
+        self.assertEqual(finder.find_root(self.file, ['.hg']), self.package)
+
+    def test_cached_lookups(self):
+        finder = RootFinder(ttl=60)
+        finder.find_root(self.file, ['.git'])
+        with unittest.mock.patch('os.path.exists') as exists, unittest.mock.patch('os.stat') as stat:
+            self.assertEqual(finder.find_root(os.path.join(self.package, 'other.js'), ['.git']), self.project)
+            exists.assert_not_called()
+            stat.assert_not_called()
+
+    def test_invalidated_by_mtime(self):
+        finder = RootFinder(ttl=0)
+        self.assertEqual(finder.find_root(self.file, ['.hg']), self.package)
+        os.makedirs(os.path.join(self.project, '.hg'))
+        stat = os.stat(self.project)
+        os.utime(self.project, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        self.assertEqual(finder.find_root(self.file, ['.hg']), self.project)
+
+    def test_bounded_caches(self):
+        finder = RootFinder(max_entries=3)
+        self.assertEqual(finder.find_root(self.file, ['.git']), self.project)
+        self.assertEqual(len(finder._roots), 3)
+        self.assertEqual(len(finder._directories), 3)
+        with unittest.mock.patch('os.path.exists', return_value=False) as exists:
+            self.assertEqual(finder.find_root(self.file, ['.git']), self.project)
+            exists.assert_not_called()